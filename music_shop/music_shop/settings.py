@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -26,6 +29,10 @@ SECRET_KEY = "django-insecure-_k+0k9x&_%fciw@t%ts2+=b&3n=20$e^=!41l0gh@pp-l8j!(1
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Запуск через manage.py test: фоновые потоки сброса выключены, тесты
+# сбрасывают буферы сами
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+
 ALLOWED_HOSTS = []
 
 
@@ -38,6 +45,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "corsheaders",
     "django_filters",
@@ -46,9 +54,11 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
+    "shop_main.middleware.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "shop_main.middleware.ReplicaMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
@@ -102,6 +112,34 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения: DATABASE_REPLICA_HOSTS=host1,host2:5433 (каталог и
+# отчеты, см. shop_main.replicas). В тестах каждая реплика — зеркало default
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+    filter(None, os.environ.get("DATABASE_REPLICA_HOSTS", "").split(",")), 1
+):
+    host, _, port = address.strip().partition(":")
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{number}")
+
+# Локальная реплика для тестов маршрутизации: та же база, что default.
+# Только в тестах, иначе каждый процесс держал бы второй пул соединений к default
+if TESTING:
+    DATABASES["local_replica"] = {
+        **DATABASES["default"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["shop_main.replicas.ReplicaRouter"]
+
+# Сколько секунд после записи клиент читает только из default
+REPLICA_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -159,6 +197,10 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.BasicAuthentication",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "shop_main.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_FILTER_BACKENDS": [
         "rest_framework.filters.SearchFilter",
         "rest_framework.filters.OrderingFilter",
@@ -166,6 +208,81 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Сжатие ответов API (shop_main.middleware.CompressionMiddleware)
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_PATH_PREFIXES = ["/api/"]
+
+# Кэш активных купонов и ограничение перебора кодов (shop_main.coupons)
+COUPON_CACHE_TTL = 60
+COUPON_RATE_LIMIT = (10, 600)  # неудачных попыток за окно в секундах
+
+# Время жизни кэша id избранных товаров пользователя (shop_main.favorites)
+FAVORITES_CACHE_TIMEOUT = 3600
+
+# Учет просмотров товаров (shop_main.tracking)
+PRODUCT_VIEW_LOG_SAMPLE_RATE = 1.0  # доля уникальных просмотров, попадающих в журнал
+PRODUCT_VIEW_DEDUP_WINDOW = 30 * 60  # повторный просмотр в окне не пишется в журнал
+PRODUCT_VIEW_DEDUP_SIZE = 10000
+PRODUCT_VIEW_FLUSH_INTERVAL = 60  # как часто счетчики сбрасываются в БД, секунд
+PRODUCT_VIEW_FLUSH_MAX_KEYS = 1000
+PRODUCT_VIEW_BACKGROUND_FLUSH = not TESTING  # сброс в фоновом потоке, не в запросе
+
+# Популярные сейчас товары (shop_main.trending)
+TRENDING_HALF_LIFE = 24 * 60 * 60  # период полураспада вклада события, секунд
+TRENDING_WEIGHTS = {"view": 1.0, "cart": 3.0, "purchase": 10.0}
+TRENDING_TOP_N = 10
+TRENDING_REFRESH_INTERVAL = 60  # как часто пересчитывается рейтинг, секунд
+TRENDING_FLUSH_INTERVAL = 60  # как часто события сбрасываются в БД, секунд
+TRENDING_BACKGROUND_FLUSH = not TESTING
+TRENDING_HISTORY_DAYS = 30  # глубина истории для rebuild_trending
+
+# Данные главной страницы (shop_main.home)
+HOME_CACHE_TTL = 60  # сбрасывается и при изменении товаров, жанров, исполнителей
+HOME_SECTION_SIZE = 8  # товаров в новинках, хитах продаж и трендах
+
+# Каталог с фасетами (?facets=1): размер страницы и границы ценовых диапазонов
+CATALOG_PAGE_SIZE = 24
+CATALOG_MAX_PAGE_SIZE = 100
+CATALOG_PRICE_BUCKETS = [1000, 2000, 3000, 5000]
+
+# Колоночный индекс каталога в памяти (shop_main.catalog_index, нужен numpy)
+CATALOG_INDEX_ENABLED = False
+CATALOG_INDEX_POLL_INTERVAL = 5  # как часто подгружать измененные товары, секунд
+CATALOG_INDEX_REBUILD_INTERVAL = 600  # полная пересборка, секунд
+
+# Кэш остатков товаров (shop_main.stock)
+STOCK_CACHE_TIMEOUT = 300
+STOCK_STRICT_RESERVATION = True  # списание решает только БД, без проверки по кэшу
+
+# Брони товаров лимитированного тиража в корзине (shop_main.holds)
+CART_HOLD_SECONDS = 10 * 60  # срок брони, продлевается при каждом добавлении
+CART_HOLD_SWEEP_INTERVAL = 30  # пауза sweep_holds --loop, секунд
+CART_HOLD_SWEEP_BATCH = 1000  # броней за один запрос
+
+# Ключи идемпотентности изменяющих запросов (shop_main.idempotency)
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60  # сколько хранится ответ, секунд
+IDEMPOTENCY_LOCK_TIMEOUT = 60  # через сколько освобождается ключ без ответа
+
+# Асинхронные эндпоинты /api/async/ (shop_main.async_api)
+ASYNC_DB_CONCURRENCY = 20  # одновременных запросов к БД на процесс
+
+# Живые обновления статусов заказов и остатков (shop_main.live)
+LIVE_EVENTS_BACKEND = "local"  # "postgres" — LISTEN/NOTIFY, для нескольких процессов
+LIVE_EVENTS_CHANNEL = "shop_live"
+LIVE_EVENTS_HEARTBEAT = 15  # пинг потока SSE, секунд
+LIVE_EVENTS_QUEUE_SIZE = 100  # событий в очереди клиента
+LIVE_EVENTS_MAX_PRODUCTS = 50  # товаров в одной подписке
+
+# Подсчет строк больших таблиц (shop_main.counts): выше порога — оценка
+# планировщика вместо COUNT(*)
+COUNT_ESTIMATE_THRESHOLD = 100_000
+
+# «С этим товаром покупают» (shop_main.recommendations)
+RECOMMENDATIONS_TOP_K = 10
+RECOMMENDATIONS_MIN_SUPPORT = 1  # минимум общих заказов для пары товаров
+RECOMMENDATIONS_MAX_BASKET = 50  # заказы с большим числом товаров пропускаются
+RECOMMENDATIONS_LAG = 5 * 60  # заказы моложе, секунд, ждут следующего обновления
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -176,4 +293,6 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+
 CORS_ALLOW_ALL_ORIGINS = DEBUG  # Разрешить все origins в режиме отладки
@@ -26,6 +26,8 @@ urlpatterns = [
     path("", include("shop_main.urls")),
     path("api/", include(api_router.urls)),
     path("api/v1/", include("shop_main.api_urls")),
+    # Асинхронные версии нагруженных эндпоинтов чтения (под ASGI)
+    path("api/async/", include("shop_main.async_urls")),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,78 @@
+"""Адреса доставки без дублей: один адрес пользователя — одна строка.
+
+Адрес определяется отпечатком ShippingAddress.fingerprint — хэшем полей,
+нормализованных normalize_address. Оформление заказа создает адрес одним
+INSERT ... ON CONFLICT DO NOTHING по уникальной паре (user, fingerprint), а
+если адрес уже есть — читает существующую строку, не перезаписывая ее.
+"""
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ADDRESS_FIELDS, Order, ShippingAddress, address_fingerprint
+
+
+def upsert_address(user, data):
+    """ShippingAddress пользователя с такими полями; новый создается при отсутствии.
+
+    Найденный адрес не меняется: на него ссылаются прошлые заказы, и
+    написание полей в них должно остаться прежним.
+    """
+    table = ShippingAddress._meta.db_table
+    columns = ", ".join(ADDRESS_FIELDS)
+    values = {field: data[field] for field in ADDRESS_FIELDS}
+    fingerprint = address_fingerprint(values)
+    sql = f"""
+        INSERT INTO {table} (user_id, {columns}, fingerprint, created_at)
+        VALUES (%s, {", ".join(["%s"] * len(ADDRESS_FIELDS))}, %s, %s)
+        ON CONFLICT (user_id, fingerprint) DO NOTHING
+        RETURNING id, created_at
+    """
+    params = [user.pk, *values.values(), fingerprint, timezone.now()]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        # Адрес уже есть; отдельный запрос видит и строку, вставленную
+        # параллельной транзакцией после начала INSERT
+        return ShippingAddress.objects.get(user=user, fingerprint=fingerprint)
+    pk, created_at = row
+    return ShippingAddress(
+        id=pk, user=user, fingerprint=fingerprint, created_at=created_at, **values
+    )
+
+
+def merge_duplicate_addresses():
+    """Пересчитывает отпечатки и сливает совпавшие адреса.
+
+    Дубли появляются, если поля меняли в обход save() (QuerySet.update) или
+    изменились правила нормализации. Из каждой группы остается самый новый
+    адрес, заказы перевешиваются на него. Возвращает (число адресов с
+    обновленным отпечатком, число удаленных дублей).
+    """
+    addresses = ShippingAddress.objects.only(
+        "id", "user_id", "fingerprint", *ADDRESS_FIELDS
+    ).order_by("-created_at", "-id")
+    kept = {}
+    duplicates = {}
+    changed = []
+    for address in addresses.iterator():
+        fingerprint = address.compute_fingerprint()
+        keep = kept.setdefault((address.user_id, fingerprint), address)
+        if keep is not address:
+            duplicates.setdefault(keep.pk, []).append(address.pk)
+        elif address.fingerprint != fingerprint:
+            address.fingerprint = fingerprint
+            changed.append(address)
+
+    removed = [pk for group in duplicates.values() for pk in group]
+    with transaction.atomic():
+        for keep_id, group in duplicates.items():
+            Order.objects.filter(shipping_address_id__in=group).update(
+                shipping_address_id=keep_id
+            )
+        # Сначала удаляем дубли: иначе новый отпечаток может совпасть
+        # с еще не удаленной строкой
+        ShippingAddress.objects.filter(pk__in=removed).delete()
+        ShippingAddress.objects.bulk_update(changed, ["fingerprint"], batch_size=1000)
+    return len(changed), len(removed)
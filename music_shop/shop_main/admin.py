@@ -1,4 +1,11 @@
-from django.contrib import admin
+import re
+
+from django.contrib import admin, messages
+from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
 from .models import (
     Product,
     Genre,
@@ -9,17 +16,107 @@ from .models import (
     ShippingAddress,
     Coupon,
     LogEntry,
+    OrderStatusEvent,
 )
+from .counts import count_rows
+from .order_status import bulk_transition
+
+
+class EstimatedCountPaginator(Paginator):
+    """Для большой таблицы без фильтров — оценка числа строк вместо COUNT(*)"""
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, "query", None)
+        if query is not None and not query.where:
+            total, exact = count_rows(self.object_list.model)
+            if not exact:
+                return total
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список большой таблицы: без полного COUNT(*) и без N+1 в строках"""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+def text_search(queryset, field, config, term):
+    """Фильтр по GIN-индексу to_tsvector(config, field); слова — префиксы"""
+    words = re.findall(r"\w+", term)
+    if not words:
+        return queryset.none()
+    query = SearchQuery(
+        " & ".join(f"{word}:*" for word in words), config=config, search_type="raw"
+    )
+    return queryset.annotate(fts=SearchVector(field, config=config)).filter(fts=query)
+
 
+def product_search(term):
+    """Товары, в названии которых есть слова term (индекс по названию)"""
+    return text_search(Product.objects.all(), "product_name", "simple", term)
 
 
-@admin.register(Artist, Genre, OrderItem, Order, Review, Coupon, ShippingAddress)
+@admin.register(Genre)
 class ShopAdmin(admin.ModelAdmin):
     pass
 
 
+@admin.register(Artist)
+class ArtistAdmin(admin.ModelAdmin):
+    list_display = ["artist_name", "country"]
+    search_fields = ["artist_name"]
+
+
+@admin.register(Coupon)
+class CouponAdmin(admin.ModelAdmin):
+    list_display = ["code", "discount_percent", "active", "valid_from", "valid_to"]
+    list_filter = ["active"]
+    search_fields = ["code"]
+
+
+@admin.register(ShippingAddress)
+class ShippingAddressAdmin(LargeTableAdmin):
+    list_display = ["id", "user", "full_name", "city", "address_line"]
+    list_select_related = ["user"]
+    autocomplete_fields = ["user"]
+    # Точные совпадения: по уникальному индексу username и по индексу id
+    search_fields = ["=user__username", "=id"]
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ["id", "order", "product", "quantity", "price_at_order"]
+    list_select_related = ["order__user", "product"]
+    autocomplete_fields = ["order", "product"]
+    search_fields = ["=order__id"]
+
+
+@admin.register(Review)
+class ReviewAdmin(LargeTableAdmin):
+    list_display = ["id", "product", "user", "rating", "created_at"]
+    list_select_related = ["product", "user"]
+    list_filter = ["rating"]
+    autocomplete_fields = ["product", "user"]
+    search_fields = ["product__product_name"]
+
+    def get_search_results(self, request, queryset, search_term):
+        """Название товара или точный username автора"""
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return (
+            queryset.filter(
+                Q(product__in=product_search(term).values("pk"))
+                | Q(user__in=User.objects.filter(username=term).values("pk"))
+            ),
+            False,
+        )
+
+
 @admin.register(LogEntry)
-class LogEntryAdmin(admin.ModelAdmin):
+class LogEntryAdmin(LargeTableAdmin):
     list_display = [
         "id",
         "created_at",
@@ -28,8 +125,11 @@ class LogEntryAdmin(admin.ModelAdmin):
         "description",
         "ip_address",
     ]
-    list_filter = ["action", "created_at", "user"]
-    search_fields = ["description", "user__username", "ip_address"]
+    list_select_related = ["user"]
+    # Без фильтра по пользователю: он выводил в боковую панель всех
+    # пользователей; пользователь ищется по точному username
+    list_filter = ["action", "created_at"]
+    search_fields = ["description"]
     readonly_fields = [
         "user",
         "action",
@@ -40,15 +140,78 @@ class LogEntryAdmin(admin.ModelAdmin):
         "product",
         "created_at",
     ]
-    date_hierarchy = "created_at"
-    
+
+    def get_search_results(self, request, queryset, search_term):
+        """Слова описания (полнотекстовый индекс) или точный username"""
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        matches = text_search(LogEntry.objects.all(), "description", "russian", term)
+        return (
+            queryset.filter(
+                Q(pk__in=matches.values("pk"))
+                | Q(user__in=User.objects.filter(username=term).values("pk"))
+            ),
+            False,
+        )
+
     def has_add_permission(self, request):
         return False  # Запрещаем создание логов вручную
-    
+
     def has_change_permission(self, request, obj=None):
         return False  # Запрещаем редактирование логов
 
 
+def transition_action(to_status, label):
+    """Действие админки: перевести выбранные заказы в to_status"""
+
+    @admin.action(description=f"Перевести в статус «{label}»")
+    def action(modeladmin, request, queryset):
+        moved, skipped = bulk_transition(queryset, to_status, request=request)
+        modeladmin.message_user(
+            request,
+            f"Переведено заказов: {moved}, пропущено (переход запрещен): {skipped}",
+            messages.SUCCESS if moved else messages.WARNING,
+        )
+
+    action.__name__ = f"mark_{to_status}"
+    return action
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ["id", "user", "date_order", "status"]
+    list_select_related = ["user"]
+    list_filter = ["status", "date_order"]
+    autocomplete_fields = ["user", "shipping_address", "coupon"]
+    search_fields = ["=id", "=user__username"]
+    # В «В обработке» (pending) не ведет ни один переход: такое действие всегда пустое
+    actions = [
+        transition_action(status, label)
+        for status, label in Order.STATUS_CHOICES
+        if Order.statuses_leading_to(status)
+    ]
+
+    def save_model(self, request, obj, form, change):
+        # Смену статуса записывает сигнал, ему нужен запрос сотрудника
+        obj._status_request = request
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(OrderStatusEvent)
+class OrderStatusEventAdmin(LargeTableAdmin):
+    list_display = ["order", "from_status", "to_status", "created_at", "actor"]
+    list_filter = ["to_status", "created_at"]
+    list_select_related = ["order__user", "actor"]
+    search_fields = ["=order__id"]
+
+    def has_add_permission(self, request):
+        return False  # История пишется только при смене статуса
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 class ProductAdmin(admin.ModelAdmin):
     model = Product
     list_display = [
@@ -56,9 +219,23 @@ class ProductAdmin(admin.ModelAdmin):
         "price",
         "genre",
         "artist",
+        "limited_release",
     ]
-    list_filter = ["genre", "artist"]
+    list_select_related = ["genre", "artist"]
+    # Исполнитель — через автодополнение, а не список всех в боковой панели
+    list_filter = ["genre", "limited_release"]
+    autocomplete_fields = ["artist"]
     search_fields = ["product_name"]
 
+    def get_search_results(self, request, queryset, search_term):
+        """Слова названия (полнотекстовый индекс) или точный id"""
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        matches = product_search(term)
+        if term.isdigit():
+            return queryset.filter(Q(pk__in=matches.values("pk")) | Q(pk=term)), False
+        return queryset.filter(pk__in=matches.values("pk")), False
+
 
 admin.site.register(Product, ProductAdmin)
@@ -5,9 +5,11 @@ from rest_framework.routers import DefaultRouter
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.conf import settings
 import json
 
 from .models import (
@@ -33,16 +35,58 @@ from .serializers import (
     UserSerializer,
     CartItemSerializer,
     AddToCartSerializer,
+    ReleaseItemSerializer,
     ShippingAddressInputSerializer,
     CheckoutSerializer,
     ApplyCouponSerializer,
     ProductFilterSerializer,
     FavoriteSerializer,
     FavoriteToggleSerializer,
+    BulkOrderTransitionSerializer,
+)
+from .fast_serializers import serialize_products, serialize_orders, serialize_reviews
+from .queries import (
+    has_reviewed,
+    orders_visible_to,
+    reviews_for_product,
+    user_addresses,
+    user_orders,
+)
+from .coupons import (
+    find_active_coupon,
+    is_rate_limited,
+    register_failed_attempt,
+    resolve_coupon,
+)
+from .logger_utils import get_client_ip
+from .replicas import ReplicaReadMixin
+from .trending import record_event, trending
+from .home import home_payload
+from .recommendations import get_recommendations
+from .facets import (
+    catalog_page,
+    compute_facets,
+    filter_by_selection,
+    read_page,
+    read_selection,
+    read_sort,
+    search_catalog,
+)
+from .catalog_index import catalog_index
+from . import holds, stock
+from .idempotency import idempotent
+from .addresses import upsert_address
+from .order_status import bulk_transition
+from .favorites import (
+    add_favorite,
+    annotate_is_favorite,
+    get_favorite_ids,
+    remove_favorite,
+    toggle_favorite,
 )
 
 
-class GenreViewSet(viewsets.ModelViewSet):
+class GenreViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
     permission_classes = [AllowAny]
@@ -52,7 +96,7 @@ class GenreViewSet(viewsets.ModelViewSet):
     ordering = ["genre_name"]
 
 
-class ArtistViewSet(viewsets.ModelViewSet):
+class ArtistViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Artist.objects.all()
     serializer_class = ArtistSerializer
     permission_classes = [AllowAny]
@@ -62,15 +106,18 @@ class ArtistViewSet(viewsets.ModelViewSet):
     ordering = ["artist_name"]
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Product.objects.select_related("genre", "artist").all()
     serializer_class = ProductSerializer
+    replica_actions = ('list', 'retrieve', 'catalog', 'trending', 'also_bought')
     
     def get_permissions(self):
         """
         Разрешаем просмотр для всех, но изменение/удаление только для админов
         """
-        if self.action in ['list', 'retrieve', 'catalog', 'add_to_cart']:
+        if self.action in [
+            'list', 'retrieve', 'catalog', 'trending', 'also_bought', 'add_to_cart'
+        ]:
             permission_classes = [AllowAny]
         else:
             permission_classes = [IsAdminUser]
@@ -85,55 +132,136 @@ class ProductViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def catalog(self, request):
         """Публичный каталог товаров для пользователей"""
-        queryset = self.get_queryset()
-        
+        queryset, search = search_catalog(self.get_queryset(), request.GET)
+
+        # Фасеты (жанр, исполнитель, цена, наличие) фильтруются отдельно,
+        # чтобы по запросу ?facets=1 посчитать их одним группирующим запросом
+        selection = read_selection(request.GET)
+        with_facets = request.GET.get("facets") in ("1", "true")
+        use_index = with_facets and catalog_index.enabled
+        if with_facets and not use_index:
+            count, facets = compute_facets(queryset, selection)
+        queryset = filter_by_selection(queryset, selection)
+
+        sort_by = read_sort(request.GET)
+        queryset = queryset.order_by(sort_by, "pk")
 
-        genre_filter = request.GET.get("genre")
-        if genre_filter:
-            queryset = queryset.filter(genre__genre_name=genre_filter)
-
-        artist_filter = request.GET.get("artist")
-        if artist_filter:
-            queryset = queryset.filter(artist__id=artist_filter)
-
-        min_price = request.GET.get("min_price")
-        max_price = request.GET.get("max_price")
-        if min_price:
-            queryset = queryset.filter(price__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price__lte=max_price)
-
-        search = request.GET.get("search")
-        if search:
-            queryset = queryset.filter(
-                Q(product_name__icontains=search)
-                | Q(artist__artist_name__icontains=search)
+        annotations = ()
+        if request.user.is_authenticated:
+            queryset = annotate_is_favorite(queryset, request.user)
+            annotations = ("is_favorite",)
+
+        if not with_facets:
+            # Без facets=1 каталог остается простым списком, как раньше
+            return Response(
+                serialize_products(queryset, request=request, annotations=annotations)
             )
 
-        sort_by = request.GET.get("sort", "created_at")
-        if sort_by in ["price", "-price", "product_name", "-product_name", "created_at", "-created_at"]:
-            queryset = queryset.order_by(sort_by)
+        page, page_size = read_page(request.GET)
+        offset = (page - 1) * page_size
+        if use_index:
+            # Фильтры, фасеты и сортировка считаются по индексу в памяти,
+            # из БД читаются только товары страницы
+            count, page_ids, facets = catalog_index.search(
+                selection, search, sort_by, offset, page_size
+            )
+            products = {
+                product["id"]: product
+                for product in serialize_products(
+                    queryset.filter(pk__in=page_ids),
+                    request=request,
+                    annotations=annotations,
+                )
+            }
+            results = [products[pk] for pk in page_ids if pk in products]
+        else:
+            results = serialize_products(
+                queryset[offset:offset + page_size],
+                request=request,
+                annotations=annotations,
+            )
+        return Response(catalog_page(
+            request.build_absolute_uri(), page, page_size, count, results, facets
+        ))
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def trending(self, request):
+        """Популярные сейчас товары, по всем жанрам или по одному (?genre=<id>)"""
+        try:
+            genre_id = int(request.GET["genre"]) if request.GET.get("genre") else None
+            limit = int(request.GET["limit"]) if request.GET.get("limit") else None
+        except ValueError:
+            return Response(
+                {"error": "genre и limit должны быть числами"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if limit is not None and limit < 1:
+            return Response(
+                {"error": "limit должен быть положительным"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(trending.top(genre_id, limit))
+
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    def also_bought(self, request, pk=None):
+        """С этим товаром покупают: соседи из индекса совместных покупок"""
+        if not pk.isdigit():
+            return Response(
+                {"error": "Товар не найден"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        try:
+            limit = int(request.GET["limit"]) if request.GET.get("limit") else None
+        except ValueError:
+            return Response(
+                {"error": "limit должен быть числом"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if limit is not None and limit < 1:
+            return Response(
+                {"error": "limit должен быть положительным"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        neighbors = get_recommendations(int(pk), limit)
+        if not neighbors:
+            return Response([])
+
+        products = {
+            product["id"]: product
+            for product in serialize_products(
+                self.get_queryset().filter(pk__in=[row[0] for row in neighbors]),
+                request=request,
+            )
+        }
+        return Response([
+            {**products[neighbor_id], "support": support, "lift": round(lift, 3)}
+            for neighbor_id, support, lift in neighbors
+            if neighbor_id in products
+        ])
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def add_to_cart(self, request, pk=None):
         """Добавить товар в корзину"""
-        product = self.get_object()
-        if product.stock_quantity <= 0:
+        # Остаток берется из кэша, строка товара не загружается
+        available = stock.get(pk) if pk.isdigit() else None
+        if available is None:
+            return Response(
+                {"error": "Товар не найден"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if available <= 0:
             return Response(
                 {"error": "Товар закончился"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-
+        record_event("cart", int(pk))
 
         return Response({"message": "Товар добавлен в корзину"})
 
 
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.select_related("user", "shipping_address", "coupon").all()
+    queryset = Order.objects.all()
     serializer_class = OrderSerializer
     
     def get_permissions(self):
@@ -152,21 +280,53 @@ class OrderViewSet(viewsets.ModelViewSet):
     ordering = ["-date_order"]
 
     def get_queryset(self):
-        if self.request.user.is_staff:
-            return self.queryset
-        return self.queryset.filter(user=self.request.user)
+        return orders_visible_to(self.request.user, self.queryset)
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @idempotent
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        # Сотрудник, сменивший статус, попадает в историю заказа
+        serializer.instance._status_request = self.request
+        serializer.save()
+
+    @idempotent
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def bulk_transition(self, request):
+        """Перевести заказы (по ids и/или фильтру) в статус to_status"""
+        serializer = BulkOrderTransitionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        orders = Order.objects.all()
+        if "ids" in data:
+            orders = orders.filter(pk__in=data["ids"])
+        if "status" in data:
+            orders = orders.filter(status=data["status"])
+        if "date_from" in data:
+            orders = orders.filter(date_order__gte=data["date_from"])
+        if "date_to" in data:
+            orders = orders.filter(date_order__lt=data["date_to"])
+
+        moved, skipped = bulk_transition(orders, data["to_status"], request=request)
+        return Response(
+            {"to_status": data["to_status"], "moved": moved, "skipped": skipped}
+        )
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_orders(self, request):
         """Получить заказы текущего пользователя"""
-        from django.db.models import Prefetch
-        orders = Order.objects.filter(user=request.user).select_related(
-            'user', 'shipping_address', 'coupon'
-        ).prefetch_related(
-            Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('product'))
-        ).order_by("-date_order")
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data)
+        return Response(serialize_orders(user_orders(request.user)))
 
 
 class OrderItemViewSet(viewsets.ModelViewSet):
@@ -177,9 +337,10 @@ class OrderItemViewSet(viewsets.ModelViewSet):
     search_fields = ["product__product_name"]
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Review.objects.select_related("user", "product").all()
     serializer_class = ReviewSerializer
+    replica_actions = ('product_reviews',)
     permission_classes = [IsAdminUser]
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ["text"]
@@ -196,9 +357,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        reviews = Review.objects.filter(product_id=product_id).select_related("user").order_by("-created_at")
-        serializer = self.get_serializer(reviews, many=True)
-        return Response(serializer.data)
+        return Response(serialize_reviews(reviews_for_product(product_id)))
 
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def create_review(self, request):
@@ -206,7 +365,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
 
-            if Review.objects.filter(user=request.user, product_id=request.data.get('product')).exists():
+            if has_reviewed(request.user, request.data.get('product')):
                 return Response(
                     {"error": "Вы уже оставили отзыв на этот товар"}, 
                     status=status.HTTP_400_BAD_REQUEST
@@ -228,11 +387,14 @@ class ShippingAddressViewSet(viewsets.ModelViewSet):
             return self.queryset
         return self.queryset.filter(user=self.request.user)
 
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = upsert_address(data['user'], data)
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_addresses(self, request):
         """Получить адреса текущего пользователя"""
-        addresses = ShippingAddress.objects.filter(user=request.user).order_by("-created_at")
-        serializer = self.get_serializer(addresses, many=True)
+        serializer = self.get_serializer(user_addresses(request.user), many=True)
         return Response(serializer.data)
 
 
@@ -253,25 +415,30 @@ class CouponViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            coupon = Coupon.objects.get(code__iexact=code, active=True)
-            now = timezone.now()
-            
-            if ((coupon.valid_from and coupon.valid_from > now) or 
-                (coupon.valid_to and coupon.valid_to < now)):
-                return Response(
-                    {"error": "Купон недействителен"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            serializer = self.get_serializer(coupon)
-            return Response(serializer.data)
-        except Coupon.DoesNotExist:
+        client_ip = get_client_ip(request)
+        if is_rate_limited(client_ip):
+            return Response(
+                {"error": "Слишком много попыток, попробуйте позже"},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+
+        coupon = find_active_coupon(code)
+        if coupon is None:
+            register_failed_attempt(client_ip)
             return Response(
                 {"error": "Купон не найден"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        if not coupon.is_valid_at(timezone.now()):
+            return Response(
+                {"error": "Купон недействителен"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = self.get_serializer(coupon)
+        return Response(serializer.data)
+
 
 class CartViewSet(viewsets.ViewSet):
     
@@ -292,7 +459,13 @@ class CartViewSet(viewsets.ViewSet):
             cart = {}
         
         product_ids = [int(pid) for pid in cart.keys()]
-        products = {p.id: p for p in Product.objects.filter(id__in=product_ids)}
+        # Одним запросом вместе с жанром и исполнителем, без ProductSerializer
+        products = {
+            p["id"]: p
+            for p in serialize_products(
+                Product.objects.filter(id__in=product_ids)
+            )
+        }
         items = []
         total = 0.0
         
@@ -301,12 +474,12 @@ class CartViewSet(viewsets.ViewSet):
             product = products.get(pid_int)
             if not product:
                 continue
-            price = float(product.price)
+            price = float(product["price"])
             subtotal = price * qty
             total += subtotal
             items.append({
                 "id": pid_int,
-                "product": ProductSerializer(product).data,
+                "product": product,
                 "quantity": qty,
                 "price": price,
                 "subtotal": subtotal,
@@ -315,29 +488,59 @@ class CartViewSet(viewsets.ViewSet):
         return Response({"items": items, "total": total})
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def add_item(self, request):
         """Добавить товар в корзину"""
         serializer = AddToCartSerializer(data=request.data)
         if serializer.is_valid():
             product_id = serializer.validated_data['product_id']
-            try:
-                product = Product.objects.get(id=product_id)
-                if product.stock_quantity <= 0:
-                    return Response(
-                        {"error": "Товар закончился"}, 
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                
-
-                return Response({"message": "Товар добавлен в корзину"})
-            except Product.DoesNotExist:
+            available = stock.get(product_id)
+            if available is None:
                 return Response(
                     {"error": "Товар не найден"}, 
                     status=status.HTTP_404_NOT_FOUND
                 )
+            if available <= 0:
+                return Response(
+                    {"error": "Товар закончился"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            data = {"message": "Товар добавлен в корзину"}
+            if product_id in holds.limited_product_ids():
+                # Лимитированный тираж: экземпляры бронируются на время
+                expires_at = holds.place_hold(
+                    holds.owner_key(request),
+                    product_id,
+                    serializer.validated_data['quantity'],
+                )
+                if expires_at is None:
+                    return Response(
+                        {"error": "Товар закончился"}, 
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                data["hold_expires_at"] = expires_at
+            
+            record_event("cart", product_id)
+            return Response(data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['post'])
+    @idempotent
+    def release_item(self, request):
+        """Снять бронь товара при уменьшении количества или удалении из корзины"""
+        serializer = ReleaseItemSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        held = holds.release_hold(
+            holds.owner_key(request),
+            serializer.validated_data['product_id'],
+            serializer.validated_data.get('quantity'),
+        )
+        return Response({"held": held})
+
+    @action(detail=False, methods=['post'])
+    @idempotent
     def checkout(self, request):
         """Оформить заказ"""
 
@@ -371,57 +574,54 @@ class CartViewSet(viewsets.ViewSet):
 
         if request.user.is_authenticated:
 
-            shipping_address = ShippingAddress.objects.create(
-                user=request.user,
-                full_name=address_data['full_name'],
-                phone=address_data['phone'],
-                city=address_data['city'],
-                address_line=address_data['address_line'],
-                postal_code=address_data['postal_code']
-            )
+            # Тот же адрес, что и в прошлых заказах, переиспользуется
+            shipping_address = upsert_address(request.user, address_data)
             
 
             product_ids = [int(pid) for pid in cart.keys()]
             products = {p.id: p for p in Product.objects.filter(id__in=product_ids)}
             
 
-            order = Order.objects.create(
-                user=request.user,
-                status="pending",
-                shipping_address=shipping_address
-            )
-            
+            coupon = None
             coupon_code = serializer.validated_data.get('coupon_code', '').strip()
             if coupon_code:
-                try:
-                    coupon = Coupon.objects.get(code__iexact=coupon_code, active=True)
-                    now = timezone.now()
-                    if ((not coupon.valid_from or coupon.valid_from <= now) and 
-                        (not coupon.valid_to or coupon.valid_to >= now)):
-                        order.coupon = coupon
-                        order.save()
-                except Coupon.DoesNotExist:
-                    pass
-            
-
-            for pid_str, qty in cart.items():
-                pid = int(pid_str)
-                product = products.get(pid)
-                if not product:
-                    continue
-                if product.stock_quantity < qty:
-                    qty = product.stock_quantity
-                if qty <= 0:
-                    continue
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=qty,
-                    price_at_order=product.price
+                coupon = resolve_coupon(coupon_code)
+
+            # Заказ и его позиции фиксируются одной транзакцией: иначе
+            # читатели (например, refresh_recommendations) видят заказ без
+            # части позиций
+            purchased = []
+            with transaction.atomic():
+                order = Order.objects.create(
+                    user=request.user,
+                    status="pending",
+                    shipping_address=shipping_address,
+                    coupon=coupon
                 )
 
-                product.stock_quantity -= qty
-                product.save()
+                for pid_str, qty in cart.items():
+                    pid = int(pid_str)
+                    product = products.get(pid)
+                    if not product:
+                        continue
+                    # Списание условным UPDATE: позиция урезается до остатка,
+                    # и одновременные заказы не уводят остаток в минус.
+                    # Лимитированный тираж списывается за счет брони корзины
+                    if product.limited_release:
+                        qty = holds.convert_hold(holds.owner_key(request), pid, qty)
+                    else:
+                        qty = stock.reserve(pid, qty, partial=True)
+                    if qty <= 0:
+                        continue
+                    OrderItem.objects.create(
+                        order=order,
+                        product=product,
+                        quantity=qty,
+                        price_at_order=product.price
+                    )
+                    purchased.append((product.id, qty))
+            for product_id, qty in purchased:
+                record_event("purchase", product_id, qty)
             
             # Логируем создание заказа ПОСЛЕ создания всех OrderItem'ов
             from .logger_utils import create_log_entry
@@ -480,15 +680,21 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         return Favorite.objects.filter(user=self.request.user).select_related("product")
 
     def perform_create(self, serializer):
+        # Кэш id избранного сбрасывают сигналы post_save и post_delete
         serializer.save(user=self.request.user)
 
     @action(detail=False, methods=["get"])
     def products(self, request):
         """Вернуть список товаров (Product) из избранного"""
-        favorites = self.get_queryset()
-        products = [fav.product for fav in favorites]
-        data = ProductSerializer(products, many=True).data
-        return Response(data)
+        products = Product.objects.filter(favorited_by__user=request.user).order_by(
+            "-favorited_by__created_at"
+        )
+        return Response(serialize_products(products))
+
+    @action(detail=False, methods=["get"])
+    def ids(self, request):
+        """Вернуть только id избранных товаров"""
+        return Response(get_favorite_ids(request.user))
 
     @action(detail=False, methods=["post"])
     def toggle(self, request):
@@ -496,11 +702,7 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         serializer = FavoriteToggleSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         product = serializer.validated_data["product"]
-        fav, created = Favorite.objects.get_or_create(user=request.user, product=product)
-        if not created:
-            fav.delete()
-            return Response({"status": "removed"})
-        return Response({"status": "added"})
+        return Response({"status": toggle_favorite(request.user, product)})
 
     @action(detail=False, methods=["post"])
     def add(self, request):
@@ -508,7 +710,7 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         serializer = FavoriteToggleSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         product = serializer.validated_data["product"]
-        Favorite.objects.get_or_create(user=request.user, product=product)
+        add_favorite(request.user, product)
         return Response({"status": "added"})
 
     @action(detail=False, methods=["post"])
@@ -517,10 +719,19 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         serializer = FavoriteToggleSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         product = serializer.validated_data["product"]
-        Favorite.objects.filter(user=request.user, product=product).delete()
+        remove_favorite(request.user, product)
         return Response({"status": "removed"})
 
 
+class HomeViewSet(viewsets.ViewSet):
+    """Данные главной страницы одним запросом (shop_main.home)"""
+
+    permission_classes = [AllowAny]
+
+    def list(self, request):
+        return Response(home_payload())
+
+
 router = DefaultRouter()
 router.register(r"genres", GenreViewSet, basename="genre")
 router.register(r"artists", ArtistViewSet, basename="artist")
@@ -533,3 +744,4 @@ router.register(r"coupons", CouponViewSet, basename="coupon")
 router.register(r"cart", CartViewSet, basename="cart")
 router.register(r"users", UserViewSet, basename="user")
 router.register(r"favorites", FavoriteViewSet, basename="favorite")
+router.register(r"home", HomeViewSet, basename="home")
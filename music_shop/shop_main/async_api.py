@@ -0,0 +1,316 @@
+"""Асинхронные версии самых нагруженных эндпоинтов чтения (для ASGI).
+
+Каталог, карточка товара, отзывы к товару, id избранного и проверка купона
+доступны по /api/async/ с теми же параметрами и тем же форматом ответа, что
+и соответствующие эндпоинты /api/v1/. Там же поток живых обновлений
+events (Server-Sent Events), работающий только под ASGI. Представления — обычные async-функции
+Django без DRF: данные читаются асинхронным ORM и асинхронными вызовами кэша,
+пользователь берется из сессии (request.auser()).
+
+Под ASGI (music_shop.asgi:application) запрос, ожидающий БД или кэш, не
+занимает поток воркера. Под WSGI эти адреса тоже работают, но выигрыша не
+дают. Сравнение развертываний — команда bench_async.
+
+Django открывает отдельное соединение с БД для каждого выполняющегося
+async-запроса, поэтому одновременно к БД допускается не больше
+ASYNC_DB_CONCURRENCY запросов на процесс, остальные ждут в цикле событий.
+"""
+
+import asyncio
+import functools
+import json
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import NotAuthenticated
+
+from . import stock
+from .catalog_index import catalog_index
+from .coupons import afind_active_coupon, aregister_failed_attempt, ais_rate_limited
+from .facets import (
+    acompute_facets,
+    catalog_page,
+    filter_by_selection,
+    read_page,
+    read_selection,
+    read_sort,
+    search_catalog,
+)
+from .fast_serializers import (
+    aserialize_products,
+    aserialize_reviews,
+    format_datetime,
+)
+from .favorites import aget_favorite_ids, annotate_is_favorite
+from .live import live_hub, order_channel, stock_channel
+from .logger_utils import get_client_ip
+from .models import Product
+from .queries import reviews_for_product
+from .replicas import replica_view
+from .renderers import FastJSONRenderer
+
+_renderer = FastJSONRenderer()
+_db_slots = weakref.WeakKeyDictionary()
+
+
+def _db_slot():
+    # Семафор привязан к циклу событий, поэтому свой для каждого цикла
+    loop = asyncio.get_running_loop()
+    slot = _db_slots.get(loop)
+    if slot is None:
+        slot = _db_slots[loop] = asyncio.Semaphore(
+            getattr(settings, "ASYNC_DB_CONCURRENCY", 20)
+        )
+    return slot
+
+
+def _close_connections():
+    # Внутри транзакции (тесты) соединение закрывать нельзя
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+def db_bound(view):
+    """Ограничивает число async-запросов, одновременно работающих с БД.
+
+    Соединение запроса закрывается до освобождения места, а не по сигналу
+    request_finished: под нагрузкой он приходит заметно позже.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        async with _db_slot():
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                await sync_to_async(_close_connections)()
+
+    return wrapper
+
+
+def _json(data, status=200):
+    """JSON-ответ, байт в байт совпадающий с ответом DRF"""
+    return HttpResponse(
+        _renderer.render(data), status=status, content_type="application/json"
+    )
+
+
+def _request_data(request):
+    """Тело запроса в JSON или как форма — как request.data в DRF"""
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+    return request.POST
+
+
+def _products():
+    return Product.objects.select_related("genre", "artist")
+
+
+@require_GET
+@db_bound
+@replica_view
+async def catalog(request):
+    """Асинхронный /api/v1/products/catalog/"""
+    queryset, search = search_catalog(_products(), request.GET)
+    selection = read_selection(request.GET)
+    with_facets = request.GET.get("facets") in ("1", "true")
+    use_index = with_facets and catalog_index.enabled
+    if with_facets and not use_index:
+        count, facets = await acompute_facets(queryset, selection)
+    sort_by = read_sort(request.GET)
+    queryset = filter_by_selection(queryset, selection).order_by(sort_by, "pk")
+
+    annotations = ()
+    user = await request.auser()
+    if user.is_authenticated:
+        queryset = annotate_is_favorite(queryset, user)
+        annotations = ("is_favorite",)
+
+    if not with_facets:
+        return _json(
+            await aserialize_products(
+                queryset, request=request, annotations=annotations
+            )
+        )
+
+    page, page_size = read_page(request.GET)
+    offset = (page - 1) * page_size
+    if use_index:
+        # Построение и обновление индекса читают БД синхронно
+        count, page_ids, facets = await sync_to_async(catalog_index.search)(
+            selection, search, sort_by, offset, page_size
+        )
+        products = {
+            product["id"]: product
+            for product in await aserialize_products(
+                queryset.filter(pk__in=page_ids),
+                request=request,
+                annotations=annotations,
+            )
+        }
+        results = [products[pk] for pk in page_ids if pk in products]
+    else:
+        results = await aserialize_products(
+            queryset[offset : offset + page_size],
+            request=request,
+            annotations=annotations,
+        )
+    return _json(
+        catalog_page(
+            request.build_absolute_uri(), page, page_size, count, results, facets
+        )
+    )
+
+
+@require_GET
+@db_bound
+@replica_view
+async def product_detail(request, pk):
+    """Асинхронный /api/v1/products/<pk>/"""
+    products = await aserialize_products(_products().filter(pk=pk), request=request)
+    if not products:
+        # Тот же текст, что у get_object_or_404 в DRF
+        return _json({"detail": "No Product matches the given query."}, status=404)
+    return _json(products[0])
+
+
+@require_GET
+@db_bound
+@replica_view
+async def product_reviews(request):
+    """Асинхронный /api/v1/reviews/product_reviews/"""
+    product_id = request.GET.get("product_id")
+    if not product_id:
+        return _json({"error": "product_id обязателен"}, status=400)
+    if not product_id.isdigit():
+        return _json({"error": "product_id должен быть числом"}, status=400)
+    return _json(await aserialize_reviews(reviews_for_product(product_id)))
+
+
+@require_GET
+@db_bound
+async def favorite_ids(request):
+    """Асинхронный /api/v1/favorites/ids/"""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return _json({"detail": str(NotAuthenticated.default_detail)}, status=403)
+    return _json(await aget_favorite_ids(user))
+
+
+# Как и validate_coupon в DRF, доступна без входа и без CSRF-токена:
+# проверка ничего не меняет, кроме счетчика неудачных попыток
+@csrf_exempt
+@require_POST
+@db_bound
+async def validate_coupon(request):
+    """Асинхронный /api/v1/coupons/validate_coupon/"""
+    code = str(_request_data(request).get("code") or "").strip()
+    if not code:
+        return _json({"error": "Код купона обязателен"}, status=400)
+
+    client_ip = get_client_ip(request)
+    if await ais_rate_limited(client_ip):
+        return _json({"error": "Слишком много попыток, попробуйте позже"}, status=429)
+
+    coupon = await afind_active_coupon(code)
+    if coupon is None:
+        await aregister_failed_attempt(client_ip)
+        return _json({"error": "Купон не найден"}, status=404)
+
+    if not coupon.is_valid_at(timezone.now()):
+        return _json({"error": "Купон недействителен"}, status=400)
+
+    return _json(
+        {
+            "id": coupon.id,
+            "code": coupon.code,
+            "discount_percent": coupon.discount_percent,
+            "active": coupon.active,
+            "valid_from": format_datetime(coupon.valid_from),
+            "valid_to": format_datetime(coupon.valid_to),
+        }
+    )
+
+
+def _sse(event, data):
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n".encode()
+
+
+def _watched_products(request):
+    """id товаров из ?products=1,2,3 без повторов и не больше лимита"""
+    ids = [
+        int(value)
+        for value in request.GET.get("products", "").split(",")
+        if value.strip().isdigit()
+    ]
+    limit = getattr(settings, "LIVE_EVENTS_MAX_PRODUCTS", 50)
+    return list(dict.fromkeys(ids))[:limit]
+
+
+@require_GET
+async def events(request):
+    """Поток SSE: статусы заказов пользователя и остатки товаров ?products=.
+
+    Сразу после подключения присылает текущие остатки, затем события
+    order_status и stock по мере изменений и комментарий-пинг каждые
+    LIVE_EVENTS_HEARTBEAT секунд, чтобы прокси не закрывали соединение.
+    """
+    product_ids = _watched_products(request)
+    # Соединение с БД нужно только здесь: поток открыт долго, держать его
+    # соединение все это время нельзя
+    async with _db_slot():
+        try:
+            user = await request.auser()
+            channels = [stock_channel(pk) for pk in product_ids]
+            if user.is_authenticated:
+                channels.append(order_channel(user.pk))
+            if not channels:
+                return _json({"error": "Нет событий для подписки"}, status=400)
+            # Подписка до чтения остатков, чтобы не потерять изменения между ними
+            subscription = live_hub.subscribe(channels)
+            try:
+                snapshot = await sync_to_async(stock.get_many)(product_ids)
+            except BaseException:
+                # Поток не начнется, и его finally подписку не снимет
+                live_hub.unsubscribe(subscription)
+                raise
+        finally:
+            await sync_to_async(_close_connections)()
+
+    heartbeat = getattr(settings, "LIVE_EVENTS_HEARTBEAT", 15)
+
+    async def stream():
+        try:
+            yield b"retry: 3000\n\n"
+            for pk, quantity in snapshot.items():
+                yield _sse(
+                    "stock",
+                    {"type": "stock", "product_id": pk, "stock_quantity": quantity},
+                )
+            while True:
+                event = await subscription.get(heartbeat)
+                if subscription.overflowed:
+                    return
+                if event is None:
+                    yield b": ping\n\n"
+                else:
+                    yield _sse(event["type"], event)
+        finally:
+            live_hub.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Отключает буферизацию ответа в nginx
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,20 @@
+from django.urls import path
+
+from . import async_api
+
+urlpatterns = [
+    path("products/catalog/", async_api.catalog, name="async-catalog"),
+    path("products/<int:pk>/", async_api.product_detail, name="async-product-detail"),
+    path(
+        "reviews/product_reviews/",
+        async_api.product_reviews,
+        name="async-product-reviews",
+    ),
+    path("favorites/ids/", async_api.favorite_ids, name="async-favorite-ids"),
+    path(
+        "coupons/validate_coupon/",
+        async_api.validate_coupon,
+        name="async-validate-coupon",
+    ),
+    path("events/", async_api.events, name="async-events"),
+]
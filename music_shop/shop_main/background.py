@@ -0,0 +1,48 @@
+"""Фоновый сброс буферов процесса в БД (просмотры, популярность).
+
+Поток запускается лениво, при первом событии, и раз в interval() секунд
+вызывает flush; wake() будит его раньше, например когда буфер переполнен.
+После сброса соединение потока закрывается, чтобы не держать его до
+следующего раза.
+"""
+
+import logging
+import threading
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundFlusher:
+    def __init__(self, name, flush, interval):
+        self._name = name
+        self._flush = flush
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=self._name, daemon=True
+                )
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self._interval())
+            self._wake.clear()
+            try:
+                self._flush()
+            except Exception:
+                logger.exception("Фоновый сброс %s завершился ошибкой", self._name)
+            finally:
+                connection.close()
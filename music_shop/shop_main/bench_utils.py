@@ -0,0 +1,146 @@
+"""Вспомогательные функции для бенчмарков (management-команды bench_*)"""
+
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import (
+    Artist,
+    Coupon,
+    Genre,
+    Order,
+    OrderItem,
+    Product,
+    Review,
+    ShippingAddress,
+)
+
+
+class Rollback(Exception):
+    """Бросается в конце бенчмарка, чтобы откатить тестовые данные"""
+
+
+def seed_dataset(products=500, orders=200, items_per_order=3, reviews=500, users=20):
+    """Наполняет БД синтетическими данными через bulk_create.
+
+    Вызывать внутри transaction.atomic(), чтобы данные можно было откатить.
+    """
+    rnd = random.Random(42)
+    genres = [
+        Genre.objects.create(genre_name=value, description="bench")
+        for value in Genre.GenreChoices.values
+    ]
+    artists = Artist.objects.bulk_create(
+        [Artist(artist_name=f"Bench Artist {i}", country="XX") for i in range(50)]
+    )
+    product_objs = Product.objects.bulk_create(
+        [
+            Product(
+                product_name=f"Bench Album {i}",
+                description="Синтетическое описание пластинки " * 4,
+                price=Decimal(f"{rnd.randint(500, 9000)}.{rnd.randint(0, 99):02d}"),
+                stock_quantity=rnd.randint(0, 50),
+                picture=f"products/images/bench_{i}.png" if i % 3 else None,
+                genre=rnd.choice(genres),
+                artist=artists[i % len(artists)],
+            )
+            for i in range(products)
+        ]
+    )
+    user_objs = User.objects.bulk_create(
+        [User(username=f"bench_user_{i}") for i in range(users)]
+    )
+    coupon = Coupon.objects.create(code="BENCH10", discount_percent=10)
+    addresses = [
+        ShippingAddress(
+            user=user,
+            full_name=user.username,
+            phone="+70000000000",
+            city="Москва",
+            address_line="ул. Тестовая, 1",
+            postal_code="101000",
+        )
+        for user in user_objs
+    ]
+    # bulk_create не вызывает save(), отпечаток адреса считаем сами
+    for address in addresses:
+        address.fingerprint = address.compute_fingerprint()
+    addresses = ShippingAddress.objects.bulk_create(addresses)
+    order_objs = Order.objects.bulk_create(
+        [
+            Order(
+                user=user_objs[i % users],
+                shipping_address=addresses[i % users],
+                coupon=coupon if i % 4 == 0 else None,
+            )
+            for i in range(orders)
+        ]
+    )
+    OrderItem.objects.bulk_create(
+        [
+            OrderItem(
+                order=order,
+                product=product,
+                quantity=rnd.randint(1, 3),
+                price_at_order=product.price,
+            )
+            for order in order_objs
+            for product in rnd.sample(product_objs, items_per_order)
+        ]
+    )
+    Review.objects.bulk_create(
+        [
+            Review(
+                rating=rnd.randint(1, 5),
+                text="Отличная пластинка",
+                user=user_objs[i % users],
+                product=product_objs[i % products],
+            )
+            for i in range(reviews)
+        ]
+    )
+    return {
+        "genres": genres,
+        "artists": artists,
+        "products": product_objs,
+        "orders": order_objs,
+        "users": user_objs,
+        "coupon": coupon,
+    }
+
+
+def delete_dataset(data):
+    """Удаляет данные seed_dataset, сохраненные без отката (для многопроцессных
+    бенчмарков, где серверу нужны закоммиченные данные)"""
+    with transaction.atomic():
+        User.objects.filter(pk__in=[user.pk for user in data["users"]]).delete()
+        Genre.objects.filter(pk__in=[genre.pk for genre in data["genres"]]).delete()
+        Artist.objects.filter(pk__in=[artist.pk for artist in data["artists"]]).delete()
+        data["coupon"].delete()
+
+
+def best_time(func, repeat=5):
+    """Минимальное время выполнения func() в секундах из repeat запусков"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run_with_rollback(func):
+    """Выполняет func() в транзакции и откатывает все изменения"""
+    result = None
+    try:
+        with transaction.atomic():
+            result = func()
+            raise Rollback()
+    except Rollback:
+        pass
+    return result
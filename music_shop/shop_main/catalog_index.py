@@ -0,0 +1,320 @@
+"""Колоночный индекс каталога в памяти процесса (необязательный, нужен numpy).
+
+Все товары помещаются в память, поэтому фильтрация, подсчет фасетов,
+сортировка и разбиение на страницы для каталога с ?facets=1 выполняются над
+массивами numpy без обращения к PostgreSQL. Из БД загружаются только товары
+текущей страницы.
+
+Индекс строится при первом запросе и поддерживается в актуальном состоянии:
+раз в CATALOG_INDEX_POLL_INTERVAL секунд подгружаются товары с updated_at
+новее уже учтенных, удаления в этом процессе приходят сигналом post_delete,
+а раз в CATALOG_INDEX_REBUILD_INTERVAL секунд индекс строится заново, чтобы
+учесть удаления в других процессах и переименования жанров и исполнителей.
+
+Сортировка по названию берет порядок из самой БД, поэтому совпадает с
+правилами сравнения строк PostgreSQL.
+"""
+
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from .facets import format_facets, price_buckets
+from .models import Product
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy необязателен
+    np = None
+
+SORT_KEYS = {
+    "price": "price_cents",
+    "created_at": "created_us",
+    "product_name": "name_rank",
+}
+
+ROW_FIELDS = (
+    "id",
+    "price",
+    "genre__genre_name",
+    "artist_id",
+    "artist__artist_name",
+    "created_at",
+    "stock_quantity",
+    "product_name",
+    "updated_at",
+)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cents(value, rounding=int):
+    return rounding(value * 100)
+
+
+class Columns:
+    """Неизменяемый снимок индекса: изменения создают новый снимок"""
+
+    def __init__(self, rows, genres, artist_names, name_order):
+        self.genres = genres
+        self.artist_names = artist_names
+        genre_codes = {genre: code for code, genre in enumerate(genres)}
+
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.price_cents = np.array([_cents(row[1]) for row in rows], dtype=np.int64)
+        self.genre_codes = np.array(
+            [genre_codes[row[2]] for row in rows], dtype=np.int32
+        )
+        self.artist_ids = np.array([row[3] for row in rows], dtype=np.int64)
+        self.created_us = np.array(
+            [int(row[5].timestamp() * 1_000_000) for row in rows], dtype=np.int64
+        )
+        self.stock = np.array([row[6] for row in rows], dtype=np.int32)
+        # Строка для поиска без учета регистра по названию и исполнителю
+        self.search_text = np.array(
+            [f"{row[7]}\x00{row[4]}".lower() for row in rows], dtype=np.str_
+        )
+
+        self.positions = {product_id: pos for pos, product_id in enumerate(self.ids)}
+        self.name_rank = np.zeros(len(rows), dtype=np.int64)
+        for rank, product_id in enumerate(name_order):
+            pos = self.positions.get(product_id)
+            if pos is not None:
+                self.name_rank[pos] = rank
+
+    @property
+    def arrays(self):
+        return [
+            self.ids,
+            self.price_cents,
+            self.genre_codes,
+            self.artist_ids,
+            self.created_us,
+            self.stock,
+            self.search_text,
+            self.name_rank,
+        ]
+
+    def memory_bytes(self):
+        return sum(array.nbytes for array in self.arrays)
+
+    def can_update(self, old_row, row):
+        """Можно ли обновить строку на месте, не перестраивая снимок.
+
+        Название и исполнитель входят в search_text и name_rank, поэтому при
+        их смене снимок строится заново.
+        """
+        return (
+            old_row is not None
+            and old_row[7] == row[7]
+            and old_row[3:5] == row[3:5]
+            and row[2] in self.genres
+            and self.artist_names.get(row[3]) == row[4]
+        )
+
+    def updated(self, rows):
+        """Копия снимка, где строки rows (уже существующих товаров) обновлены"""
+        copy = object.__new__(Columns)
+        copy.__dict__.update(self.__dict__)
+        positions = [self.positions[row[0]] for row in rows]
+        copy.price_cents = self.price_cents.copy()
+        copy.price_cents[positions] = [_cents(row[1]) for row in rows]
+        copy.genre_codes = self.genre_codes.copy()
+        copy.genre_codes[positions] = [self.genres.index(row[2]) for row in rows]
+        copy.stock = self.stock.copy()
+        copy.stock[positions] = [row[6] for row in rows]
+        return copy
+
+
+class CatalogIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._columns = None
+        self._rows = {}
+        self._watermark = None
+        self._built_at = 0.0
+        self._polled_at = 0.0
+        self._poll_now = False
+        self._deleted = set()
+        self.build_seconds = None
+
+    @property
+    def available(self):
+        return np is not None
+
+    @property
+    def enabled(self):
+        return self.available and _setting("CATALOG_INDEX_ENABLED", False)
+
+    def _name_order(self):
+        return list(
+            Product.objects.order_by("product_name", "pk").values_list("pk", flat=True)
+        )
+
+    def _snapshot(self):
+        rows = sorted(self._rows.values())
+        genres = sorted({row[2] for row in rows})
+        artist_names = {row[3]: row[4] for row in rows}
+        return Columns(rows, genres, artist_names, self._name_order())
+
+    def build(self):
+        """Строит индекс заново по всем товарам"""
+        started = time.perf_counter()
+        rows = Product.objects.values_list(*ROW_FIELDS)
+        self._rows = {row[0]: row for row in rows}
+        self._deleted = set()
+        self._watermark = max((row[8] for row in self._rows.values()), default=None)
+        self._columns = self._snapshot()
+        self._built_at = self._polled_at = time.monotonic()
+        self._poll_now = False
+        self.build_seconds = time.perf_counter() - started
+
+    def _poll(self):
+        changed = Product.objects.all()
+        if self._watermark is not None:
+            # >= вместо >: изменения с тем же updated_at могли прийти после опроса
+            changed = changed.filter(updated_at__gte=self._watermark)
+        rows = list(changed.values_list(*ROW_FIELDS))
+        deleted, self._deleted = self._deleted, set()
+        updated = [row for row in rows if self._rows.get(row[0]) != row]
+        in_place = not deleted and all(
+            self._columns.can_update(self._rows.get(row[0]), row) for row in updated
+        )
+        for row in updated:
+            self._rows[row[0]] = row
+        for product_id in deleted:
+            self._rows.pop(product_id, None)
+        if in_place and updated:
+            # Частый случай — изменились цена или остаток: копируем массивы
+            # и правим нужные позиции, не разбирая заново все строки
+            self._columns = self._columns.updated(updated)
+        elif updated or deleted:
+            self._columns = self._snapshot()
+        if rows:
+            self._watermark = max(row[8] for row in rows)
+        self._polled_at = time.monotonic()
+        self._poll_now = False
+
+    def columns(self):
+        """Актуальный снимок индекса (строит или обновляет его при необходимости)"""
+        now = time.monotonic()
+        rebuild = _setting("CATALOG_INDEX_REBUILD_INTERVAL", 600)
+        poll = _setting("CATALOG_INDEX_POLL_INTERVAL", 5)
+        if self._columns is None or now - self._built_at > rebuild:
+            with self._lock:
+                if self._columns is None or now - self._built_at > rebuild:
+                    self.build()
+        elif self._poll_now or now - self._polled_at > poll:
+            with self._lock:
+                if self._poll_now or now - self._polled_at > poll:
+                    self._poll()
+        return self._columns
+
+    def product_changed(self, product_id, deleted=False):
+        """Отмечает изменение товара, чтобы учесть его при следующем запросе"""
+        if deleted:
+            # Под блокировкой: _poll забирает множество и подменяет его пустым
+            with self._lock:
+                self._deleted.add(product_id)
+        self._poll_now = True
+
+    def invalidate(self):
+        with self._lock:
+            self._columns = None
+
+    def stats(self):
+        columns = self._columns
+        return {
+            "rows": len(columns.ids) if columns is not None else 0,
+            "memory_bytes": columns.memory_bytes() if columns is not None else 0,
+            "build_seconds": self.build_seconds,
+        }
+
+    def search(self, selection, search="", sort="created_at", offset=0, limit=24):
+        """Возвращает (число товаров, id товаров страницы, фасеты)"""
+        columns = self.columns()
+        base = np.ones(len(columns.ids), dtype=bool)
+        if search:
+            base &= np.char.find(columns.search_text, search.lower()) >= 0
+
+        masks = {}
+        if selection["genre"]:
+            if selection["genre"] in columns.genres:
+                code = columns.genres.index(selection["genre"])
+                masks["genre"] = columns.genre_codes == code
+            else:
+                masks["genre"] = np.zeros_like(base)
+        if selection["artist"]:
+            masks["artist"] = columns.artist_ids == selection["artist"]
+        price_mask = np.ones_like(base)
+        if selection["min_price"] is not None:
+            min_cents = _cents(selection["min_price"], math.ceil)
+            price_mask &= columns.price_cents >= min_cents
+        if selection["max_price"] is not None:
+            max_cents = _cents(selection["max_price"], math.floor)
+            price_mask &= columns.price_cents <= max_cents
+        masks["price"] = price_mask
+        if selection["in_stock"]:
+            masks["in_stock"] = columns.stock > 0
+
+        def combined(skip=None):
+            mask = base.copy()
+            for name, facet_mask in masks.items():
+                if name != skip:
+                    mask &= facet_mask
+            return mask
+
+        matched = np.flatnonzero(combined())
+        facets = self._facets(columns, combined)
+
+        descending = sort.startswith("-")
+        key = getattr(columns, SORT_KEYS[sort.lstrip("-")])[matched]
+        order = np.lexsort((columns.ids[matched], -key if descending else key))
+        page = matched[order[offset : offset + limit]]
+        return len(matched), columns.ids[page].tolist(), facets
+
+    def _facets(self, columns, combined):
+        buckets = price_buckets()
+        bounds = np.array(
+            [_cents(upper) for _, upper in buckets if upper is not None],
+            dtype=np.int64,
+        )
+
+        mask = combined("genre")
+        genre_counts = np.bincount(
+            columns.genre_codes[mask], minlength=len(columns.genres)
+        )
+        genres = {
+            genre: int(count)
+            for genre, count in zip(columns.genres, genre_counts)
+            if count
+        }
+
+        mask = combined("artist")
+        artist_ids, artist_counts = np.unique(
+            columns.artist_ids[mask], return_counts=True
+        )
+        artists = {
+            (int(artist_id), columns.artist_names[int(artist_id)]): int(count)
+            for artist_id, count in zip(artist_ids, artist_counts)
+        }
+
+        mask = combined("price")
+        bucket_counts = np.bincount(
+            np.searchsorted(bounds, columns.price_cents[mask], side="right"),
+            minlength=len(buckets),
+        )
+        prices = {index: int(count) for index, count in enumerate(bucket_counts)}
+
+        mask = combined("in_stock")
+        in_stock = int(np.count_nonzero(columns.stock[mask] > 0))
+        stock = {True: in_stock, False: int(np.count_nonzero(mask)) - in_stock}
+
+        return format_facets(genres, artists, prices, stock, buckets)
+
+
+catalog_index = CatalogIndex()
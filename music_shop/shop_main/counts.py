@@ -0,0 +1,41 @@
+"""Число строк в таблицах: точное для небольших, оценка для больших.
+
+COUNT(*) в PostgreSQL читает всю таблицу. Если по статистике планировщика
+(pg_class.reltuples, обновляется VACUUM и ANALYZE) в таблице больше
+COUNT_ESTIMATE_THRESHOLD строк, возвращается эта оценка — обычно она
+отличается от точного числа на доли процента.
+"""
+
+from django.conf import settings
+from django.db import connections, router
+
+
+def _threshold():
+    return getattr(settings, "COUNT_ESTIMATE_THRESHOLD", 100_000)
+
+
+def count_rows(model):
+    """(число строк, точное ли оно) для всей таблицы модели"""
+    return table_counts([model])[model]
+
+
+def table_counts(models):
+    """{модель: (число строк, точное ли оно)}; оценки — одним запросом"""
+    # Статистика читается из той же базы, что и COUNT(*) (реплика в отчетах)
+    connection = connections[router.db_for_read(models[0])]
+    tables = [connection.ops.quote_name(model._meta.db_table) for model in models]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT t.name, c.reltuples::bigint FROM unnest(%s::text[]) AS t(name) "
+            "LEFT JOIN pg_class c ON c.oid = to_regclass(t.name)",
+            [tables],
+        )
+        estimates = dict(cursor.fetchall())
+    counts = {}
+    for model, table in zip(models, tables):
+        estimate = estimates.get(table)
+        if estimate is not None and estimate > _threshold():
+            counts[model] = (estimate, False)
+        else:
+            counts[model] = (model._default_manager.count(), True)
+    return counts
@@ -0,0 +1,119 @@
+"""Поиск купонов по коду: кэш активных купонов и ограничение перебора"""
+
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Coupon, normalize_coupon_code
+
+
+class CouponCache:
+    """Кэш всех активных купонов текущего процесса.
+
+    Купоны хранятся в словаре {code_normalized: Coupon}, поэтому отсутствие
+    кода в словаре означает, что активного купона нет, и в БД за ним ходить
+    не нужно. Срок действия (valid_from/valid_to) проверяется при каждом
+    обращении, так что истечение купона не требует сброса кэша.
+
+    Кэш сбрасывается сигналами при сохранении и удалении купона. Изменения,
+    сделанные в других процессах, подхватываются не позже чем через
+    COUPON_CACHE_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._coupons = None
+        self._loaded_at = 0.0
+
+    def _ttl(self):
+        return getattr(settings, "COUPON_CACHE_TTL", 60)
+
+    def _load(self):
+        coupons = Coupon.objects.filter(active=True)
+        return {coupon.code_normalized: coupon for coupon in coupons}
+
+    def get(self, code):
+        """Активный купон по коду без учета регистра или None"""
+        coupons = self._coupons
+        if coupons is None or time.monotonic() - self._loaded_at > self._ttl():
+            with self._lock:
+                if self._coupons is None or (
+                    time.monotonic() - self._loaded_at > self._ttl()
+                ):
+                    self._coupons = self._load()
+                    self._loaded_at = time.monotonic()
+                coupons = self._coupons
+        return coupons.get(normalize_coupon_code(code))
+
+    async def aget(self, code):
+        """Асинхронный вариант get: в БД идет только загрузка устаревшего кэша"""
+        coupons = self._coupons
+        if coupons is None or time.monotonic() - self._loaded_at > self._ttl():
+            return await sync_to_async(self.get)(code)
+        return coupons.get(normalize_coupon_code(code))
+
+    def invalidate(self):
+        with self._lock:
+            self._coupons = None
+
+
+coupon_cache = CouponCache()
+
+
+def find_active_coupon(code):
+    """Возвращает активный купон по коду (он может быть вне срока действия)"""
+    return coupon_cache.get(code)
+
+
+async def afind_active_coupon(code):
+    return await coupon_cache.aget(code)
+
+
+def resolve_coupon(code, now=None):
+    """Возвращает купон, действующий прямо сейчас, или None"""
+    coupon = find_active_coupon(code)
+    if coupon is None or not coupon.is_valid_at(now or timezone.now()):
+        return None
+    return coupon
+
+
+def _attempts_key(client_key):
+    return f"coupon-attempts:{client_key}"
+
+
+def is_rate_limited(client_key):
+    """Превышено ли число неудачных попыток ввода купона для клиента"""
+    max_attempts, _ = getattr(settings, "COUPON_RATE_LIMIT", (10, 600))
+    return cache.get(_attempts_key(client_key), 0) >= max_attempts
+
+
+def register_failed_attempt(client_key):
+    """Учитывает неудачную попытку в окне COUPON_RATE_LIMIT"""
+    _, window = getattr(settings, "COUPON_RATE_LIMIT", (10, 600))
+    key = _attempts_key(client_key)
+    if not cache.add(key, 1, timeout=window):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=window)
+
+
+async def ais_rate_limited(client_key):
+    """Асинхронный вариант is_rate_limited"""
+    max_attempts, _ = getattr(settings, "COUPON_RATE_LIMIT", (10, 600))
+    return await cache.aget(_attempts_key(client_key), 0) >= max_attempts
+
+
+async def aregister_failed_attempt(client_key):
+    """Асинхронный вариант register_failed_attempt"""
+    _, window = getattr(settings, "COUPON_RATE_LIMIT", (10, 600))
+    key = _attempts_key(client_key)
+    if not await cache.aadd(key, 1, timeout=window):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, 1, timeout=window)
@@ -0,0 +1,275 @@
+"""Фасеты каталога: число товаров по жанрам, исполнителям, ценам и наличию.
+
+Все счетчики считаются одним GROUP BY по сочетаниям (жанр, исполнитель,
+ценовой диапазон, попадание в фильтр цены, наличие), после чего сворачиваются
+в Python. Число сочетаний не больше числа товаров, обычно намного меньше.
+
+Счетчики каждого фасета учитывают все выбранные фильтры, кроме фильтра
+самого фасета: при выбранном жанре «Джаз» у других жанров видно, сколько
+товаров появится, если переключиться на них.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import BooleanField, Case, Count, IntegerField, Q, Value, When
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Genre
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def parse_decimal(value):
+    """Decimal из строки запроса или None для пустого/некорректного значения"""
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return None
+
+
+CATALOG_SORTS = (
+    "price",
+    "-price",
+    "product_name",
+    "-product_name",
+    "created_at",
+    "-created_at",
+)
+
+
+def read_sort(params):
+    """Сортировка каталога из ?sort=; некорректная заменяется на created_at"""
+    sort = params.get("sort", "created_at")
+    return sort if sort in CATALOG_SORTS else "created_at"
+
+
+def read_page(params):
+    """(номер страницы, размер страницы) из ?page= и ?page_size="""
+    default_size = _setting("CATALOG_PAGE_SIZE", 24)
+    max_size = _setting("CATALOG_MAX_PAGE_SIZE", 100)
+    try:
+        page = max(int(params.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+    try:
+        page_size = int(params.get("page_size", default_size))
+    except ValueError:
+        page_size = default_size
+    return page, min(max(page_size, 1), max_size)
+
+
+def search_catalog(queryset, params):
+    """Применяет ?search= (название или исполнитель), возвращает (товары, строка)"""
+    search = params.get("search") or ""
+    if search:
+        queryset = queryset.filter(
+            Q(product_name__icontains=search) | Q(artist__artist_name__icontains=search)
+        )
+    return queryset, search
+
+
+def catalog_page(url, page, page_size, count, results, facets):
+    """Ответ каталога с ?facets=1: страница товаров, ссылки и фасеты"""
+    offset = (page - 1) * page_size
+    return {
+        "count": count,
+        "next": (
+            replace_query_param(url, "page", page + 1)
+            if offset + page_size < count
+            else None
+        ),
+        "previous": replace_query_param(url, "page", page - 1) if page > 1 else None,
+        "results": results,
+        "facets": facets,
+    }
+
+
+def read_selection(params):
+    """Выбранные значения фасетов из GET-параметров каталога"""
+    artist = params.get("artist")
+    return {
+        "genre": params.get("genre") or None,
+        "artist": int(artist) if artist and artist.isdigit() else None,
+        "min_price": parse_decimal(params.get("min_price")),
+        "max_price": parse_decimal(params.get("max_price")),
+        "in_stock": params.get("in_stock") in ("1", "true"),
+    }
+
+
+def _price_q(selection):
+    q = Q()
+    if selection["min_price"] is not None:
+        q &= Q(price__gte=selection["min_price"])
+    if selection["max_price"] is not None:
+        q &= Q(price__lte=selection["max_price"])
+    return q
+
+
+def filter_by_selection(queryset, selection):
+    """Применяет к товарам все выбранные фильтры фасетов"""
+    if selection["genre"]:
+        queryset = queryset.filter(genre__genre_name=selection["genre"])
+    if selection["artist"]:
+        queryset = queryset.filter(artist_id=selection["artist"])
+    queryset = queryset.filter(_price_q(selection))
+    if selection["in_stock"]:
+        queryset = queryset.filter(stock_quantity__gt=0)
+    return queryset
+
+
+def price_buckets():
+    """[(min, max)] ценовых диапазонов; max последнего диапазона — None"""
+    bounds = [Decimal(bound) for bound in _setting("CATALOG_PRICE_BUCKETS", [])]
+    edges = [Decimal(0), *bounds]
+    return list(zip(edges, [*bounds, None]))
+
+
+def _bucket_case(buckets):
+    whens = [
+        When(price__lt=upper, then=Value(index))
+        for index, (_, upper) in enumerate(buckets)
+        if upper is not None
+    ]
+    return Case(*whens, default=Value(len(buckets) - 1), output_field=IntegerField())
+
+
+def _matches(row, selection, skip):
+    return (
+        (
+            skip == "genre"
+            or not selection["genre"]
+            or row["genre"] == selection["genre"]
+        )
+        and (
+            skip == "artist"
+            or not selection["artist"]
+            or row["artist"] == selection["artist"]
+        )
+        and (skip == "price" or row["in_price_range"])
+        and (skip == "in_stock" or not selection["in_stock"] or row["in_stock"])
+    )
+
+
+def facet_rows(queryset, selection, buckets):
+    """Группирующий запрос: число товаров по каждому сочетанию значений фасетов"""
+    price_q = _price_q(selection)
+    return (
+        queryset.annotate(
+            bucket=_bucket_case(buckets),
+            in_price_range=(
+                Case(
+                    When(price_q, then=Value(True)),
+                    default=Value(False),
+                    output_field=BooleanField(),
+                )
+                if price_q
+                else Value(True, output_field=BooleanField())
+            ),
+            has_stock=Case(
+                When(stock_quantity__gt=0, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+        .order_by()
+        .values(
+            "genre__genre_name",
+            "artist_id",
+            "artist__artist_name",
+            "bucket",
+            "in_price_range",
+            "has_stock",
+        )
+        .annotate(count=Count("id"))
+    )
+
+
+def fold_facets(rows, selection, buckets):
+    """Сворачивает строки facet_rows в (число товаров, словарь фасетов)"""
+    rows = [
+        {
+            "genre": row["genre__genre_name"],
+            "artist": row["artist_id"],
+            "artist_name": row["artist__artist_name"],
+            "bucket": row["bucket"],
+            "in_price_range": row["in_price_range"],
+            "in_stock": row["has_stock"],
+            "count": row["count"],
+        }
+        for row in rows
+    ]
+
+    genres, artists, prices, stock = {}, {}, {}, {True: 0, False: 0}
+    total = 0
+    for row in rows:
+        count = row["count"]
+        if _matches(row, selection, None):
+            total += count
+        if _matches(row, selection, "genre"):
+            genres[row["genre"]] = genres.get(row["genre"], 0) + count
+        if _matches(row, selection, "artist"):
+            key = (row["artist"], row["artist_name"])
+            artists[key] = artists.get(key, 0) + count
+        if _matches(row, selection, "price"):
+            prices[row["bucket"]] = prices.get(row["bucket"], 0) + count
+        if _matches(row, selection, "in_stock"):
+            stock[row["in_stock"]] += count
+
+    return total, format_facets(genres, artists, prices, stock, buckets)
+
+
+def compute_facets(queryset, selection):
+    """Возвращает (число товаров под всеми фильтрами, словарь фасетов).
+
+    queryset — товары с уже примененными фильтрами, которые не являются
+    фасетами (например, поиск).
+    """
+    buckets = price_buckets()
+    return fold_facets(facet_rows(queryset, selection, buckets), selection, buckets)
+
+
+async def acompute_facets(queryset, selection):
+    """Асинхронный вариант compute_facets"""
+    buckets = price_buckets()
+    rows = [row async for row in facet_rows(queryset, selection, buckets)]
+    return fold_facets(rows, selection, buckets)
+
+
+def format_facets(genres, artists, prices, stock, buckets):
+    """Собирает ответ из счетчиков {значение: число товаров} по каждому фасету
+
+    genres — по genre_name, artists — по (artist_id, artist_name),
+    prices — по номеру ценового диапазона, stock — по признаку наличия.
+    """
+    labels = dict(Genre.GenreChoices.choices)
+    return {
+        "genre": [
+            {"value": value, "label": labels.get(value, value), "count": count}
+            for value, count in sorted(
+                genres.items(), key=lambda item: (-item[1], item[0])
+            )
+        ],
+        "artist": [
+            {"value": artist_id, "label": name, "count": count}
+            for (artist_id, name), count in sorted(
+                artists.items(), key=lambda item: (-item[1], item[0][1])
+            )
+        ],
+        "price": [
+            {
+                "min": str(lower),
+                "max": str(upper) if upper is not None else None,
+                "count": prices.get(index, 0),
+            }
+            for index, (lower, upper) in enumerate(buckets)
+        ],
+        "in_stock": {
+            "in_stock": stock.get(True, 0),
+            "out_of_stock": stock.get(False, 0),
+        },
+    }
@@ -0,0 +1,266 @@
+"""Быстрые read-only сериализаторы для нагруженных эндпоинтов.
+
+Ответ строится напрямую из строк values() без создания ModelSerializer и
+полей DRF на каждый объект. Формат вывода полностью совпадает с
+ProductSerializer, OrderSerializer и ReviewSerializer, поэтому эти функции
+можно использовать только для чтения. Запись и валидация остаются за DRF.
+"""
+
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.utils import timezone
+
+from .models import Genre, OrderItem, Product
+
+
+_CENT = Decimal("0.01")
+_GENRE_LABELS = dict(Genre.GenreChoices.choices)
+_PICTURE_STORAGE = Product._meta.get_field("picture").storage
+
+PRODUCT_VALUES = (
+    "id",
+    "product_name",
+    "description",
+    "price",
+    "stock_quantity",
+    "picture",
+    "genre_id",
+    "genre__genre_name",
+    "artist_id",
+    "artist__artist_name",
+    "created_at",
+    "updated_at",
+)
+
+ORDER_VALUES = (
+    "id",
+    "user_id",
+    "user__username",
+    "date_order",
+    "status",
+    "shipping_address_id",
+    "shipping_address__user_id",
+    "shipping_address__full_name",
+    "shipping_address__phone",
+    "shipping_address__city",
+    "shipping_address__address_line",
+    "shipping_address__postal_code",
+    "shipping_address__created_at",
+    "coupon_id",
+    "coupon__code",
+    "coupon__discount_percent",
+    "coupon__active",
+    "coupon__valid_from",
+    "coupon__valid_to",
+)
+
+ORDER_ITEM_VALUES = (
+    "id",
+    "order_id",
+    "product_id",
+    "product__product_name",
+    "product__price",
+    "quantity",
+    "price_at_order",
+)
+
+REVIEW_VALUES = (
+    "id",
+    "rating",
+    "text",
+    "user_id",
+    "user__username",
+    "product_id",
+    "product__product_name",
+    "created_at",
+)
+
+
+def format_decimal(value):
+    """Аналог DecimalField(decimal_places=2).to_representation"""
+    if value is None:
+        return None
+    return f"{value.quantize(_CENT, rounding=ROUND_HALF_UP):f}"
+
+
+def format_datetime(value):
+    """Аналог DateTimeField.to_representation в формате ISO 8601"""
+    if not value:
+        return None
+    current_tz = timezone.get_current_timezone()
+    if timezone.is_aware(value):
+        value = value.astimezone(current_tz)
+    else:
+        value = timezone.make_aware(value, current_tz)
+    value = value.isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def picture_url(name, request=None):
+    """Аналог ImageField.to_representation: URL файла или None"""
+    if not name:
+        return None
+    url = _PICTURE_STORAGE.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def product_row_to_dict(row, request=None):
+    genre_name = row["genre__genre_name"]
+    return {
+        "id": row["id"],
+        "product_name": row["product_name"],
+        "description": row["description"],
+        "price": format_decimal(row["price"]),
+        "stock_quantity": row["stock_quantity"],
+        "picture": picture_url(row["picture"], request),
+        "genre": row["genre_id"],
+        "genre_name": _GENRE_LABELS.get(genre_name, genre_name),
+        "artist": row["artist_id"],
+        "artist_name": row["artist__artist_name"],
+        "created_at": format_datetime(row["created_at"]),
+        "updated_at": format_datetime(row["updated_at"]),
+    }
+
+
+def serialize_products(queryset, request=None, annotations=()):
+    """Сериализует товары в формате ProductSerializer.
+
+    annotations — имена аннотаций queryset (например, is_favorite), которые
+    нужно добавить к каждому товару как есть.
+    """
+    rows = queryset.values(*PRODUCT_VALUES, *annotations)
+    return _products_from_rows(rows, request, annotations)
+
+
+async def aserialize_products(queryset, request=None, annotations=()):
+    """Асинхронный вариант serialize_products"""
+    rows = [row async for row in queryset.values(*PRODUCT_VALUES, *annotations)]
+    return _products_from_rows(rows, request, annotations)
+
+
+def _products_from_rows(rows, request, annotations):
+    if not annotations:
+        return [product_row_to_dict(row, request) for row in rows]
+
+    result = []
+    for row in rows:
+        data = product_row_to_dict(row, request)
+        for name in annotations:
+            data[name] = row[name]
+        result.append(data)
+    return result
+
+
+def order_item_row_to_dict(row):
+    return {
+        "id": row["id"],
+        "order": row["order_id"],
+        "product": row["product_id"],
+        "product_name": row["product__product_name"],
+        "product_price": format_decimal(row["product__price"]),
+        "quantity": row["quantity"],
+        "price_at_order": format_decimal(row["price_at_order"]),
+        "subtotal": row["price_at_order"] * row["quantity"],
+    }
+
+
+def _shipping_address_from_row(row):
+    if row["shipping_address_id"] is None:
+        return None
+    return {
+        "id": row["shipping_address_id"],
+        "user": row["shipping_address__user_id"],
+        "full_name": row["shipping_address__full_name"],
+        "phone": row["shipping_address__phone"],
+        "city": row["shipping_address__city"],
+        "address_line": row["shipping_address__address_line"],
+        "postal_code": row["shipping_address__postal_code"],
+        "created_at": format_datetime(row["shipping_address__created_at"]),
+    }
+
+
+def _coupon_from_row(row):
+    if row["coupon_id"] is None:
+        return None
+    return {
+        "id": row["coupon_id"],
+        "code": row["coupon__code"],
+        "discount_percent": row["coupon__discount_percent"],
+        "active": row["coupon__active"],
+        "valid_from": format_datetime(row["coupon__valid_from"]),
+        "valid_to": format_datetime(row["coupon__valid_to"]),
+    }
+
+
+def order_row_to_dict(row, item_rows):
+    # Итог считается так же, как в OrderSerializer.get_total
+    total = Decimal("0")
+    for item in item_rows:
+        total += item["price_at_order"] * Decimal(str(item["quantity"]))
+    if row["coupon_id"] is not None and row["coupon__active"]:
+        discount_decimal = Decimal(str(row["coupon__discount_percent"])) / Decimal(
+            "100"
+        )
+        total = total * (Decimal("1") - discount_decimal)
+
+    return {
+        "id": row["id"],
+        "user": row["user_id"],
+        "user_name": row["user__username"],
+        "date_order": format_datetime(row["date_order"]),
+        "status": row["status"],
+        "shipping_address": _shipping_address_from_row(row),
+        "coupon": _coupon_from_row(row),
+        "order_items": [order_item_row_to_dict(item) for item in item_rows],
+        "total": total,
+    }
+
+
+def serialize_orders(queryset):
+    """Сериализует заказы в формате OrderSerializer.
+
+    Выполняет ровно два запроса: заказы со связанными адресом, купоном и
+    пользователем и все позиции этих заказов с данными товаров.
+    """
+    rows = list(queryset.values(*ORDER_VALUES))
+    if not rows:
+        return []
+
+    items_by_order = defaultdict(list)
+    item_rows = (
+        OrderItem.objects.filter(order_id__in=[row["id"] for row in rows])
+        .order_by("id")
+        .values(*ORDER_ITEM_VALUES)
+    )
+    for item in item_rows:
+        items_by_order[item["order_id"]].append(item)
+
+    return [order_row_to_dict(row, items_by_order[row["id"]]) for row in rows]
+
+
+def review_row_to_dict(row):
+    return {
+        "id": row["id"],
+        "rating": float(row["rating"]),
+        "text": row["text"],
+        "user": row["user_id"],
+        "user_name": row["user__username"],
+        "product": row["product_id"],
+        "product_name": row["product__product_name"],
+        "created_at": format_datetime(row["created_at"]),
+    }
+
+
+def serialize_reviews(queryset):
+    """Сериализует отзывы в формате ReviewSerializer"""
+    return [review_row_to_dict(row) for row in queryset.values(*REVIEW_VALUES)]
+
+
+async def aserialize_reviews(queryset):
+    """Асинхронный вариант serialize_reviews"""
+    return [review_row_to_dict(row) async for row in queryset.values(*REVIEW_VALUES)]
@@ -0,0 +1,98 @@
+"""Избранное: кэш множеств id товаров и добавление/удаление одним запросом"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Exists, OuterRef
+
+from .models import Favorite
+
+
+def _cache_key(user_id):
+    return f"favorites:ids:{user_id}"
+
+
+def _cache_timeout():
+    return getattr(settings, "FAVORITES_CACHE_TIMEOUT", 3600)
+
+
+def get_favorite_ids(user):
+    """Список id избранных товаров пользователя (из кэша, если он есть)"""
+    key = _cache_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = sorted(
+            Favorite.objects.filter(user=user).values_list("product_id", flat=True)
+        )
+        cache.set(key, ids, _cache_timeout())
+    return ids
+
+
+async def aget_favorite_ids(user):
+    """Асинхронный вариант get_favorite_ids"""
+    key = _cache_key(user.pk)
+    ids = await cache.aget(key)
+    if ids is None:
+        ids = sorted(
+            [
+                product_id
+                async for product_id in Favorite.objects.filter(user=user).values_list(
+                    "product_id", flat=True
+                )
+            ]
+        )
+        await cache.aset(key, ids, _cache_timeout())
+    return ids
+
+
+def invalidate_favorite_ids(user_id):
+    """Сбрасывает закэшированный список избранного пользователя.
+
+    Список не правится на месте: чтение-изменение-запись кэша не атомарно,
+    и параллельные переключения теряли бы изменения. Следующее чтение —
+    один запрос по индексу (user, product).
+    """
+    cache.delete(_cache_key(user_id))
+
+
+def add_favorite(user, product):
+    """Добавляет товар в избранное одним INSERT ... ON CONFLICT DO NOTHING"""
+    Favorite.objects.bulk_create(
+        [Favorite(user=user, product=product)], ignore_conflicts=True
+    )
+    invalidate_favorite_ids(user.pk)
+
+
+def remove_favorite(user, product):
+    """Удаляет товар из избранного одним DELETE, возвращает True, если удалил"""
+    # Без QuerySet.delete(): из-за сигнала post_delete он сначала выбирал бы
+    # строки отдельным SELECT
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {Favorite._meta.db_table} "
+            "WHERE user_id = %s AND product_id = %s",
+            [user.pk, product.pk],
+        )
+        deleted = cursor.rowcount
+    if deleted:
+        invalidate_favorite_ids(user.pk)
+    return deleted > 0
+
+
+def toggle_favorite(user, product):
+    """Переключает товар в избранном, возвращает "added" или "removed"
+
+    Сначала пробуем удалить запись; если удалять нечего, вставляем её.
+    Каждая ветка — один SQL-запрос, без предварительного SELECT.
+    """
+    if remove_favorite(user, product):
+        return "removed"
+    add_favorite(user, product)
+    return "added"
+
+
+def annotate_is_favorite(queryset, user):
+    """Добавляет к товарам флаг is_favorite одним подзапросом EXISTS"""
+    return queryset.annotate(
+        is_favorite=Exists(Favorite.objects.filter(user=user, product=OuterRef("pk")))
+    )
@@ -156,6 +156,13 @@ class OrderForm(forms.ModelForm):
 
         self.fields['shipping_address'].required = False
         self.fields['coupon'].required = False
+        if self.instance.pk:
+            # Только текущий статус и разрешенные переходы из него
+            self.fields['status'].choices = [
+                (value, label)
+                for value, label in Order.STATUS_CHOICES
+                if self.instance.can_change_status(value)
+            ]
 
 
 class OrderItemForm(forms.ModelForm):
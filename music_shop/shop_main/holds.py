@@ -0,0 +1,193 @@
+"""Временные брони товаров лимитированного тиража (Product.limited_release).
+
+Во время релиза тысячи покупателей одновременно оформляют заказ на один и
+тот же товар и выстраиваются в очередь за блокировкой его строки. Поэтому
+экземпляры списываются со склада уже при добавлении в корзину: создается
+бронь StockHold на CART_HOLD_SECONDS секунд, каждое новое добавление
+продлевает ее. Оформление заказа удаляет бронь и переносит ее количество в
+позицию заказа, не обращаясь к строке товара.
+
+Истекшие брони возвращаются на склад командой sweep_holds (запускается
+периодически или с --loop), а также сразу, если для новой брони товара не
+хватает остатка.
+
+Владелец брони — случайный ключ в сессии: он сохраняется при входе в
+систему, поэтому брони анонимной корзины переходят к пользователю.
+"""
+
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import stock
+from .models import Product, StockHold
+
+LIMITED_IDS_KEY = "holds:limited_ids"
+SESSION_KEY = "cart_hold_owner"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def owner_key(request):
+    """Ключ владельца броней для текущей сессии (создает его при необходимости)"""
+    key = request.session.get(SESSION_KEY)
+    if key is None:
+        key = request.session[SESSION_KEY] = uuid.uuid4().hex
+    return key
+
+
+def limited_product_ids():
+    """id товаров лимитированного тиража (кэшируются до изменения товара)"""
+    ids = cache.get(LIMITED_IDS_KEY)
+    if ids is None:
+        ids = set(
+            Product.objects.filter(limited_release=True).values_list("pk", flat=True)
+        )
+        cache.set(LIMITED_IDS_KEY, ids, _setting("STOCK_CACHE_TIMEOUT", 300))
+    return ids
+
+
+def invalidate_limited_ids():
+    cache.delete(LIMITED_IDS_KEY)
+
+
+def _upsert(owner, product_id, quantity, expires_at):
+    table = StockHold._meta.db_table
+    sql = f"""
+        INSERT INTO {table} (owner_key, product_id, quantity, expires_at, created_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (owner_key, product_id) DO UPDATE SET
+            quantity = {table}.quantity + EXCLUDED.quantity,
+            expires_at = EXCLUDED.expires_at
+        RETURNING quantity
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [owner, product_id, quantity, expires_at, timezone.now()])
+        return cursor.fetchone()[0]
+
+
+def place_hold(owner, product_id, quantity):
+    """Бронирует quantity экземпляров, возвращает срок брони или None.
+
+    Бронируется все или ничего. Новое добавление продлевает всю бронь
+    владельца на этот товар.
+    """
+    with transaction.atomic():
+        if not stock.reserve(product_id, quantity):
+            # Остаток могут занимать истекшие, еще не возвращенные брони
+            if not release_expired_holds(product_id=product_id):
+                return None
+            if not stock.reserve(product_id, quantity):
+                return None
+        expires_at = timezone.now() + timedelta(
+            seconds=_setting("CART_HOLD_SECONDS", 600)
+        )
+        _upsert(owner, product_id, quantity, expires_at)
+    return expires_at
+
+
+def release_expired_holds(product_id=None, limit=None, now=None):
+    """Возвращает на склад истекшие брони, возвращает число удаленных броней.
+
+    Удаление броней и возврат остатков — один запрос. Брони, заблокированные
+    другой транзакцией (их как раз оформляют), пропускаются.
+    """
+    now = now or timezone.now()
+    limit = limit or _setting("CART_HOLD_SWEEP_BATCH", 1000)
+    table = StockHold._meta.db_table
+    product_table = Product._meta.db_table
+    product_filter = "AND product_id = %(product_id)s" if product_id else ""
+    sql = f"""
+        WITH expired AS (
+            DELETE FROM {table}
+            WHERE id IN (
+                SELECT id FROM {table}
+                WHERE expires_at <= %(now)s {product_filter}
+                ORDER BY expires_at
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING product_id, quantity
+        ),
+        returned AS (
+            SELECT product_id, SUM(quantity) AS quantity, COUNT(*) AS holds
+            FROM expired
+            GROUP BY product_id
+        ),
+        updated AS (
+            UPDATE {product_table} p
+            SET stock_quantity = p.stock_quantity + returned.quantity,
+                updated_at = now()
+            FROM returned
+            WHERE p.id = returned.product_id
+            RETURNING p.id, p.stock_quantity
+        )
+        SELECT updated.id, updated.stock_quantity, returned.holds
+        FROM returned
+        LEFT JOIN updated ON updated.id = returned.product_id
+    """
+    params = {"now": now, "limit": limit, "product_id": product_id}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    for pk, quantity, _ in rows:
+        if pk is not None:
+            stock.changed(pk, quantity)
+    return sum(holds for _, _, holds in rows)
+
+
+def _take_hold(owner, product_id):
+    """Удаляет бронь владельца на товар, возвращает ее количество (0 — брони нет)"""
+    table = StockHold._meta.db_table
+    sql = f"""
+        DELETE FROM {table} WHERE owner_key = %s AND product_id = %s
+        RETURNING quantity
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [owner, product_id])
+        row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def convert_hold(owner, product_id, quantity):
+    """Списание позиции заказа за счет брони, возвращает итоговое количество.
+
+    Бронь уже списана со склада, поэтому строку товара трогает только
+    разница: излишек брони возвращается, недостающее списывается как обычно.
+    """
+    held = _take_hold(owner, product_id)
+    if held > quantity:
+        stock.release(product_id, held - quantity)
+        return quantity
+    if held < quantity:
+        held += stock.reserve(product_id, quantity - held, partial=True)
+    return held
+
+
+def release_hold(owner, product_id, quantity=None):
+    """Уменьшает бронь на quantity (None — снимает целиком), возвращает остаток брони"""
+    if quantity is not None and quantity < 1:
+        # Отрицательное значение увеличило бы бронь без списания остатка
+        raise ValueError("quantity должно быть положительным")
+    with transaction.atomic():
+        hold = (
+            StockHold.objects.select_for_update()
+            .filter(owner_key=owner, product_id=product_id)
+            .first()
+        )
+        if hold is None:
+            return 0
+        released = hold.quantity if quantity is None else min(quantity, hold.quantity)
+        hold.quantity -= released
+        if hold.quantity:
+            hold.save(update_fields=["quantity"])
+        else:
+            hold.delete()
+        stock.release(product_id, released)
+    return hold.quantity
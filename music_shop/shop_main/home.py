@@ -0,0 +1,76 @@
+"""Данные главной страницы: один кэшированный payload.
+
+Жанры с числом товаров, новинки, хиты продаж и популярные сейчас товары
+собираются в один словарь и кладутся в кэш Django на HOME_CACHE_TTL секунд.
+Главная страница встраивает его в HTML, /api/v1/home/ отдает его целиком —
+в обоих случаях это одно чтение кэша.
+
+Сохранение и удаление товара, жанра или исполнителя сбрасывают кэш
+(сигналы). Хиты продаж и популярные товары меняются с каждым заказом и
+просмотром, их обновляет только TTL — иначе кэш сбрасывался бы на каждой
+покупке.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from .fast_serializers import serialize_products
+from .models import Genre, Product
+from .queries import bestsellers
+from .trending import trending
+
+CACHE_KEY = "home:payload"
+
+
+def _ttl():
+    return getattr(settings, "HOME_CACHE_TTL", 60)
+
+
+def _section_size():
+    return getattr(settings, "HOME_SECTION_SIZE", 8)
+
+
+def build_payload():
+    """Собирает данные главной страницы из БД"""
+    size = _section_size()
+    genres = list(
+        Genre.objects.annotate(product_count=Count("product"))
+        .order_by("genre_name")
+        .values("id", "genre_name", "description", "product_count")
+    )
+    new_arrivals = serialize_products(
+        Product.objects.order_by("-created_at", "-pk")[:size]
+    )
+
+    top = bestsellers(size)
+    sold = {row["product__id"]: row["total_sold"] for row in top}
+    products = {
+        product["id"]: product
+        for product in serialize_products(Product.objects.filter(pk__in=sold))
+    }
+    hits = []
+    for row in top:
+        product = products.get(row["product__id"])
+        if product is not None:
+            hits.append({**product, "total_sold": row["total_sold"]})
+
+    return {
+        "genres": genres,
+        "new_arrivals": new_arrivals,
+        "bestsellers": hits,
+        "trending": trending.top(None, size),
+    }
+
+
+def home_payload():
+    """Данные главной страницы: из кэша, при промахе — собираются заново"""
+    payload = cache.get(CACHE_KEY)
+    if payload is None:
+        payload = build_payload()
+        cache.set(CACHE_KEY, payload, _ttl())
+    return payload
+
+
+def invalidate():
+    cache.delete(CACHE_KEY)
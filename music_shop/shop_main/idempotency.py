@@ -0,0 +1,205 @@
+"""Ключи идемпотентности для изменяющих запросов корзины и заказов.
+
+Клиент передает заголовок Idempotency-Key, одинаковый для всех повторов
+одного запроса. Первый запрос занимает ключ строкой IdempotencyKey и после
+выполнения сохраняет в ней ответ; повтор получает сохраненный ответ (из кэша,
+без обращения к БД) с заголовком Idempotent-Replayed. Повтор, пришедший, пока
+первый запрос еще выполняется, получает 409, а тот же ключ с другим телом
+запроса — 422.
+
+Ответы 5xx и исключения не сохраняются: ключ освобождается, и повтор
+выполнится заново. Занятый ключ без ответа (процесс упал посреди запроса)
+освобождается через IDEMPOTENCY_LOCK_TIMEOUT секунд, сохраненный ответ
+хранится IDEMPOTENCY_KEY_TTL секунд; устаревшие строки удаляет команда
+purge_idempotency_keys.
+
+Запросы без заголовка обрабатываются как обычно.
+"""
+
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = "HTTP_IDEMPOTENCY_KEY"
+MAX_KEY_LENGTH = 255
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _owner(request):
+    """Область действия ключа: пользователь или сессия анонимного клиента"""
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    if request.session.session_key is None:
+        request.session.save()
+    return f"session:{request.session.session_key}"
+
+
+def _cache_key(owner, key):
+    digest = hashlib.sha256(f"{owner}\x00{key}".encode()).hexdigest()
+    return f"idempotency:{digest}"
+
+
+def request_hash(request):
+    """Отпечаток запроса: метод, путь, тело и корзина из cookie"""
+    data = request.data
+    if hasattr(data, "lists"):
+        data = dict(data.lists())
+    payload = json.dumps(
+        [
+            request.method,
+            request.path,
+            data,
+            request.COOKIES.get("cart", ""),
+        ],
+        sort_keys=True,
+        cls=JSONEncoder,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _claim(owner, key, fingerprint, now):
+    """Занимает ключ; True — ключ свободен или устарел и теперь наш"""
+    table = IdempotencyKey._meta.db_table
+    sql = f"""
+        INSERT INTO {table}
+            (owner_key, key, request_hash, status_code, response,
+             created_at, expires_at)
+        VALUES (%(owner)s, %(key)s, %(hash)s, NULL, NULL, %(now)s, %(expires)s)
+        ON CONFLICT (owner_key, key) DO UPDATE SET
+            request_hash = EXCLUDED.request_hash,
+            status_code = NULL,
+            response = NULL,
+            created_at = EXCLUDED.created_at,
+            expires_at = EXCLUDED.expires_at
+        WHERE {table}.expires_at <= %(now)s
+        RETURNING id
+    """
+    params = {
+        "owner": owner,
+        "key": key,
+        "hash": fingerprint,
+        "now": now,
+        "expires": now + timedelta(seconds=_setting("IDEMPOTENCY_LOCK_TIMEOUT", 60)),
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone() is not None
+
+
+def _replay(stored, fingerprint):
+    if stored["request_hash"] != fingerprint:
+        return Response(
+            {"error": "Ключ идемпотентности уже использован для другого запроса"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if stored["status_code"] is None:
+        return Response(
+            {"error": "Запрос с этим ключом еще выполняется"},
+            status=status.HTTP_409_CONFLICT,
+            headers={"Retry-After": "1"},
+        )
+    return Response(
+        stored["response"],
+        status=stored["status_code"],
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def _store(owner, key, fingerprint, response, now):
+    ttl = _setting("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60)
+    # Через JSON, чтобы повтор вернул ровно то же, что увидел клиент
+    body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+    IdempotencyKey.objects.filter(owner_key=owner, key=key).update(
+        status_code=response.status_code,
+        response=body,
+        expires_at=now + timedelta(seconds=ttl),
+    )
+    stored = {
+        "request_hash": fingerprint,
+        "status_code": response.status_code,
+        "response": body,
+    }
+    cache.set(_cache_key(owner, key), stored, ttl)
+
+
+def _release(owner, key):
+    IdempotencyKey.objects.filter(
+        owner_key=owner, key=key, status_code__isnull=True
+    ).delete()
+
+
+def idempotent(handler):
+    """Декоратор метода ViewSet: повтор запроса с тем же ключом не выполняется"""
+
+    @functools.wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if not key:
+            return handler(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"error": "Слишком длинный ключ идемпотентности"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        owner = _owner(request)
+        fingerprint = request_hash(request)
+        stored = cache.get(_cache_key(owner, key))
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        now = timezone.now()
+        if not _claim(owner, key, fingerprint, now):
+            stored = (
+                IdempotencyKey.objects.filter(owner_key=owner, key=key)
+                .values("request_hash", "status_code", "response")
+                .first()
+            )
+            if stored is not None:
+                if stored["status_code"] is not None:
+                    cache.set(
+                        _cache_key(owner, key),
+                        stored,
+                        _setting("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60),
+                    )
+                return _replay(stored, fingerprint)
+            # Строку только что удалили (первый запрос упал): пробуем снова
+            if not _claim(owner, key, fingerprint, now):
+                return _replay(
+                    {"request_hash": fingerprint, "status_code": None}, fingerprint
+                )
+
+        try:
+            response = handler(self, request, *args, **kwargs)
+        except BaseException:
+            _release(owner, key)
+            raise
+        if response.status_code >= 500:
+            _release(owner, key)
+        else:
+            _store(owner, key, fingerprint, response, now)
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys(now=None):
+    """Удаляет устаревшие ключи, возвращает их число"""
+    deleted, _ = IdempotencyKey.objects.filter(
+        expires_at__lte=now or timezone.now()
+    ).delete()
+    return deleted
@@ -0,0 +1,180 @@
+"""События для живого обновления страниц: смена статуса заказа и остатка товара.
+
+Издатели (сигналы, модуль stock) вызывают publish_order_status и
+publish_stock, подписчики — потоки SSE (async_api.events) — получают события
+своих каналов: "order:<id пользователя>" и "stock:<id товара>".
+
+Доставка зависит от LIVE_EVENTS_BACKEND:
+
+* "local" (по умолчанию) — внутри процесса, после фиксации транзакции.
+  Подходит, когда сайт обслуживает один процесс.
+* "postgres" — через NOTIFY в канал LIVE_EVENTS_CHANNEL. PostgreSQL сам
+  доставляет уведомление после фиксации транзакции; в каждом процессе с
+  подписчиками поток слушает канал (LISTEN) и раздает события локально.
+
+Очередь подписчика ограничена LIVE_EVENTS_QUEUE_SIZE: медленный клиент,
+переполнивший ее, отключается и переподключается сам (EventSource).
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def order_channel(user_id):
+    return f"order:{user_id}"
+
+
+def stock_channel(product_id):
+    return f"stock:{product_id}"
+
+
+class Subscription:
+    """Очередь событий одного подписчика, живущая в его цикле событий"""
+
+    def __init__(self, channels, maxsize):
+        self.channels = frozenset(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            # Будим читателя, чтобы он закрыл поток
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    def deliver(self, event):
+        """Передает событие из любого потока"""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Цикл событий подписчика уже закрыт
+            pass
+
+    async def get(self, timeout):
+        """Следующее событие; None — пауза без событий или переполнение"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LiveHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._listener = None
+
+    @property
+    def backend(self):
+        return _setting("LIVE_EVENTS_BACKEND", "local")
+
+    def subscribe(self, channels):
+        """Подписывает на каналы; вызывать из цикла событий"""
+        subscription = Subscription(channels, _setting("LIVE_EVENTS_QUEUE_SIZE", 100))
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+        if self.backend == "postgres":
+            self._ensure_listener()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def dispatch(self, channel, event):
+        """Раздает событие подписчикам канала в этом процессе"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    def publish(self, channel, event):
+        """Публикует событие; до фиксации текущей транзакции его никто не увидит"""
+        if self.backend == "postgres":
+            payload = json.dumps({"channel": channel, "event": event})
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_notify(%s, %s)",
+                    [_setting("LIVE_EVENTS_CHANNEL", "shop_live"), payload],
+                )
+        elif channel in self._subscribers:
+            transaction.on_commit(lambda: self.dispatch(channel, event))
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(
+                    target=self._listen, name="live-events-listener", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        """Слушает канал PostgreSQL; при обрыве соединения переподключается"""
+        channel = _setting("LIVE_EVENTS_CHANNEL", "shop_live")
+        database = connections["default"]
+        while True:
+            conn = None
+            try:
+                conn = database.Database.connect(**database.get_connection_params())
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{channel}"')
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        message = json.loads(notify.payload)
+                        self.dispatch(message["channel"], message["event"])
+            except Exception:
+                logger.exception("Прослушивание канала %s прервано", channel)
+                if conn is not None:
+                    conn.close()
+                threading.Event().wait(5)
+
+
+live_hub = LiveHub()
+
+
+def publish_order_status(order, old_status):
+    live_hub.publish(
+        order_channel(order.user_id),
+        {
+            "type": "order_status",
+            "order_id": order.pk,
+            "status": order.status,
+            "status_display": order.get_status_display(),
+            "old_status": old_status,
+        },
+    )
+
+
+def publish_stock(product_id, stock):
+    live_hub.publish(
+        stock_channel(product_id),
+        {"type": "stock", "product_id": int(product_id), "stock_quantity": stock},
+    )
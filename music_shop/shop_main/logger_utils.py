@@ -1,6 +1,13 @@
 """Утилиты для логирования действий пользователей"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
 from .models import LogEntry
 
+ACTIVE_LOG_USERS_KEY = "logs:active-user-ids"
+ACTIVE_LOG_USERS_TIMEOUT = 24 * 60 * 60
+
 
 def create_log_entry(
     action,
@@ -33,8 +40,44 @@ def create_log_entry(
             order=order,
             product=product,
         )
+        if user is not None:
+            remember_active_log_user(user.pk)
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
         logger.error(f"Ошибка создания лога: {e}")
 
+
+def get_client_ip(request):
+    """Получает IP адрес клиента с учетом X-Forwarded-For"""
+    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if x_forwarded_for:
+        return x_forwarded_for.split(",")[0]
+    return request.META.get("REMOTE_ADDR")
+
+
+def get_active_log_user_ids():
+    """Множество id пользователей, у которых есть записи в логе.
+
+    Хранится в кэше и пополняется при каждой записи лога. При холодном кэше
+    считается через EXISTS по индексу (user, created_at): по одной проверке
+    на пользователя вместо DISTINCT по всей таблице логов.
+    """
+    user_ids = cache.get(ACTIVE_LOG_USERS_KEY)
+    if user_ids is None:
+        user_ids = set(
+            User.objects.filter(
+                Exists(LogEntry.objects.filter(user=OuterRef("pk")))
+            ).values_list("pk", flat=True)
+        )
+        cache.set(ACTIVE_LOG_USERS_KEY, user_ids, ACTIVE_LOG_USERS_TIMEOUT)
+    return user_ids
+
+
+def remember_active_log_user(user_id):
+    """Добавляет пользователя в закэшированное множество активных"""
+    user_ids = cache.get(ACTIVE_LOG_USERS_KEY)
+    if user_ids is not None and user_id not in user_ids:
+        cache.set(
+            ACTIVE_LOG_USERS_KEY, user_ids | {user_id}, ACTIVE_LOG_USERS_TIMEOUT
+        )
@@ -0,0 +1,207 @@
+import asyncio
+import importlib.util
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from shop_main.bench_utils import delete_dataset, seed_dataset
+
+SERVERS = {
+    "wsgi": ("gunicorn", "/api/v1/"),
+    "asgi": ("uvicorn", "/api/async/"),
+}
+
+
+def _server_command(kind, port, options):
+    if kind == "wsgi":
+        return [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "music_shop.wsgi:application",
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--workers",
+            str(options["workers"]),
+            "--worker-class",
+            "gthread",
+            "--threads",
+            str(options["threads"]),
+            "--backlog",
+            "4096",
+            "--log-level",
+            "warning",
+        ]
+    return [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "music_shop.asgi:application",
+        "--port",
+        str(port),
+        "--workers",
+        str(options["workers"]),
+        "--backlog",
+        "4096",
+        "--log-level",
+        "warning",
+    ]
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"Сервер на порту {port} не запустился")
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _load(port, paths, connections, total):
+    """Держит connections keep-alive соединений, пока не выполнит total запросов"""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def client():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            for number in counter:
+                path = paths[number % len(paths)]
+                request = (
+                    f"GET {path} HTTP/1.1\r\nHost: localhost\r\n"
+                    "Accept: application/json\r\n\r\n"
+                )
+                started = time.perf_counter()
+                writer.write(request.encode())
+                try:
+                    status = await _read_response(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    errors += 1
+                    writer.close()
+                    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors += 1
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(client() for _ in range(connections)), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+    errors += sum(isinstance(result, Exception) for result in results)
+    return elapsed, latencies, errors
+
+
+def _percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочное сравнение развертываний: синхронный WSGI (gunicorn, "
+        "потоки) и асинхронный ASGI (uvicorn) на эндпоинтах чтения"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=1000)
+        parser.add_argument("--requests", type=int, default=20000)
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument(
+            "--threads", type=int, default=32, help="Потоков на воркер gunicorn"
+        )
+        parser.add_argument("--products", type=int, default=2000)
+        parser.add_argument("--port", type=int, default=8750)
+        parser.add_argument(
+            "--only", choices=sorted(SERVERS), help="Запустить только один вариант"
+        )
+
+    def handle(self, *args, **options):
+        kinds = [options["only"]] if options["only"] else list(SERVERS)
+        for kind in kinds:
+            module = SERVERS[kind][0]
+            if importlib.util.find_spec(module) is None:
+                raise CommandError(f"Для варианта {kind} нужен пакет {module}")
+
+        # Серверы работают в отдельных процессах и видят только
+        # закоммиченные данные, поэтому набор удаляется явно
+        with transaction.atomic():
+            data = seed_dataset(products=options["products"], orders=0, reviews=2000)
+        try:
+            self._run(kinds, data, options)
+        finally:
+            delete_dataset(data)
+
+    def _run(self, kinds, data, options):
+        products = data["products"]
+        self.stdout.write(
+            f"{options['connections']} соединений, {options['requests']} запросов, "
+            f"воркеров: {options['workers']}, потоков gunicorn: {options['threads']}"
+        )
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'Вариант':<8}{'RPS':>10}{'p50, мс':>10}{'p95, мс':>10}"
+            f"{'p99, мс':>10}{'ошибок':>9}"
+        )
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "music_shop.settings"}
+        for offset, kind in enumerate(kinds):
+            prefix = SERVERS[kind][1]
+            paths = [
+                f"{prefix}products/catalog/?facets=1&page_size=24",
+                f"{prefix}products/{products[0].pk}/",
+                f"{prefix}reviews/product_reviews/?product_id={products[1].pk}",
+                f"{prefix}products/{products[2].pk}/",
+            ]
+            port = options["port"] + offset
+            server = subprocess.Popen(
+                _server_command(kind, port, options),
+                cwd=settings.BASE_DIR,
+                env=env,
+            )
+            try:
+                _wait_for_port(port)
+                # Прогрев: соединения с БД, кэши, импорт модулей
+                asyncio.run(_load(port, paths, 10, 200))
+                elapsed, latencies, errors = asyncio.run(
+                    _load(port, paths, options["connections"], options["requests"])
+                )
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            rps = len(latencies) / elapsed if elapsed else 0.0
+            self.stdout.write(
+                f"{kind:<8}{rps:>10.0f}"
+                f"{statistics.median(latencies) * 1000 if latencies else 0:>10.1f}"
+                f"{_percentile(latencies, 0.95) * 1000:>10.1f}"
+                f"{_percentile(latencies, 0.99) * 1000:>10.1f}"
+                f"{errors:>9}"
+            )
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from shop_main.bench_utils import best_time, run_with_rollback, seed_dataset
+from shop_main.catalog_index import CatalogIndex
+from shop_main.facets import compute_facets, filter_by_selection, read_selection
+from shop_main.models import Product
+
+QUERIES = [
+    ("без фильтров", {}, "-created_at"),
+    ("жанр", {"genre": "jazz and blues"}, "price"),
+    (
+        "цена и наличие",
+        {"min_price": "1000", "max_price": "3000", "in_stock": "1"},
+        "-price",
+    ),
+    ("поиск", {"search": "album 1"}, "product_name"),
+]
+
+
+class Command(BaseCommand):
+    help = "Сравнивает страницу каталога с фасетами: PostgreSQL и индекс в памяти"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=20000)
+        parser.add_argument("--page-size", type=int, default=24)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        index = CatalogIndex()
+        if not index.available:
+            raise CommandError("Для индекса каталога нужен numpy")
+        run_with_rollback(lambda: self._run(index, options))
+
+    def _run(self, index, options):
+        seed_dataset(products=options["products"], orders=0, reviews=0)
+        repeat = options["repeat"]
+        page_size = options["page_size"]
+
+        index.build()
+        stats = index.stats()
+        self.stdout.write(
+            f"Индекс: {stats['rows']} товаров, "
+            f"{stats['memory_bytes'] / 1024 / 1024:.1f} МБ, "
+            f"построен за {stats['build_seconds'] * 1000:.0f} мс"
+        )
+        self.stdout.write("")
+        self.stdout.write(f"{'Запрос':<20}{'БД, мс':>12}{'индекс, мс':>14}")
+
+        for name, params, sort in QUERIES:
+            selection = read_selection(params)
+            search = params.get("search", "")
+
+            def from_db():
+                queryset = Product.objects.all()
+                if search:
+                    queryset = queryset.filter(
+                        Q(product_name__icontains=search)
+                        | Q(artist__artist_name__icontains=search)
+                    )
+                compute_facets(queryset, selection)
+                list(
+                    filter_by_selection(queryset, selection)
+                    .order_by(sort, "pk")
+                    .values_list("pk", flat=True)[:page_size]
+                )
+
+            def from_index():
+                index.search(selection, search, sort, 0, page_size)
+
+            db_time = best_time(from_db, repeat)
+            index_time = best_time(from_index, repeat)
+            self.stdout.write(
+                f"{name:<20}{db_time * 1000:>12.2f}{index_time * 1000:>14.2f}"
+            )
@@ -0,0 +1,207 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from shop_main.api import ProductViewSet
+from shop_main.bench_utils import (
+    delete_dataset,
+    run_with_rollback,
+    seed_dataset,
+)
+from shop_main.facets import filter_by_selection, read_selection
+from shop_main.models import (
+    Artist,
+    Genre,
+    Order,
+    OrderItem,
+    Product,
+    Review,
+    ShippingAddress,
+)
+from shop_main.queries import (
+    reviews_for_product,
+    user_addresses,
+    user_orders,
+)
+from shop_main.query_plans import index_table_map, plan_outline
+
+
+def _index_by_fields(model, fields):
+    return next(index for index in model._meta.indexes if index.fields == fields)
+
+
+# (запрос, модель, поля составного индекса, построитель запроса)
+CASES = [
+    (
+        "product_reviews",
+        Review,
+        ["product", "-created_at"],
+        lambda data: reviews_for_product(data["product"].pk),
+    ),
+    (
+        "create_review: дубль",
+        Review,
+        ["user", "product"],
+        # Тот же фильтр, что в has_reviewed; exists() — это LIMIT 1
+        lambda data: Review.objects.filter(
+            user=data["user"], product_id=data["product"].pk
+        )[:1],
+    ),
+    (
+        "my_orders",
+        Order,
+        ["user", "-date_order"],
+        lambda data: user_orders(data["user"]),
+    ),
+    (
+        "my_addresses",
+        ShippingAddress,
+        ["user", "-created_at"],
+        lambda data: user_addresses(data["user"]),
+    ),
+    (
+        "каталог: жанр и цена",
+        Product,
+        ["genre", "price"],
+        lambda data: filter_by_selection(
+            ProductViewSet.queryset.all(),
+            read_selection(
+                {
+                    "genre": data["product"].genre.genre_name,
+                    "min_price": "1000",
+                    "max_price": "1500",
+                }
+            ),
+        ).order_by("price", "pk")[:24],
+    ),
+]
+
+
+MODELS = (Genre, Artist, Product, Order, OrderItem, Review, ShippingAddress)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает запросы из горячих путей без составных индексов "
+        "(миграция 0021) и с ними"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=20000)
+        parser.add_argument("--orders", type=int, default=50000)
+        parser.add_argument("--reviews", type=int, default=100000)
+        parser.add_argument("--users", type=int, default=5000)
+        parser.add_argument(
+            "--hot",
+            type=int,
+            default=2000,
+            help="Отзывов у популярного товара и заказов у активного покупателя",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        indexes = [_index_by_fields(model, fields) for _, model, fields, _ in CASES]
+        missing = {index.name for index in indexes} - set(index_table_map())
+        if missing:
+            raise CommandError(
+                "Нет индексов " + ", ".join(sorted(missing)) + ": выполните migrate"
+            )
+
+        # Данные коммитятся: VACUUM заполняет карту видимости, без нее
+        # Index Only Scan не отличить от обычного. Набор удаляется явно
+        with transaction.atomic():
+            data = self._seed(options)
+        try:
+            with connection.cursor() as cursor:
+                for model in MODELS:
+                    cursor.execute(f"VACUUM ANALYZE {model._meta.db_table}")
+            # DROP INDEX выполняется в транзакции и откатывается
+            run_with_rollback(lambda: self._run(data, options, indexes))
+        finally:
+            delete_dataset(data)
+
+    def _seed(self, options):
+        data = seed_dataset(
+            products=options["products"],
+            orders=options["orders"],
+            reviews=options["reviews"],
+            users=options["users"],
+        )
+        # Популярный товар и активный покупатель — у них индексы нужнее всего
+        users, product = data["users"], data["products"][1]
+        user = data["user"] = users[1]
+        data["product"] = product
+        Review.objects.bulk_create(
+            [
+                Review(
+                    rating=5,
+                    text="Отличная пластинка",
+                    user=users[i % len(users)],
+                    product=product,
+                )
+                for i in range(options["hot"])
+            ],
+            batch_size=5000,
+        )
+        Order.objects.bulk_create(
+            [Order(user=user) for _ in range(options["hot"])], batch_size=5000
+        )
+        addresses = [
+            ShippingAddress(
+                user=user,
+                full_name=user.username,
+                phone="+70000000000",
+                city="Москва",
+                address_line=f"ул. Тестовая, {number}",
+                postal_code="101000",
+            )
+            for number in range(2, 50)
+        ]
+        for address in addresses:
+            address.fingerprint = address.compute_fingerprint()
+        ShippingAddress.objects.bulk_create(addresses)
+        return data
+
+    def _measure(self, data, repeat):
+        """[(время выполнения в БД, мс; способ чтения таблицы)] по EXPLAIN ANALYZE"""
+        index_tables = index_table_map()
+        results = []
+        for _, model, _, build in CASES:
+            queryset = build(data)
+            runs = [
+                json.loads(queryset.explain(format="json", analyze=True))[0]
+                for _ in range(repeat)
+            ]
+            results.append(
+                (
+                    min(run["Execution Time"] for run in runs),
+                    plan_outline(
+                        runs[-1]["Plan"], (model._meta.db_table,), index_tables
+                    ),
+                )
+            )
+        return results
+
+    def _run(self, data, options, indexes):
+        after = self._measure(data, options["repeat"])
+        with connection.cursor() as cursor:
+            for index in indexes:
+                cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
+        before = self._measure(data, options["repeat"])
+
+        self.stdout.write(
+            f"{'Запрос':<24}{'до, мс':>10}{'после, мс':>12}{'ускорение':>12}"
+        )
+        for (label, *_), (old_time, old_plan), (new_time, new_plan) in zip(
+            CASES, before, after
+        ):
+            self.stdout.write(
+                f"{label:<24}{old_time:>10.2f}{new_time:>12.2f}"
+                f"{old_time / new_time:>11.1f}x"
+            )
+            self.stdout.write(f"    до:    {'; '.join(old_plan)}")
+            self.stdout.write(f"    после: {'; '.join(new_plan)}")
+        self.stdout.write(
+            self.style.SUCCESS("Индексы восстановлены откатом транзакции")
+        )
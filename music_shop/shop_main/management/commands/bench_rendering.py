@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from shop_main.bench_utils import best_time, run_with_rollback, seed_dataset
+from shop_main.fast_serializers import serialize_products
+from shop_main.middleware import COMPRESSORS
+from shop_main.models import Product
+from shop_main.renderers import FastJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = "Размер ответа и время рендеринга каталога: JSON-рендереры и сжатие"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=2000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        run_with_rollback(lambda: self._run(options))
+
+    def _run(self, options):
+        seed_dataset(products=options["products"], orders=0, reviews=0)
+        repeat = options["repeat"]
+
+        request = RequestFactory().get(
+            "/api/v1/products/catalog/", HTTP_HOST="localhost"
+        )
+        data = serialize_products(
+            Product.objects.select_related("genre", "artist").order_by("-created_at"),
+            request=request,
+        )
+
+        self.stdout.write(f"Каталог: {len(data)} товаров")
+        self.stdout.write(f"orjson: {'установлен' if orjson else 'не установлен'}")
+        self.stdout.write("")
+        self.stdout.write(f"{'Рендерер':<20}{'время, мс':>12}")
+        for name, renderer in (
+            ("JSONRenderer", JSONRenderer()),
+            ("FastJSONRenderer", FastJSONRenderer()),
+        ):
+            elapsed = best_time(lambda: renderer.render(data), repeat)
+            self.stdout.write(f"{name:<20}{elapsed * 1000:>12.2f}")
+
+        content = FastJSONRenderer().render(data)
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'Кодировка':<20}{'байт':>12}{'доля':>10}{'сжатие, мс':>14}"
+        )
+        self.stdout.write(f"{'identity':<20}{len(content):>12}{1:>10.3f}{0:>14.2f}")
+        for name, compress in COMPRESSORS.items():
+            size = len(compress(content))
+            elapsed = best_time(lambda: compress(content), repeat)
+            self.stdout.write(
+                f"{name:<20}{size:>12}{size / len(content):>10.3f}"
+                f"{elapsed * 1000:>14.2f}"
+            )
@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from shop_main.bench_utils import best_time, run_with_rollback, seed_dataset
+from shop_main.fast_serializers import (
+    serialize_orders,
+    serialize_products,
+    serialize_reviews,
+)
+from shop_main.models import Order, OrderItem, Product, Review
+from shop_main.serializers import (
+    OrderSerializer,
+    ProductSerializer,
+    ReviewSerializer,
+)
+
+
+class Command(BaseCommand):
+    help = "Сравнивает стоимость сериализации одного объекта: DRF и быстрый путь"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--orders", type=int, default=300)
+        parser.add_argument("--reviews", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        run_with_rollback(lambda: self._run(options))
+
+    def _run(self, options):
+        seed_dataset(
+            products=options["products"],
+            orders=options["orders"],
+            reviews=options["reviews"],
+        )
+        repeat = options["repeat"]
+
+        products = Product.objects.select_related("genre", "artist").order_by("id")
+        orders = (
+            Order.objects.select_related("user", "shipping_address", "coupon")
+            .prefetch_related(
+                Prefetch(
+                    "orderitem_set",
+                    queryset=OrderItem.objects.select_related("product").order_by("id"),
+                )
+            )
+            .order_by("id")
+        )
+        reviews = Review.objects.select_related("user", "product").order_by("id")
+
+        cases = [
+            (
+                "Product",
+                products.count(),
+                lambda: ProductSerializer(products.all(), many=True).data,
+                lambda: serialize_products(products.all()),
+            ),
+            (
+                "Order",
+                orders.count(),
+                lambda: OrderSerializer(orders.all(), many=True).data,
+                lambda: serialize_orders(Order.objects.order_by("id")),
+            ),
+            (
+                "Review",
+                reviews.count(),
+                lambda: ReviewSerializer(reviews.all(), many=True).data,
+                lambda: serialize_reviews(reviews.all()),
+            ),
+        ]
+
+        self.stdout.write(
+            f"{'Модель':<10}{'объектов':>10}{'DRF, мкс':>12}{'fast, мкс':>12}{'ускорение':>12}"
+        )
+        for name, count, drf, fast in cases:
+            drf_time = best_time(drf, repeat) / count * 1e6
+            fast_time = best_time(fast, repeat) / count * 1e6
+            self.stdout.write(
+                f"{name:<10}{count:>10}{drf_time:>12.1f}{fast_time:>12.1f}"
+                f"{drf_time / fast_time:>11.1f}x"
+            )
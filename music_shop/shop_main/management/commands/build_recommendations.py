@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop_main.recommendations import rebuild_recommendations, refresh_recommendations
+
+
+class Command(BaseCommand):
+    help = "Строит индекс «С этим товаром покупают» по истории заказов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Учесть только заказы, появившиеся после прошлой сборки",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options["incremental"]:
+            count = refresh_recommendations()
+        else:
+            count = rebuild_recommendations()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Обновлено товаров: {count} за {elapsed:.2f} с")
+        )
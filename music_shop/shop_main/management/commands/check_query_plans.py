@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from shop_main.bench_utils import run_with_rollback
+from shop_main.query_plans import (
+    BASELINE_PATH,
+    load_baseline,
+    plan_diff,
+    run_checks,
+    save_baseline,
+    seed_plan_dataset,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Проверяет планы критичных запросов на синтетических данных: "
+        "индексы, стоимость и отличия от сохраненных планов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="Сохранить текущие планы как эталонные",
+        )
+        parser.add_argument("--baseline", default=str(BASELINE_PATH))
+
+    def handle(self, *args, **options):
+        # Чистая тестовая база: статистика рабочей базы и «мертвые» строки
+        # не влияют на планы, результат повторяется от запуска к запуску
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            results = run_with_rollback(lambda: run_checks(seed_plan_dataset()))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        baseline = load_baseline(options["baseline"])
+
+        failed = []
+        for name, result in results.items():
+            self.stdout.write(f"{name}: стоимость {result['cost']:.0f}")
+            for problem in result["problems"]:
+                self.stdout.write(self.style.ERROR(f"  {problem}"))
+            if result["problems"]:
+                failed.append(name)
+
+            saved = baseline.get(name)
+            if saved is None:
+                self.stdout.write(self.style.WARNING("  нет сохраненного плана"))
+                continue
+            diff = plan_diff(name, saved["outline"], result["outline"])
+            if diff:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"  план изменился (стоимость была {saved['cost']:.0f}):"
+                    )
+                )
+                for line in diff:
+                    self.stdout.write(f"    {line}")
+                if not options["update"]:
+                    failed.append(name)
+
+        if options["update"]:
+            save_baseline(results, options["baseline"])
+            self.stdout.write(
+                self.style.SUCCESS(f"Планы сохранены в {options['baseline']}")
+            )
+        if failed:
+            raise CommandError(
+                "Проверка планов не пройдена: " + ", ".join(sorted(set(failed)))
+            )
+        self.stdout.write(self.style.SUCCESS("Планы критичных запросов в порядке"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from shop_main.addresses import merge_duplicate_addresses
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает отпечатки адресов доставки и сливает дубли, "
+        "перевешивая заказы на оставшийся адрес"
+    )
+
+    def handle(self, *args, **options):
+        updated, merged = merge_duplicate_addresses()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Пересчитано отпечатков: {updated}, удалено дублей: {merged}"
+            )
+        )
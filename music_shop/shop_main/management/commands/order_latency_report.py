@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop_main.models import Order
+from shop_main.order_status import fulfillment_report
+
+
+def _hours(seconds):
+    return "—" if seconds is None else f"{seconds / 3600:.1f}"
+
+
+class Command(BaseCommand):
+    help = "Время заказов в каждом статусе и до доставки за период (в часах)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=30, help="Период отчета: последние N дней"
+        )
+
+    def handle(self, *args, **options):
+        until = timezone.now()
+        report = fulfillment_report(until - timedelta(days=options["days"]), until)
+        labels = dict(Order.STATUS_CHOICES)
+
+        self.stdout.write(
+            f"{'Статус':<16}{'вошли':>8}{'вышли':>8}{'среднее':>10}"
+            f"{'медиана':>10}{'p90':>10}{'макс':>10}"
+        )
+        rows = [
+            (labels[row["status"]], row["entered"], row["left"], row)
+            for row in report["statuses"]
+        ]
+        delivery = report["delivery"]
+        rows.append(("До доставки", delivery["delivered"], "", delivery))
+        for label, entered, left, stats in rows:
+            self.stdout.write(
+                f"{label:<16}{entered:>8}{left:>8}{_hours(stats['avg']):>10}"
+                f"{_hours(stats['p50']):>10}{_hours(stats['p90']):>10}"
+                f"{_hours(stats['max']):>10}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Переходы за последние {options['days']} дн.")
+        )
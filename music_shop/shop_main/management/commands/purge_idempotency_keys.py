@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop_main.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Удаляет устаревшие ключи идемпотентности"
+
+    def handle(self, *args, **options):
+        count = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f"Удалено ключей: {count}"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from shop_main.trending import rebuild_from_history
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает счетчики популярности товаров из журнала и заказов: "
+        "только просмотры и покупки, добавления в корзину обнуляются"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=None, help="Глубина истории в днях"
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_from_history(days=options["days"])
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано товаров: {count}"))
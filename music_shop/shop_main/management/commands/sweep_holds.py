@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop_main.holds import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Возвращает на склад товары из истекших броней корзин"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop", action="store_true", help="Работать постоянно, а не один проход"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=getattr(settings, "CART_HOLD_SWEEP_INTERVAL", 30),
+            help="Пауза между проходами в секундах",
+        )
+
+    def sweep(self):
+        total = 0
+        # Пачками, пока истекшие брони не закончатся
+        while True:
+            released = release_expired_holds()
+            total += released
+            if released < getattr(settings, "CART_HOLD_SWEEP_BATCH", 1000):
+                return total
+
+    def handle(self, *args, **options):
+        while True:
+            total = self.sweep()
+            if total or not options["loop"]:
+                self.stdout.write(self.style.SUCCESS(f"Снято броней: {total}"))
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -1,6 +1,22 @@
-"""Middleware для логирования действий пользователей"""
+"""Middleware для логирования действий пользователей, сжатия ответов API и
+маршрутизации чтения на реплики БД"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
 from .logger_utils import create_log_entry
+from . import replicas
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli необязателен
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard необязателен
+    zstandard = None
 
 
 class LoggingMiddleware(MiddlewareMixin):
@@ -59,3 +75,149 @@ class LoggingMiddleware(MiddlewareMixin):
             ip = request.META.get('REMOTE_ADDR')
         return ip
 
+
+def _compress_gzip(content):
+    # Случайные байты в заголовке gzip — защита от BREACH, как в GZipMiddleware
+    return compress_string(content, max_random_bytes=100)
+
+
+def _compress_brotli(content):
+    return brotli.compress(content, quality=5)
+
+
+def _compress_zstd(content):
+    return zstandard.ZstdCompressor(level=3).compress(content)
+
+
+# Кодировки в порядке предпочтения сервера
+COMPRESSORS = {}
+if zstandard is not None:
+    COMPRESSORS["zstd"] = _compress_zstd
+if brotli is not None:
+    COMPRESSORS["br"] = _compress_brotli
+COMPRESSORS["gzip"] = _compress_gzip
+
+COMPRESSIBLE_CONTENT_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def parse_accept_encoding(header):
+    """Разбирает Accept-Encoding в словарь {кодировка: q}"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def choose_encoding(header, available=None):
+    """Выбирает лучшую кодировку из поддерживаемых клиентом и сервером"""
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for coding in available if available is not None else COMPRESSORS:
+        quality = accepted.get(coding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Сжимает ответы API с помощью zstd, brotli или gzip.
+
+    Сжимаются только текстовые ответы (JSON, HTML, JS...) не меньше
+    COMPRESSION_MIN_SIZE байт, на путях из COMPRESSION_PATH_PREFIXES.
+    Уже сжатые форматы (изображения, PDF, архивы) и потоковые ответы
+    не трогаем.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+
+        prefixes = getattr(settings, "COMPRESSION_PATH_PREFIXES", ("/api/",))
+        if prefixes and not request.path.startswith(tuple(prefixes)):
+            return response
+
+        content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+        if not content_type.startswith(COMPRESSIBLE_CONTENT_TYPES):
+            return response
+
+        min_size = getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+        if len(response.content) < min_size:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        encoding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        compressed_content = COMPRESSORS[encoding](response.content)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+
+class ReplicaMiddleware:
+    """Границы запроса для shop_main.replicas и закрепление за default после
+    записи: cookie живет REPLICA_PIN_SECONDS секунд"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replicas.request_scope(self.is_pinned(request)):
+            response = self.get_response(request)
+        return self.pin_after_write(request, response)
+
+    async def __acall__(self, request):
+        with replicas.request_scope(self.is_pinned(request)):
+            response = await self.get_response(request)
+        return self.pin_after_write(request, response)
+
+    def is_pinned(self, request):
+        return replicas.pin_cookie() in request.COOKIES
+
+    def pin_after_write(self, request, response):
+        if (
+            replicas.replica_aliases()
+            and request.method not in replicas.SAFE_METHODS
+            and response.status_code < 400
+        ):
+            response.set_cookie(
+                replicas.pin_cookie(),
+                "1",
+                max_age=replicas.pin_seconds(),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
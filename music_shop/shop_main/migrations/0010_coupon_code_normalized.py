@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+def fill_code_normalized(apps, schema_editor):
+    Coupon = apps.get_model("shop_main", "Coupon")
+    codes = {}
+    for coupon in Coupon.objects.all().only("id", "code"):
+        normalized = (coupon.code or "").strip().upper()
+        codes.setdefault(normalized, []).append(coupon.code)
+        coupon.code_normalized = normalized
+        coupon.save(update_fields=["code_normalized"])
+
+    # Уникальный индекс ниже не создастся, если коды отличаются только
+    # регистром или пробелами: какой купон оставить, решает администратор
+    duplicates = [group for group in codes.values() if len(group) > 1]
+    if duplicates:
+        raise RuntimeError(
+            "Коды купонов совпадают без учета регистра, переименуйте или удалите "
+            "лишние перед миграцией: "
+            + "; ".join(", ".join(repr(code) for code in group) for group in duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop_main", "0009_favorite"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="coupon",
+            name="code_normalized",
+            field=models.CharField(editable=False, max_length=50, null=True),
+        ),
+        migrations.RunPython(fill_code_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="coupon",
+            name="code_normalized",
+            field=models.CharField(editable=False, max_length=50, unique=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:26
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Таблица журнала большая: индексы строятся CONCURRENTLY, без блокировки
+    # записи, а это невозможно внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ("shop_main", "0010_coupon_code_normalized"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="logentry",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="shop_main_l_created_2b3c83_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="logentry",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector(
+                    "description", config="russian"
+                ),
+                name="shop_main_log_descr_fts_idx",
+            ),
+        ),
+        # Старый индекс удаляется, когда новый уже построен
+        RemoveIndexConcurrently(
+            model_name="logentry",
+            name="shop_main_l_created_d0072e_idx",
+        ),
+    ]
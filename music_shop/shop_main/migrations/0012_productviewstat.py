@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop_main", "0011_logentry_keyset_and_search_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductViewStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("views", models.PositiveBigIntegerField(default=0)),
+                ("unique_views", models.PositiveBigIntegerField(default=0)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="view_stats",
+                        to="shop_main.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика просмотров",
+                "verbose_name_plural": "Статистика просмотров",
+                "indexes": [
+                    models.Index(fields=["-date"], name="shop_main_p_date_47f406_idx")
+                ],
+                "unique_together": {("product", "date")},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop_main", "0012_productviewstat"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrendingScore",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="trending",
+                        serialize=False,
+                        to="shop_main.product",
+                    ),
+                ),
+                ("views", models.FloatField(default=0)),
+                ("carts", models.FloatField(default=0)),
+                ("purchases", models.FloatField(default=0)),
+                ("updated_at", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Популярность товара",
+                "verbose_name_plural": "Популярность товаров",
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:38
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не блокирует запись в таблицы, но не может
+    # выполняться внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ("shop_main", "0014_productrecommendation"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(
+                fields=["updated_at"], name="shop_main_p_updated_a8ca8c_idx"
+            ),
+        ),
+    ]
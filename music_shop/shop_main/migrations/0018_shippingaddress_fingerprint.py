@@ -0,0 +1,91 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:20
+
+import hashlib
+import re
+
+from django.db import migrations, models
+
+ADDRESS_FIELDS = ("full_name", "phone", "city", "address_line", "postal_code")
+
+
+# Копия shop_main.models.normalize_address и address_fingerprint на момент
+# миграции: изменение правил нормализации не должно менять ее результат.
+# Адреса с новыми правилами пересчитывает merge_shipping_addresses
+def normalize_address(data):
+    data = {field: data.get(field) or "" for field in ADDRESS_FIELDS}
+    normalized = {
+        field: " ".join(re.sub(r"\W+", " ", data[field]).split()).casefold()
+        for field in ("full_name", "city", "address_line")
+    }
+    normalized["postal_code"] = "".join(data["postal_code"].split()).casefold()
+    phone = re.sub(r"\D", "", data["phone"])
+    if len(phone) == 11 and phone.startswith("8"):
+        phone = "7" + phone[1:]
+    normalized["phone"] = phone
+    return normalized
+
+
+def address_fingerprint(data):
+    normalized = normalize_address(data)
+    payload = "\x00".join(normalized[field] for field in ADDRESS_FIELDS)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def merge_duplicates(apps, schema_editor):
+    ShippingAddress = apps.get_model("shop_main", "ShippingAddress")
+    addresses = list(ShippingAddress.objects.only("id", *ADDRESS_FIELDS))
+    for address in addresses:
+        address.fingerprint = address_fingerprint(
+            {field: getattr(address, field) for field in ADDRESS_FIELDS}
+        )
+    ShippingAddress.objects.bulk_update(addresses, ["fingerprint"], batch_size=1000)
+
+    # Остается самый новый адрес из группы, заказы перевешиваются на него
+    duplicates = """
+        SELECT id, first_value(id) OVER (
+            PARTITION BY user_id, fingerprint ORDER BY created_at DESC, id DESC
+        ) AS keep_id
+        FROM shop_main_shippingaddress
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE shop_main_order o SET shipping_address_id = d.keep_id
+            FROM ({duplicates}) d
+            WHERE o.shipping_address_id = d.id AND d.id <> d.keep_id
+            """
+        )
+        cursor.execute(
+            f"""
+            DELETE FROM shop_main_shippingaddress a USING ({duplicates}) d
+            WHERE a.id = d.id AND d.id <> d.keep_id
+            """
+        )
+        # Проверяем отложенные внешние ключи сейчас: с отложенными событиями
+        # триггеров PostgreSQL не даст изменить таблицу дальше в миграции
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop_main", "0017_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shippingaddress",
+            name="fingerprint",
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="shippingaddress",
+            name="fingerprint",
+            field=models.CharField(editable=False, max_length=64),
+        ),
+        migrations.AlterUniqueTogether(
+            name="shippingaddress",
+            unique_together={("user", "fingerprint")},
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# История до появления таблицы: создание заказов и переходы из текстовых
+# логов. Переход записывали и представление, и сигнал, поэтому одинаковые
+# записи одной секунды схлопываются; предпочтение — записи представления
+# (с IP и сотрудником в user).
+BACKFILL_SQL = r"""
+INSERT INTO shop_main_orderstatusevent
+    (order_id, from_status, to_status, created_at, actor_id)
+SELECT id, '', 'pending', date_order, user_id FROM shop_main_order;
+
+INSERT INTO shop_main_orderstatusevent
+    (order_id, from_status, to_status, created_at, actor_id)
+SELECT DISTINCT ON (o.id, m[2], m[3], date_trunc('second', l.created_at))
+    o.id, m[2], m[3], l.created_at, l.user_id
+FROM shop_main_logentry l
+CROSS JOIN LATERAL regexp_match(
+    l.description, '#(\d+) изменен с ''(\w+)'' на ''(\w+)'''
+) AS m
+JOIN shop_main_order o ON o.id = m[1]::bigint
+WHERE l.action = 'order_updated'
+ORDER BY o.id, m[2], m[3], date_trunc('second', l.created_at),
+    l.ip_address IS NULL, l.created_at;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop_main", "0018_shippingaddress_fingerprint"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderStatusEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("from_status", models.CharField(blank=True, max_length=20)),
+                (
+                    "to_status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "В обработке"),
+                            ("processing", "Обрабатывается"),
+                            ("shipped", "Отправлен"),
+                            ("delivered", "Доставлен"),
+                            ("cancelled", "Отменен"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                (
+                    "actor",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="order_status_events",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="status_events",
+                        to="shop_main.order",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Смена статуса заказа",
+                "verbose_name_plural": "Смены статусов заказов",
+                "ordering": ["order", "created_at", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["order", "created_at", "id"],
+                        name="shop_main_o_order_i_73e4a4_idx",
+                    ),
+                    models.Index(
+                        fields=["to_status", "created_at"],
+                        name="shop_main_o_to_stat_438620_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
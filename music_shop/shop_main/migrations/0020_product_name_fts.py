@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не блокирует запись в таблицы, но не может
+    # выполняться внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ("shop_main", "0019_orderstatusevent"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector(
+                    "product_name", config="simple"
+                ),
+                name="shop_main_product_name_fts_idx",
+            ),
+        ),
+    ]
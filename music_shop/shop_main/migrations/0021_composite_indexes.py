@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:36
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не блокирует запись в таблицы, но не может
+    # выполняться внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ("shop_main", "0020_product_name_fts"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "-date_order"], name="shop_main_o_user_id_e8cb57_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(
+                fields=["genre", "price"], name="shop_main_p_genre_i_d543d5_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="review",
+            index=models.Index(
+                fields=["product", "-created_at"], name="shop_main_r_product_ba12e0_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="review",
+            index=models.Index(
+                fields=["user", "product"], name="shop_main_r_user_id_b0b2c0_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="shippingaddress",
+            index=models.Index(
+                fields=["user", "-created_at"], name="shop_main_s_user_id_4a7ed1_idx"
+            ),
+        ),
+    ]
@@ -1,7 +1,13 @@
 from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from decimal import Decimal
+import hashlib
+import re
 
 
 def max_len_choices(choices):
@@ -44,9 +50,21 @@ class Product(models.Model):
     artist = models.ForeignKey(Artist, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Лимитированный тираж: добавление в корзину временно бронирует экземпляры
+    limited_release = models.BooleanField(default=False)
 
     class Meta:
         unique_together = ("product_name", "artist")
+        indexes = [
+            models.Index(fields=["updated_at"]),
+            # Каталог: жанр вместе с диапазоном или сортировкой по цене
+            models.Index(fields=["genre", "price"]),
+            # Поиск по словам названия в админке
+            GinIndex(
+                SearchVector("product_name", config="simple"),
+                name="shop_main_product_name_fts_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.product_name
@@ -60,6 +78,14 @@ class Order(models.Model):
         ("delivered", "Доставлен"),
         ("cancelled", "Отменен"),
     ]
+    # Допустимые переходы статусов; доставленный и отмененный заказ — конечные
+    STATUS_TRANSITIONS = {
+        "pending": ("processing", "cancelled"),
+        "processing": ("shipped", "cancelled"),
+        "shipped": ("delivered",),
+        "delivered": (),
+        "cancelled": (),
+    }
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date_order = models.DateTimeField(auto_now_add=True)
@@ -71,9 +97,46 @@ class Order(models.Model):
         "Coupon", on_delete=models.SET_NULL, null=True, blank=True
     )
 
+    class Meta:
+        indexes = [
+            # my_orders: заказы пользователя, новые первыми
+            models.Index(fields=["user", "-date_order"]),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус на момент загрузки: по нему сигнал узнает о смене статуса
+        if "status" in instance.__dict__:
+            instance._old_status = instance.status
+        return instance
+
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
+    @classmethod
+    def statuses_leading_to(cls, status):
+        """Статусы, из которых разрешен переход в status"""
+        return [
+            source
+            for source, targets in cls.STATUS_TRANSITIONS.items()
+            if status in targets
+        ]
+
+    def can_change_status(self, status):
+        return status == self.status or status in self.STATUS_TRANSITIONS[self.status]
+
+    def clean(self):
+        old_status = getattr(self, "_old_status", None)
+        if old_status and old_status != self.status:
+            if self.status not in self.STATUS_TRANSITIONS[old_status]:
+                raise ValidationError(
+                    {
+                        "status": f"Переход из статуса '{old_status}' "
+                        f"в '{self.status}' запрещен"
+                    }
+                )
+
     def get_total(self):
         """Вычисляет общую сумму заказа"""
         total = Decimal("0")
@@ -108,10 +171,43 @@ class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # product_reviews: отзывы к товару, новые первыми
+            models.Index(fields=["product", "-created_at"]),
+            # create_review: проверка, что отзыв на товар уже есть
+            models.Index(fields=["user", "product"]),
+        ]
+
     def __str__(self):
         return f"Review for {self.product.product_name} by {self.user.username}"
 
 
+ADDRESS_FIELDS = ("full_name", "phone", "city", "address_line", "postal_code")
+
+
+def normalize_address(data):
+    """Поля адреса без различий в регистре, пробелах, пунктуации и записи телефона"""
+    data = {field: data.get(field) or "" for field in ADDRESS_FIELDS}
+    normalized = {
+        field: " ".join(re.sub(r"\W+", " ", data[field]).split()).casefold()
+        for field in ("full_name", "city", "address_line")
+    }
+    normalized["postal_code"] = "".join(data["postal_code"].split()).casefold()
+    phone = re.sub(r"\D", "", data["phone"])
+    if len(phone) == 11 and phone.startswith("8"):
+        phone = "7" + phone[1:]
+    normalized["phone"] = phone
+    return normalized
+
+
+def address_fingerprint(data):
+    """Хэш нормализованного адреса: одинаковые адреса пользователя совпадают"""
+    normalized = normalize_address(data)
+    payload = "\x00".join(normalized[field] for field in ADDRESS_FIELDS)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
 class ShippingAddress(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     full_name = models.CharField(max_length=120)
@@ -120,13 +216,52 @@ class ShippingAddress(models.Model):
     address_line = models.CharField(max_length=200)
     postal_code = models.CharField(max_length=20)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Хэш нормализованного адреса: оформление заказа переиспользует строку
+    fingerprint = models.CharField(max_length=64, editable=False)
+
+    class Meta:
+        unique_together = ("user", "fingerprint")
+        indexes = [
+            # my_addresses: адреса пользователя, новые первыми
+            models.Index(fields=["user", "-created_at"]),
+        ]
 
     def __str__(self):
         return f"{self.full_name}, {self.city}, {self.address_line}"
 
+    def clean(self):
+        super().clean()
+        if self.user_id is None:
+            return
+        duplicates = ShippingAddress.objects.filter(
+            user_id=self.user_id,
+            fingerprint=self.compute_fingerprint(),
+        ).exclude(pk=self.pk)
+        if duplicates.exists():
+            raise ValidationError("У пользователя уже есть такой адрес")
+
+    def compute_fingerprint(self):
+        return address_fingerprint(
+            {field: getattr(self, field) for field in ADDRESS_FIELDS}
+        )
+
+    def save(self, *args, **kwargs):
+        self.fingerprint = self.compute_fingerprint()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and set(update_fields) & set(ADDRESS_FIELDS):
+            kwargs["update_fields"] = {*update_fields, "fingerprint"}
+        super().save(*args, **kwargs)
+
+
+def normalize_coupon_code(code):
+    """Приводит код купона к виду, в котором он хранится в code_normalized"""
+    return (code or "").strip().upper()
+
 
 class Coupon(models.Model):
     code = models.CharField(max_length=50, unique=True)
+    # Код в верхнем регистре: поиск без учета регистра идет по индексу
+    code_normalized = models.CharField(max_length=50, unique=True, editable=False)
     discount_percent = models.PositiveIntegerField(
         validators=[MinValueValidator(0), MaxValueValidator(100)]
     )
@@ -137,6 +272,27 @@ class Coupon(models.Model):
     def __str__(self):
         return f"{self.code} ({self.discount_percent}%)"
 
+    def clean(self):
+        super().clean()
+        duplicates = Coupon.objects.filter(
+            code_normalized=normalize_coupon_code(self.code)
+        ).exclude(pk=self.pk)
+        if duplicates.exists():
+            raise ValidationError({"code": "Купон с таким кодом уже существует"})
+
+    def save(self, *args, **kwargs):
+        self.code_normalized = normalize_coupon_code(self.code)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "code" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "code_normalized"}
+        super().save(*args, **kwargs)
+
+    def is_valid_at(self, moment):
+        """Проверяет, попадает ли момент времени в срок действия купона"""
+        return (not self.valid_from or self.valid_from <= moment) and (
+            not self.valid_to or self.valid_to >= moment
+        )
+
 
 class LogEntry(models.Model):
     """Модель для хранения логов действий пользователей"""
@@ -188,9 +344,13 @@ class LogEntry(models.Model):
         verbose_name = "Лог"
         verbose_name_plural = "Логи"
         indexes = [
-            models.Index(fields=["-created_at"]),
+            models.Index(fields=["-created_at", "-id"]),
             models.Index(fields=["user", "-created_at"]),
             models.Index(fields=["action", "-created_at"]),
+            GinIndex(
+                SearchVector("description", config="russian"),
+                name="shop_main_log_descr_fts_idx",
+            ),
         ]
 
     def __str__(self):
@@ -218,3 +378,183 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f"{self.user.username} → {self.product.product_name}"
+
+
+class ProductViewStat(models.Model):
+    """Суточные счетчики просмотров товара (shop_main.tracking)"""
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="view_stats"
+    )
+    date = models.DateField()
+    views = models.PositiveBigIntegerField(default=0)
+    unique_views = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("product", "date")
+        indexes = [
+            models.Index(fields=["-date"]),
+        ]
+        verbose_name = "Статистика просмотров"
+        verbose_name_plural = "Статистика просмотров"
+
+    def __str__(self):
+        return f"{self.product_id} {self.date}: {self.views}"
+
+
+class TrendingScore(models.Model):
+    """Затухающие счетчики активности по товару (shop_main.trending).
+
+    Значения приведены к моменту updated_at: чтобы получить их на другой
+    момент, достаточно умножить на коэффициент затухания за прошедшее время.
+    """
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="trending"
+    )
+    views = models.FloatField(default=0)
+    carts = models.FloatField(default=0)
+    purchases = models.FloatField(default=0)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Популярность товара"
+        verbose_name_plural = "Популярность товаров"
+
+    def __str__(self):
+        return f"{self.product_id}: {self.views:.1f}/{self.carts:.1f}/{self.purchases:.1f}"
+
+
+class ProductRecommendation(models.Model):
+    """Товары, которые чаще всего покупают вместе с данным (shop_main.recommendations).
+
+    Соседи хранятся параллельными массивами, упорядоченными по убыванию
+    support (числа заказов, где встретились оба товара).
+    """
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="recommendations",
+    )
+    neighbor_ids = ArrayField(models.BigIntegerField(), default=list)
+    supports = ArrayField(models.IntegerField(), default=list)
+    lifts = ArrayField(models.FloatField(), default=list)
+    last_order_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Рекомендации к товару"
+        verbose_name_plural = "Рекомендации к товарам"
+
+    def __str__(self):
+        return f"{self.product_id}: {len(self.neighbor_ids)}"
+
+
+class ProductBasketSupport(models.Model):
+    """Число учтенных в рекомендациях заказов с товаром (support товара).
+
+    Инкрементальное обновление прибавляет к нему новые заказы, не
+    пересчитывая всю историю.
+    """
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="+"
+    )
+    support = models.IntegerField(default=0)
+
+
+class RecommendationState(models.Model):
+    """Состояние индекса рекомендаций: одна строка.
+
+    last_order_id — последний учтенный заказ, orders — число учтенных
+    заказов (N в формуле lift).
+    """
+
+    last_order_id = models.BigIntegerField(default=0)
+    orders = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+
+class StockHold(models.Model):
+    """Временная бронь товара лимитированного тиража в корзине (shop_main.holds).
+
+    Забронированные экземпляры уже списаны с Product.stock_quantity; при
+    истечении брони они возвращаются на склад, при оформлении заказа
+    переходят в позицию заказа.
+    """
+
+    owner_key = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="holds")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("owner_key", "product")
+        verbose_name = "Бронь товара"
+        verbose_name_plural = "Брони товаров"
+
+    def __str__(self):
+        return f"{self.owner_key}: {self.product_id} x{self.quantity}"
+
+
+class IdempotencyKey(models.Model):
+    """Ключ идемпотентности запроса и сохраненный ответ (shop_main.idempotency).
+
+    Пока запрос выполняется, status_code и response пустые.
+    """
+
+    owner_key = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ("owner_key", "key")
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+
+    def __str__(self):
+        return f"{self.owner_key}: {self.key}"
+
+
+class OrderStatusEvent(models.Model):
+    """Переход заказа из статуса в статус (shop_main.order_status).
+
+    Пишется один раз на переход; создание заказа — переход из "" в
+    начальный статус. Время в статусе — разница с моментом следующего
+    перехода того же заказа.
+    """
+
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="status_events"
+    )
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="order_status_events",
+    )
+
+    class Meta:
+        ordering = ["order", "created_at", "id"]
+        verbose_name = "Смена статуса заказа"
+        verbose_name_plural = "Смены статусов заказов"
+        indexes = [
+            # История заказа и следующий переход (LEAD по заказу)
+            models.Index(fields=["order", "created_at", "id"]),
+            # Переходы в статус за период
+            models.Index(fields=["to_status", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"#{self.order_id}: {self.from_status or '—'} → {self.to_status}"
@@ -0,0 +1,221 @@
+"""История статусов заказов и отчет о сроках выполнения.
+
+Каждый переход записывается один раз — сигналом post_save заказа — в
+OrderStatusEvent, в лог (order_updated) и в живые обновления. Кто сменил
+статус, сигнал узнает из запроса, сохраненного в заказе атрибутом
+_status_request (его ставят OrderUpdateView и API). Массовая смена статуса
+(bulk_transition) обходится без сигнала и пишет все это пачками.
+"""
+
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .live import publish_order_status
+from .logger_utils import (
+    create_log_entry,
+    get_client_ip,
+    remember_active_log_user,
+)
+from .models import LogEntry, Order, OrderStatusEvent
+
+# Статусы, из которых заказ еще должен уйти: время в них и считает отчет
+OPEN_STATUSES = ("pending", "processing", "shipped")
+BULK_BATCH_SIZE = 1000
+
+
+def _actor(request):
+    if request is not None and request.user.is_authenticated:
+        return request.user
+    return None
+
+
+def _client(request):
+    """IP и User-Agent запроса для записи лога"""
+    if request is None:
+        return None, ""
+    return get_client_ip(request), request.META.get("HTTP_USER_AGENT", "")[:255]
+
+
+def _log_description(order_id, old_status, new_status):
+    return f"Статус заказа #{order_id} изменен с '{old_status}' на '{new_status}'"
+
+
+def record_transition(order, old_status, request=None):
+    """Записывает переход заказа из old_status ("" — создание) в order.status"""
+    actor = _actor(request)
+    OrderStatusEvent.objects.create(
+        order=order,
+        from_status=old_status,
+        to_status=order.status,
+        created_at=timezone.now(),
+        actor=actor,
+    )
+    if not old_status:
+        return
+    ip_address, user_agent = _client(request)
+    create_log_entry(
+        action="order_updated",
+        user=actor,
+        description=_log_description(order.id, old_status, order.status),
+        ip_address=ip_address,
+        user_agent=user_agent,
+        order=order,
+    )
+    publish_order_status(order, old_status)
+
+
+def bulk_transition(orders, to_status, request=None):
+    """Переводит заказы из queryset orders в to_status одним UPDATE.
+
+    Меняются только заказы, из статуса которых переход в to_status разрешен
+    (Order.STATUS_TRANSITIONS). Статус проверяется в самом UPDATE по
+    заблокированным строкам, так что параллельное изменение не даст
+    запрещенного перехода. История и лог пишутся пачками, сигнал post_save
+    не вызывается. Возвращает (переведено, пропущено).
+    """
+    table = Order._meta.db_table
+    ids_sql, ids_params = orders.order_by().values("pk").query.sql_with_params()
+    sql = f"""
+        WITH target AS (
+            SELECT id, status FROM {table}
+            WHERE id IN ({ids_sql})
+            ORDER BY id
+            FOR UPDATE
+        ),
+        moved AS (
+            UPDATE {table} o SET status = %s
+            FROM target
+            WHERE o.id = target.id AND target.status = ANY(%s)
+            RETURNING o.id, o.user_id, target.status
+        )
+        SELECT total.count, moved.id, moved.user_id, moved.status
+        FROM (SELECT COUNT(*) FROM target) total
+        LEFT JOIN moved ON true
+    """
+    params = [*ids_params, to_status, Order.statuses_leading_to(to_status)]
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        moved = [row[1:] for row in rows if row[1] is not None]
+        _record_many(moved, to_status, request)
+    return len(moved), rows[0][0] - len(moved)
+
+
+def _record_many(moved, to_status, request):
+    """История, лог и живые обновления для [(id, user_id, старый статус)]"""
+    if not moved:
+        return
+    now = timezone.now()
+    actor = _actor(request)
+    ip_address, user_agent = _client(request)
+    OrderStatusEvent.objects.bulk_create(
+        [
+            OrderStatusEvent(
+                order_id=pk,
+                from_status=old_status,
+                to_status=to_status,
+                created_at=now,
+                actor=actor,
+            )
+            for pk, _, old_status in moved
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    LogEntry.objects.bulk_create(
+        [
+            LogEntry(
+                action="order_updated",
+                user=actor,
+                description=_log_description(pk, old_status, to_status),
+                ip_address=ip_address,
+                user_agent=user_agent,
+                order_id=pk,
+            )
+            for pk, _, old_status in moved
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    if actor is not None:
+        remember_active_log_user(actor.pk)
+    for pk, user_id, old_status in moved:
+        publish_order_status(
+            Order(pk=pk, user_id=user_id, status=to_status), old_status
+        )
+
+
+def _seconds(interval):
+    return f"EXTRACT(EPOCH FROM {interval})::float8"
+
+
+def fulfillment_report(since=None, until=None):
+    """Сколько заказы проводят в каждом статусе и сколько ждут доставки.
+
+    Учитываются переходы за [since, until) (по умолчанию последние 30 дней).
+    Для статуса: сколько раз в него перешли, сколько из них уже ушли дальше,
+    среднее, медиана, 90-й перцентиль и максимум времени в статусе (секунды).
+    Для доставки — то же для времени от оформления до статуса delivered.
+    """
+    until = until or timezone.now()
+    since = since or until - timedelta(days=30)
+    events = OrderStatusEvent._meta.db_table
+    orders = Order._meta.db_table
+    span = _seconds("next.created_at - e.created_at")
+    # Следующий переход ищется по индексу (order, created_at, id),
+    # переходы за период — по индексу (to_status, created_at)
+    statuses_sql = f"""
+        SELECT e.to_status,
+               COUNT(*),
+               COUNT(next.created_at),
+               AVG({span}),
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY {span}),
+               percentile_cont(0.9) WITHIN GROUP (ORDER BY {span}),
+               MAX({span})
+        FROM {events} e
+        LEFT JOIN LATERAL (
+            SELECT n.created_at FROM {events} n
+            WHERE n.order_id = e.order_id
+              AND (n.created_at, n.id) > (e.created_at, e.id)
+            ORDER BY n.created_at, n.id
+            LIMIT 1
+        ) next ON true
+        WHERE e.to_status = ANY(%(statuses)s)
+          AND e.created_at >= %(since)s AND e.created_at < %(until)s
+        GROUP BY e.to_status
+    """
+    wait = _seconds("d.created_at - o.date_order")
+    delivery_sql = f"""
+        SELECT COUNT(*),
+               AVG({wait}),
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY {wait}),
+               percentile_cont(0.9) WITHIN GROUP (ORDER BY {wait}),
+               MAX({wait})
+        FROM {events} d
+        JOIN {orders} o ON o.id = d.order_id
+        WHERE d.to_status = 'delivered'
+          AND d.created_at >= %(since)s AND d.created_at < %(until)s
+    """
+    params = {"statuses": list(OPEN_STATUSES), "since": since, "until": until}
+    with connection.cursor() as cursor:
+        cursor.execute(statuses_sql, params)
+        rows = {row[0]: row[1:] for row in cursor.fetchall()}
+        cursor.execute(delivery_sql, params)
+        delivery = cursor.fetchone()
+
+    def stats(avg, p50, p90, longest):
+        return {"avg": avg, "p50": p50, "p90": p90, "max": longest}
+
+    statuses = []
+    for status in OPEN_STATUSES:
+        entered, left, *values = rows.get(status, (0, 0, None, None, None, None))
+        statuses.append(
+            {"status": status, "entered": entered, "left": left, **stats(*values)}
+        )
+    return {
+        "since": since,
+        "until": until,
+        "statuses": statuses,
+        "delivery": {"delivered": delivery[0], **stats(*delivery[1:])},
+    }
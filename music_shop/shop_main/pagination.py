@@ -0,0 +1,81 @@
+"""Keyset-пагинация по (created_at, id) для больших таблиц.
+
+В отличие от OFFSET стоимость любой страницы, включая последнюю, не зависит
+от её номера: запрос начинает чтение индекса (created_at, id) сразу с
+позиции курсора.
+"""
+
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(obj):
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(value):
+    """Возвращает (created_at, pk) или None для некорректного курсора"""
+    if not value:
+        return None
+    try:
+        padded = value + "=" * (-len(value) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return encode_cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return encode_cursor(self.object_list[0])
+        return None
+
+
+def paginate_keyset(queryset, per_page, after=None, before=None, last=False):
+    """Страница записей, упорядоченных от новых к старым.
+
+    after — курсор, после которого идут более старые записи (следующая
+    страница), before — курсор, перед которым идут более новые записи
+    (предыдущая страница), last — последняя страница (самые старые записи).
+    """
+    after = decode_cursor(after)
+    before = decode_cursor(before)
+
+    if after:
+        created_at, pk = after
+        rows = list(
+            queryset.filter(created_at__lte=created_at)
+            .filter(Q(created_at__lt=created_at) | Q(pk__lt=pk))
+            .order_by("-created_at", "-pk")[: per_page + 1]
+        )
+        return KeysetPage(rows[:per_page], len(rows) > per_page, True)
+
+    if before or last:
+        queryset = queryset.order_by("created_at", "pk")
+        if before:
+            created_at, pk = before
+            queryset = queryset.filter(created_at__gte=created_at).filter(
+                Q(created_at__gt=created_at) | Q(pk__gt=pk)
+            )
+        rows = list(queryset[: per_page + 1])
+        page_rows = rows[:per_page][::-1]
+        return KeysetPage(page_rows, not last, len(rows) > per_page)
+
+    rows = list(queryset.order_by("-created_at", "-pk")[: per_page + 1])
+    return KeysetPage(rows[:per_page], len(rows) > per_page, False)
@@ -0,0 +1,100 @@
+"""Общие оптимизированные запросы для путей чтения"""
+
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db.models import Prefetch, Sum
+
+from .models import LogEntry, Order, OrderItem, Product, Review, ShippingAddress
+
+
+def order_read_queryset(queryset=None):
+    """Заказы со всем, что нужно OrderSerializer, Order.get_total и шаблонам.
+
+    Пользователь, адрес и купон подтягиваются через JOIN, позиции заказа
+    вместе с товарами — одним дополнительным запросом на весь список.
+    Число запросов не зависит от количества заказов.
+    """
+    if queryset is None:
+        queryset = Order.objects.all()
+    return queryset.select_related(
+        "user", "shipping_address", "coupon"
+    ).prefetch_related(
+        Prefetch(
+            "orderitem_set",
+            queryset=OrderItem.objects.select_related("product").order_by("id"),
+        )
+    )
+
+
+def orders_visible_to(user, queryset=None):
+    """Заказы, доступные пользователю: персоналу — все, остальным — свои"""
+    queryset = order_read_queryset(queryset)
+    if user.is_staff:
+        return queryset
+    return queryset.filter(user=user)
+
+
+def user_orders(user):
+    """Заказы пользователя, новые первыми (my_orders)"""
+    return Order.objects.filter(user=user).order_by("-date_order")
+
+
+def reviews_for_product(product_id):
+    """Отзывы к товару, новые первыми (product_reviews)"""
+    return Review.objects.filter(product_id=product_id).order_by("-created_at")
+
+
+def has_reviewed(user, product_id):
+    """Оставлял ли пользователь отзыв на товар (create_review)"""
+    return Review.objects.filter(user=user, product_id=product_id).exists()
+
+
+def user_addresses(user):
+    """Адреса пользователя, новые первыми (my_addresses)"""
+    return ShippingAddress.objects.filter(user=user).order_by("-created_at")
+
+
+def filter_log_entries(params, queryset=None):
+    """Журнал с фильтрами из GET-параметров: action, user и search"""
+    if queryset is None:
+        queryset = LogEntry.objects.all()
+    action = params.get("action")
+    if action:
+        queryset = queryset.filter(action=action)
+    user = params.get("user")
+    if user:
+        queryset = queryset.filter(user_id=user)
+    # Полнотекстовый поиск по описанию (GIN-индекс по тому же выражению)
+    search = params.get("search")
+    if search:
+        queryset = queryset.annotate(
+            search_vector=SearchVector("description", config="russian")
+        ).filter(
+            search_vector=SearchQuery(search, config="russian", search_type="websearch")
+        )
+    return queryset
+
+
+def bestsellers(limit=5):
+    """Самые продаваемые товары: product__id, product__product_name, total_sold.
+
+    Продажи суммируются по одной таблице позиций, без соединения каждой
+    позиции с товаром; названия пяти товаров — вторым запросом.
+    """
+    top = list(
+        OrderItem.objects.values("product_id")
+        .annotate(total_sold=Sum("quantity"))
+        .order_by("-total_sold", "product_id")[:limit]
+    )
+    names = dict(
+        Product.objects.filter(pk__in=[row["product_id"] for row in top]).values_list(
+            "pk", "product_name"
+        )
+    )
+    return [
+        {
+            "product__id": row["product_id"],
+            "product__product_name": names.get(row["product_id"]),
+            "total_sold": row["total_sold"],
+        }
+        for row in top
+    ]
@@ -0,0 +1,227 @@
+"""Регрессионные проверки планов критичных запросов.
+
+CRITICAL_QUERIES — реестр запросов, собранных теми же функциями, что и в
+api.py и views.py. На наборе данных seed_plan_dataset для каждого снимается
+EXPLAIN (FORMAT JSON) и проверяется, что таблицы из index_on читаются по
+индексу (без Seq Scan), а оценка стоимости не выше max_cost. Способы чтения
+таблиц index_on и tables (узлы сканирования и индексы, без чисел)
+сравниваются с сохраненными в query_plans.json: при изменении выводится
+diff. Запуск — команда check_query_plans, в отдельной тестовой базе.
+"""
+
+import difflib
+import json
+from pathlib import Path
+
+from django.db import connection
+
+from .api import ProductViewSet
+from .bench_utils import seed_dataset
+from .facets import filter_by_selection, read_selection, read_sort, search_catalog
+from .models import LogEntry
+from .queries import filter_log_entries, reviews_for_product, user_orders
+
+BASELINE_PATH = Path(__file__).with_name("query_plans.json")
+
+CRITICAL_QUERIES = {}
+
+# Первая страница журнала, как в LogEntryListView (paginate_keyset)
+LOG_PAGE_SIZE = 50
+
+
+def critical_query(name, index_on, max_cost, tables=()):
+    """Регистрирует построитель запроса: build(data) -> QuerySet"""
+
+    def register(build):
+        CRITICAL_QUERIES[name] = {
+            "build": build,
+            "index_on": index_on,
+            "max_cost": max_cost,
+            "tables": (*index_on, *tables),
+        }
+        return build
+
+    return register
+
+
+def seed_plan_dataset():
+    """Представительный набор данных: таблицы достаточно большие, чтобы
+    планировщик выбирал индексы так же, как на рабочей базе"""
+    data = seed_dataset(
+        products=3000, orders=3000, items_per_order=2, reviews=6000, users=300
+    )
+    actions = [action for action, _ in LogEntry.ACTION_CHOICES]
+    users = data["users"]
+    LogEntry.objects.bulk_create(
+        [
+            LogEntry(
+                user=users[i % len(users)],
+                action=actions[i % len(actions)],
+                # Редкое слово — для проверки полнотекстового поиска
+                description=(
+                    "Возврат оплаты по заказу"
+                    if i % 1000 == 0
+                    else f"Просмотр товара Bench Album {i}"
+                ),
+                ip_address="127.0.0.1",
+            )
+            for i in range(30000)
+        ],
+        batch_size=5000,
+    )
+    with connection.cursor() as cursor:
+        for table in (
+            "shop_main_product",
+            "shop_main_order",
+            "shop_main_orderitem",
+            "shop_main_review",
+            "shop_main_logentry",
+            "auth_user",
+        ):
+            cursor.execute(f"ANALYZE {table}")
+    return data
+
+
+def _log_page(params):
+    return filter_log_entries(
+        params, LogEntry.objects.select_related("user", "order", "product")
+    ).order_by("-created_at", "-pk")[: LOG_PAGE_SIZE + 1]
+
+
+# ILIKE '%…%' без pg_trgm не может использовать индекс: для поиска по
+# каталогу контролируется только стоимость
+@critical_query(
+    "catalog_search", index_on=(), max_cost=250, tables=("shop_main_product",)
+)
+def catalog_search(data):
+    params = {"search": "Album 12", "page_size": "24"}
+    queryset, _ = search_catalog(ProductViewSet.queryset.all(), params)
+    queryset = filter_by_selection(queryset, read_selection(params))
+    return queryset.order_by(read_sort(params), "pk")[:24]
+
+
+@critical_query("my_orders", index_on=("shop_main_order",), max_cost=100)
+def my_orders(data):
+    return user_orders(data["users"][0])
+
+
+@critical_query("product_reviews", index_on=("shop_main_review",), max_cost=50)
+def product_reviews(data):
+    return reviews_for_product(data["products"][0].pk)
+
+
+@critical_query("log_by_action", index_on=("shop_main_logentry",), max_cost=500)
+def log_by_action(data):
+    return _log_page({"action": "cart_added"})
+
+
+@critical_query("log_by_user", index_on=("shop_main_logentry",), max_cost=1500)
+def log_by_user(data):
+    return _log_page({"user": str(data["users"][0].pk)})
+
+
+@critical_query("log_search", index_on=("shop_main_logentry",), max_cost=5000)
+def log_search(data):
+    return _log_page({"search": "возврат"})
+
+
+def explain(queryset):
+    """Корневой узел EXPLAIN (FORMAT JSON)"""
+    return json.loads(queryset.explain(format="json"))[0]["Plan"]
+
+
+def _nodes(plan):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _nodes(child)
+
+
+def plan_outline(plan, tables, index_tables):
+    """Как читаются tables: строка на узел сканирования, без оценок.
+
+    Порядок соединений с остальными таблицами сюда не входит — он меняется
+    от небольших сдвигов статистики и не говорит о регрессии.
+    """
+    lines = []
+    for node in _nodes(plan):
+        table = node.get("Relation Name") or index_tables.get(node.get("Index Name"))
+        if table not in tables:
+            continue
+        line = node["Node Type"]
+        if "Index Name" in node:
+            line += f" using {node['Index Name']}"
+        lines.append(f"{line} on {table}")
+    return lines
+
+
+def index_table_map():
+    """{имя индекса: таблица} для текущей схемы"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, tablename FROM pg_indexes "
+            "WHERE schemaname = current_schema()"
+        )
+        return dict(cursor.fetchall())
+
+
+def check_plan(spec, plan, index_tables):
+    """Список нарушений: Seq Scan и нет индекса по index_on, стоимость"""
+    problems = []
+    nodes = list(_nodes(plan))
+    indexed = {index_tables.get(node.get("Index Name")) for node in nodes}
+    for table in spec["index_on"]:
+        if any(
+            node["Node Type"] == "Seq Scan" and node.get("Relation Name") == table
+            for node in nodes
+        ):
+            problems.append(f"Seq Scan по {table}")
+        if table not in indexed:
+            problems.append(f"не используется индекс {table}")
+    if plan["Total Cost"] > spec["max_cost"]:
+        problems.append(f"стоимость {plan['Total Cost']:.0f} больше {spec['max_cost']}")
+    return problems
+
+
+def run_checks(data):
+    """{имя: {"outline", "cost", "problems"}} для всех запросов реестра"""
+    index_tables = index_table_map()
+    results = {}
+    for name, spec in CRITICAL_QUERIES.items():
+        plan = explain(spec["build"](data))
+        results[name] = {
+            "outline": plan_outline(plan, spec["tables"], index_tables),
+            "cost": plan["Total Cost"],
+            "problems": check_plan(spec, plan, index_tables),
+        }
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    baseline = {
+        name: {"outline": result["outline"], "cost": round(result["cost"], 2)}
+        for name, result in results.items()
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(baseline, file, ensure_ascii=False, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def plan_diff(name, old_outline, new_outline):
+    """unified diff схемы плана; пустой список, если план не изменился"""
+    return list(
+        difflib.unified_diff(
+            old_outline,
+            new_outline,
+            fromfile=f"{name} (сохраненный)",
+            tofile=f"{name} (текущий)",
+            lineterm="",
+        )
+    )
@@ -0,0 +1,237 @@
+"""«С этим товаром покупают»: индекс совместных покупок по истории заказов.
+
+Пары товаров считаются одним SQL-запросом целиком на стороне PostgreSQL
+(self-join корзин с GROUP BY и оконной функцией для top-K), и в
+ProductRecommendation для каждого товара пишется одна строка с массивами
+соседей. Чтение рекомендаций — поиск одной строки по первичному ключу.
+
+Для каждой пары (A, B):
+    support — число заказов, где есть оба товара;
+    lift = support * N / (support(A) * support(B)), где N — число заказов.
+
+Учитываются только заказы старше RECOMMENDATIONS_LAG секунд: позиции
+заказа могут дописываться после создания самого заказа, а заказ с меньшим
+id — зафиксироваться позже заказа с большим. Без задержки обновление
+сдвинуло бы отметку last_order_id за такой заказ, и его позиции не попали
+бы в индекс до полной пересборки.
+
+Инкрементальное обновление читает только заказы новее уже учтенных:
+прибавляет их к support товаров (ProductBasketSupport) и к N
+(RecommendationState), а пары пересчитывает лишь для товаров из новых
+заказов и только по заказам, где эти товары есть (индекс по product_id).
+Отмена старых заказов и изменение lift у остальных товаров учитываются при
+следующей полной пересборке.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import (
+    Order,
+    OrderItem,
+    ProductBasketSupport,
+    ProductRecommendation,
+    RecommendationState,
+)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _last_order_id():
+    """Отметка для сборки: id последнего заказа старше RECOMMENDATIONS_LAG"""
+    lag = _setting("RECOMMENDATIONS_LAG", 5 * 60)
+    cutoff = timezone.now() - timedelta(seconds=lag)
+    orders = Order.objects.filter(date_order__lte=cutoff)
+    return orders.aggregate(last=Max("id"))["last"] or 0
+
+
+def _baskets_sql(extra=""):
+    """CTE baskets: (order_id, product_id) заказов из (since, last_order_id]"""
+    item_table = OrderItem._meta.db_table
+    order_table = Order._meta.db_table
+    # Заказы-«опты» с огромным числом позиций дают квадратичное число пар
+    # и мало говорят о связи товаров, поэтому они пропускаются
+    return f"""
+        lines AS (
+            SELECT DISTINCT i.order_id, i.product_id
+            FROM {item_table} i
+            JOIN {order_table} o ON o.id = i.order_id
+            WHERE o.status <> 'cancelled'
+              AND i.order_id > %(since)s AND i.order_id <= %(last_order_id)s
+              {extra}
+        ),
+        baskets AS (
+            SELECT order_id, product_id
+            FROM (
+                SELECT order_id, product_id,
+                       count(*) OVER (PARTITION BY order_id) AS size
+                FROM lines
+            ) sized
+            WHERE size <= %(max_basket)s
+        )
+    """
+
+
+def _add_support(since, last_order_id):
+    """Учитывает заказы из (since, last_order_id] в support товаров.
+
+    Возвращает (число учтенных заказов, id товаров из них).
+    """
+    table = ProductBasketSupport._meta.db_table
+    sql = f"""
+        WITH {_baskets_sql()},
+        added AS (
+            INSERT INTO {table} (product_id, support)
+            SELECT product_id, count(*) FROM baskets GROUP BY product_id
+            ON CONFLICT (product_id) DO UPDATE
+                SET support = {table}.support + EXCLUDED.support
+            RETURNING product_id
+        )
+        SELECT (SELECT count(DISTINCT order_id) FROM baskets),
+               ARRAY(SELECT product_id FROM added)
+    """
+    params = {
+        "since": since,
+        "last_order_id": last_order_id,
+        "max_basket": _setting("RECOMMENDATIONS_MAX_BASKET", 50),
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        orders, product_ids = cursor.fetchone()
+    return orders, product_ids
+
+
+def _build(last_order_id, orders, product_ids=None):
+    """Записывает рекомендации для product_ids (None — для всех товаров).
+
+    support товаров берется из ProductBasketSupport, N — orders.
+    """
+    table = ProductRecommendation._meta.db_table
+    support_table = ProductBasketSupport._meta.db_table
+    item_table = OrderItem._meta.db_table
+    if product_ids:
+        # Только заказы, где есть пересчитываемые товары
+        baskets = _baskets_sql(
+            f"""AND i.order_id IN (
+                SELECT order_id FROM {item_table}
+                WHERE product_id = ANY(%(product_ids)s)
+            )"""
+        )
+        product_filter = "AND a.product_id = ANY(%(product_ids)s)"
+    else:
+        baskets, product_filter = _baskets_sql(), ""
+    sql = f"""
+        WITH {baskets},
+        pairs AS (
+            SELECT a.product_id, b.product_id AS neighbor_id, count(*) AS support
+            FROM baskets a
+            JOIN baskets b
+              ON b.order_id = a.order_id AND b.product_id <> a.product_id
+            WHERE TRUE {product_filter}
+            GROUP BY a.product_id, b.product_id
+            HAVING count(*) >= %(min_support)s
+        ),
+        scored AS (
+            SELECT p.product_id, p.neighbor_id, p.support,
+                   p.support::float8 * %(orders)s
+                       / (sa.support * sb.support) AS lift
+            FROM pairs p
+            JOIN {support_table} sa ON sa.product_id = p.product_id
+            JOIN {support_table} sb ON sb.product_id = p.neighbor_id
+        ),
+        ranked AS (
+            SELECT *, row_number() OVER (
+                PARTITION BY product_id
+                ORDER BY support DESC, lift DESC, neighbor_id
+            ) AS rank
+            FROM scored
+        )
+        INSERT INTO {table}
+            (product_id, neighbor_ids, supports, lifts, last_order_id, updated_at)
+        SELECT product_id,
+               array_agg(neighbor_id ORDER BY rank),
+               array_agg(support ORDER BY rank),
+               array_agg(lift ORDER BY rank),
+               %(last_order_id)s,
+               %(now)s
+        FROM ranked
+        WHERE rank <= %(top_k)s
+        GROUP BY product_id
+        ON CONFLICT (product_id) DO UPDATE SET
+            neighbor_ids = EXCLUDED.neighbor_ids,
+            supports = EXCLUDED.supports,
+            lifts = EXCLUDED.lifts,
+            last_order_id = EXCLUDED.last_order_id,
+            updated_at = EXCLUDED.updated_at
+    """
+    params = {
+        "since": 0,
+        "last_order_id": last_order_id,
+        "orders": orders,
+        "max_basket": _setting("RECOMMENDATIONS_MAX_BASKET", 50),
+        "min_support": _setting("RECOMMENDATIONS_MIN_SUPPORT", 1),
+        "top_k": _setting("RECOMMENDATIONS_TOP_K", 10),
+        "now": timezone.now(),
+        "product_ids": list(product_ids or ()),
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def rebuild_recommendations():
+    """Полностью пересобирает индекс, возвращает число товаров с соседями"""
+    last_order_id = _last_order_id()
+    with transaction.atomic():
+        ProductRecommendation.objects.all().delete()
+        ProductBasketSupport.objects.all().delete()
+        orders, _ = _add_support(0, last_order_id)
+        RecommendationState.objects.update_or_create(
+            pk=1,
+            defaults={
+                "last_order_id": last_order_id,
+                "orders": orders,
+                "updated_at": timezone.now(),
+            },
+        )
+        return _build(last_order_id, orders)
+
+
+def refresh_recommendations():
+    """Обновляет индекс по заказам, появившимся после последней сборки"""
+    with transaction.atomic():
+        # Блокировка строки: два обновления не учтут одни заказы дважды
+        state = RecommendationState.objects.select_for_update().filter(pk=1).first()
+        if state is None:
+            return rebuild_recommendations()
+
+        last_order_id = _last_order_id()
+        if last_order_id <= state.last_order_id:
+            return 0
+        orders, product_ids = _add_support(state.last_order_id, last_order_id)
+        state.last_order_id = last_order_id
+        state.orders += orders
+        state.updated_at = timezone.now()
+        state.save()
+        if not product_ids:
+            return 0
+        # Пары симметричны: у нового заказа обе стороны каждой пары в product_ids
+        return _build(last_order_id, state.orders, product_ids)
+
+
+def get_recommendations(product_id, limit=None):
+    """[(neighbor_id, support, lift)] для товара одним запросом по ключу"""
+    row = (
+        ProductRecommendation.objects.filter(pk=product_id)
+        .values_list("neighbor_ids", "supports", "lifts")
+        .first()
+    )
+    if row is None:
+        return []
+    return list(zip(*row))[:limit]
@@ -0,0 +1,52 @@
+"""Рендереры для API"""
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+
+_fallback_encoder = encoders.JSONEncoder()
+
+
+def _default(obj):
+    # Всё, что orjson не умеет сам (Decimal, ленивые строки, QuerySet...),
+    # кодируем так же, как стандартный JSONEncoder из DRF
+    return _fallback_encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer, использующий orjson, если он установлен.
+
+    Вывод совпадает с JSONRenderer: компактные разделители, Decimal как число,
+    datetime в ISO 8601 с суффиксом Z для UTC, экранирование U+2028/U+2029.
+    Для форматированного вывода (indent) и данных, которые orjson не может
+    закодировать, используется стандартная реализация.
+    """
+
+    if orjson is not None:
+        orjson_options = (
+            orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_default, option=self.orjson_options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+        return ret
@@ -0,0 +1,170 @@
+"""Чтение с реплик БД для каталога и отчетов.
+
+Реплики перечислены в settings.DATABASE_REPLICAS. Запись и все чтения по
+умолчанию идут в default; на реплику читают только участки, явно
+включившие это: replica_reads(), декоратор replica_view, ReplicaReadMixin
+(действия вьюсетов из replica_actions) и ReplicaViewMixin (отчеты).
+
+Чтение своих записей: после записи в запросе все дальнейшее чтение этого
+запроса идет в default, а ReplicaMiddleware после успешного небезопасного
+запроса (POST, PUT, PATCH, DELETE) ставит cookie, с которой следующие
+REPLICA_PIN_SECONDS секунд клиент читает только из default — реплика за это
+время успевает догнать основную базу. Внутри transaction.atomic() чтение
+тоже идет в default.
+
+В тестах реплика — зеркало default (TEST MIRROR): отдельное соединение с той
+же тестовой базой.
+"""
+
+import functools
+import inspect
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Реплика, выбранная для текущего участка кода, или None — читать из default
+_replica = ContextVar("replica", default=None)
+# Клиент недавно писал: реплики для него отключены до конца запроса
+_pinned = ContextVar("replica_pinned", default=False)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def replica_aliases():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def pin_cookie():
+    return getattr(settings, "REPLICA_PIN_COOKIE", "db_pin")
+
+
+def pin_seconds():
+    return getattr(settings, "REPLICA_PIN_SECONDS", 5)
+
+
+def read_alias():
+    """База для чтения в текущем контексте"""
+    alias = _replica.get()
+    if alias is None or _pinned.get():
+        return DEFAULT_DB_ALIAS
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+def pin_to_primary():
+    """До конца запроса читать только из default"""
+    _pinned.set(True)
+
+
+@contextmanager
+def replica_reads():
+    """Чтение внутри блока — с одной из реплик (одной на весь блок)"""
+    aliases = replica_aliases()
+    token = _replica.set(random.choice(aliases) if aliases else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+@contextmanager
+def request_scope(pinned):
+    """Состояние маршрутизации на время одного запроса (ReplicaMiddleware)"""
+    replica_token = _replica.set(None)
+    pinned_token = _pinned.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned.reset(pinned_token)
+        _replica.reset(replica_token)
+
+
+def replica_view(view):
+    """Декоратор функции-представления: GET и HEAD читают с реплики"""
+    if inspect.iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                return await view(request, *args, **kwargs)
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+
+    else:
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                return view(request, *args, **kwargs)
+            with replica_reads():
+                return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaViewMixin:
+    """Представление Django, которое читает с реплики на GET.
+
+    Шаблон рендерится внутри блока: запросы, которые шаблон выполняет
+    при выводе, тоже идут на реплику.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads():
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+        return response
+
+
+class ReplicaReadMixin:
+    """Вьюсет DRF: действия из replica_actions читают с реплики.
+
+    Действие известно только после initialize_request, поэтому реплика
+    включается в initial() и выключается в finalize_response().
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and self.action in self.replica_actions:
+            self._replica_scope = replica_reads()
+            self._replica_scope.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        scope = getattr(self, "_replica_scope", None)
+        if scope is not None:
+            self._replica_scope = None
+            scope.__exit__(None, None, None)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaRouter:
+    """Чтение — в read_alias(), запись и миграции — только в default"""
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        # Дальнейшее чтение в этом запросе должно видеть запись
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что в default
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
@@ -10,6 +10,9 @@ from .models import (
     ShippingAddress,
     Coupon,
     Favorite,
+    ADDRESS_FIELDS,
+    address_fingerprint,
+    normalize_coupon_code,
 )
 from decimal import Decimal
 
@@ -66,6 +69,23 @@ class ShippingAddressSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["created_at"]
 
+    def validate(self, attrs):
+        # Создание переиспользует такой же адрес (upsert_address), а изменение
+        # не должно совпасть с другим адресом пользователя: иначе
+        # IntegrityError по (user, fingerprint)
+        if self.instance is None:
+            return attrs
+        values = {
+            field: attrs.get(field, getattr(self.instance, field))
+            for field in ("user", *ADDRESS_FIELDS)
+        }
+        duplicates = ShippingAddress.objects.filter(
+            user=values["user"], fingerprint=address_fingerprint(values)
+        ).exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError("У пользователя уже есть такой адрес")
+        return attrs
+
 
 class CouponSerializer(serializers.ModelSerializer):
     class Meta:
@@ -79,6 +99,15 @@ class CouponSerializer(serializers.ModelSerializer):
             "valid_to",
         ]
 
+    def validate_code(self, value):
+        # Уникальность без учета регистра: иначе IntegrityError по code_normalized
+        duplicates = Coupon.objects.filter(code_normalized=normalize_coupon_code(value))
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError("Купон с таким кодом уже существует")
+        return value
+
 
 class OrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source="product.product_name", read_only=True)
@@ -126,6 +155,13 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["date_order"]
 
+    def validate_status(self, value):
+        if self.instance is not None and not self.instance.can_change_status(value):
+            raise serializers.ValidationError(
+                f"Переход из статуса '{self.instance.status}' в '{value}' запрещен"
+            )
+        return value
+
     def get_total(self, obj):
         """Вычисляет общую сумму заказа"""
         total = Decimal("0")
@@ -186,6 +222,12 @@ class AddToCartSerializer(serializers.Serializer):
     quantity = serializers.IntegerField(min_value=1)
 
 
+class ReleaseItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    # Без quantity бронь снимается целиком
+    quantity = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+
+
 class ShippingAddressInputSerializer(serializers.Serializer):
     full_name = serializers.CharField()
     phone = serializers.CharField()
@@ -203,6 +245,25 @@ class ApplyCouponSerializer(serializers.Serializer):
     coupon_code = serializers.CharField()
 
 
+class BulkOrderTransitionSerializer(serializers.Serializer):
+    """Массовая смена статуса: заказы по id и/или по фильтру"""
+
+    to_status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    date_from = serializers.DateTimeField(required=False)
+    date_to = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if not attrs.keys() - {"to_status"}:
+            raise serializers.ValidationError(
+                "Укажите ids или фильтр (status, date_from, date_to)"
+            )
+        return attrs
+
+
 class ProductFilterSerializer(serializers.Serializer):
     genre = serializers.IntegerField(required=False)
     artist = serializers.IntegerField(required=False)
@@ -3,7 +3,11 @@ from django.db import IntegrityError
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 import logging
-from .models import Order, Review, OrderItem
+from .models import Artist, Coupon, Favorite, Genre, Order, Review, OrderItem, Product
+from .coupons import coupon_cache
+from .favorites import invalidate_favorite_ids
+from .catalog_index import catalog_index
+from . import holds, home, order_status, stock
 from .logger_utils import create_log_entry
 
 
@@ -19,16 +23,14 @@ def create_manager_group(sender, **kwargs):
 
 
 @receiver(post_save, sender=Order)
-def log_order_updated(sender, instance, created, **kwargs):
-    """Логирует обновление заказа"""
-    if not created:
-        if hasattr(instance, '_old_status') and instance._old_status != instance.status:
-            create_log_entry(
-                action='order_updated',
-                user=instance.user,
-                description=f"Статус заказа #{instance.id} изменен с '{instance._old_status}' на '{instance.status}'",
-                order=instance,
-            )
+def record_order_status(sender, instance, created, **kwargs):
+    """Записывает смену статуса заказа — один раз на переход"""
+    old_status = '' if created else getattr(instance, '_old_status', instance.status)
+    if old_status != instance.status:
+        order_status.record_transition(
+            instance, old_status, request=getattr(instance, '_status_request', None)
+        )
+    instance._old_status = instance.status
 
 
 @receiver(post_save, sender=Review)
@@ -54,4 +56,56 @@ def log_review_created(sender, instance, created, **kwargs):
             ip_address=ip_address,
             user_agent=user_agent,
             product=instance.product,
-        )
\ No newline at end of file
+        )
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def invalidate_coupon_cache(sender, instance, **kwargs):
+    """Сбрасывает кэш активных купонов при изменении купона"""
+    coupon_cache.invalidate()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def notify_catalog_index(sender, instance, **kwargs):
+    """Сообщает индексу каталога об изменении или удалении товара"""
+    catalog_index.product_changed(
+        instance.pk, deleted=kwargs.get("signal") is post_delete
+    )
+
+
+@receiver(post_save, sender=Product)
+def sync_stock_cache(sender, instance, **kwargs):
+    """Сквозная запись остатка в кэш при сохранении товара (админка, формы)"""
+    stock.changed(instance.pk, instance.stock_quantity)
+
+
+@receiver(post_delete, sender=Product)
+def drop_stock_cache(sender, instance, **kwargs):
+    stock.forget(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_limited_ids(sender, instance, **kwargs):
+    """Сбрасывает кэш товаров лимитированного тиража"""
+    holds.invalidate_limited_ids()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Artist)
+@receiver(post_delete, sender=Artist)
+def invalidate_home_page(sender, instance, **kwargs):
+    """Сбрасывает кэш данных главной страницы при изменении каталога"""
+    home.invalidate()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def invalidate_favorites_cache(sender, instance, **kwargs):
+    """Сбрасывает кэш избранного: админка, API и каскадное удаление товара"""
+    invalidate_favorite_ids(instance.user_id)
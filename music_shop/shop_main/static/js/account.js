@@ -1,8 +1,19 @@
 // Функции для личного кабинета
 document.addEventListener('DOMContentLoaded', function () {
 	loadOrders();
+	subscribeLiveEvents([], { order_status: updateOrderStatus });
 });
 
+// Смена статуса заказа без перезагрузки страницы
+function updateOrderStatus(event) {
+	const status = document.querySelector(
+		`.order-card[data-order-id="${event.order_id}"] .order-status`
+	);
+	if (status) {
+		status.textContent = `Статус: ${event.status}`;
+	}
+}
+
 // Загрузка заказов пользователя
 async function loadOrders() {
 	try {
@@ -43,7 +54,7 @@ function displayOrders(orders) {
 		});
 
 		html += `
-            <div class="order-card">
+            <div class="order-card" data-order-id="${order.id}">
                 <h3>Заказ #${order.id}</h3>
                 <p class="order-date">Дата: ${formattedDate}</p>
                 <p class="order-status">Статус: ${order.status}</p>
@@ -1,9 +1,11 @@
 // Общие функции для работы с API
 const API_BASE_URL = '/api/v1';
+const LIVE_EVENTS_URL = '/api/async/events/';
 
 // Глобальная корзина
 let cart = {};
 let favoritesCache = new Set();
+let favoritesLoaded = false;
 
 // Получение CSRF токена
 function getCsrfToken() {
@@ -41,7 +43,44 @@ function saveCartToCookies() {
 }
 
 // Добавление в корзину
-function addToCart(productId) {
+// Сервер проверяет остаток и бронирует экземпляры лимитированного тиража
+async function reserveCartItem(productId, quantity = 1) {
+	try {
+		const res = await fetch(`${API_BASE_URL}/cart/add_item/`, {
+			method: 'POST',
+			headers: {
+				'Content-Type': 'application/json',
+				'X-CSRFToken': getCsrfToken(),
+			},
+			credentials: 'same-origin',
+			body: JSON.stringify({ product_id: productId, quantity }),
+		});
+		if (res.ok) return true;
+		const error = await res.json().catch(() => ({}));
+		showNotification(error.error || 'Не удалось добавить товар', 'error');
+		return false;
+	} catch (e) {
+		console.error('Ошибка добавления в корзину:', e);
+		// Без связи с сервером остаток проверит оформление заказа
+		return true;
+	}
+}
+
+// Снятие брони при уменьшении количества (quantity = null — вся бронь)
+function releaseCartItem(productId, quantity = null) {
+	fetch(`${API_BASE_URL}/cart/release_item/`, {
+		method: 'POST',
+		headers: {
+			'Content-Type': 'application/json',
+			'X-CSRFToken': getCsrfToken(),
+		},
+		credentials: 'same-origin',
+		body: JSON.stringify({ product_id: productId, quantity }),
+	}).catch(e => console.error('Ошибка снятия брони:', e));
+}
+
+async function addToCart(productId) {
+	if (!(await reserveCartItem(productId))) return;
 	const productIdStr = String(productId);
 	cart[productIdStr] = (cart[productIdStr] || 0) + 1;
 	saveCartToCookies();
@@ -56,6 +95,7 @@ async function fetchFavoritesProducts() {
 		if (!res.ok) throw new Error(res.statusText);
 		const products = await res.json();
 		favoritesCache = new Set(products.map(p => p.id));
+		favoritesLoaded = true;
 		return products;
 	} catch (e) {
 		console.error('Не удалось получить избранное:', e);
@@ -63,9 +103,25 @@ async function fetchFavoritesProducts() {
 	}
 }
 
+// Только id избранных товаров — достаточно для отображения сердечек
+async function fetchFavoriteIds() {
+	try {
+		const res = await fetch(`${API_BASE_URL}/favorites/ids/`, { credentials: 'same-origin' });
+		if (res.status === 401 || res.status === 403) return [];
+		if (!res.ok) throw new Error(res.statusText);
+		const ids = await res.json();
+		favoritesCache = new Set(ids);
+		favoritesLoaded = true;
+		return ids;
+	} catch (e) {
+		console.error('Не удалось получить избранное:', e);
+		return [];
+	}
+}
+
 async function ensureFavoritesLoaded() {
-	if (favoritesCache.size === 0) {
-		await fetchFavoritesProducts();
+	if (!favoritesLoaded) {
+		await fetchFavoriteIds();
 	}
 }
 
@@ -101,6 +157,18 @@ async function toggleFavorite(productId) {
 	}
 }
 
+// Подписка на живые обновления: статусы заказов и остатки товаров
+function subscribeLiveEvents(productIds = [], handlers = {}) {
+	if (typeof EventSource === 'undefined') return null;
+	const params = new URLSearchParams();
+	if (productIds.length) params.set('products', productIds.join(','));
+	const source = new EventSource(`${LIVE_EVENTS_URL}?${params.toString()}`);
+	Object.entries(handlers).forEach(([type, handler]) => {
+		source.addEventListener(type, event => handler(JSON.parse(event.data)));
+	});
+	return source;
+}
+
 // Показ уведомления
 function showNotification(message, type = 'success') {
 	const notification = document.createElement('div');
@@ -225,6 +293,24 @@ async function loadProducts(filters = {}) {
 	}
 }
 
+// Загрузка страницы каталога вместе со счетчиками фасетов
+async function loadCatalogPage(filters = {}, page = 1) {
+	const params = new URLSearchParams({ facets: '1', page: String(page) });
+	Object.keys(filters).forEach(key => {
+		if (filters[key]) {
+			params.append(key, filters[key]);
+		}
+	});
+
+	const response = await fetch(
+		`${API_BASE_URL}/products/catalog/?${params.toString()}`
+	);
+	if (!response.ok) {
+		throw new Error(`HTTP error! status: ${response.status}`);
+	}
+	return await response.json();
+}
+
 // Показ спиннера загрузки
 function showSpinner(containerId) {
 	const container = document.getElementById(containerId);
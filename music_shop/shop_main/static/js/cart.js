@@ -211,11 +211,17 @@ function displayCartItems(products) {
 }
 
 // Обновление количества товара в корзине
-function updateCartQuantity(productId, change) {
+async function updateCartQuantity(productId, change) {
 	const productIdStr = String(productId);
 	const currentQty = cart[productIdStr] || 0;
 	const newQty = currentQty + change;
 
+	if (change > 0) {
+		if (!(await reserveCartItem(productId, change))) return;
+	} else {
+		releaseCartItem(productId, Math.min(-change, currentQty));
+	}
+
 	if (newQty <= 0) {
 		delete cart[productIdStr];
 	} else {
@@ -230,6 +236,7 @@ function updateCartQuantity(productId, change) {
 function removeFromCart(productId) {
 	const productIdStr = String(productId);
 	delete cart[productIdStr];
+	releaseCartItem(productId);
 	saveCartToCookies();
 	loadCartItems();
 }
@@ -255,6 +262,14 @@ async function checkout() {
 		coupon_code: document.getElementById('coupon_code').value,
 	};
 
+	// Один ключ на попытку оформления: повтор после обрыва связи или
+	// повторное нажатие вернут уже созданный заказ, а не новый
+	let idempotencyKey = sessionStorage.getItem('checkoutKey');
+	if (!idempotencyKey) {
+		idempotencyKey = crypto.randomUUID();
+		sessionStorage.setItem('checkoutKey', idempotencyKey);
+	}
+
 	try {
 		// Получаем CSRF токен
 		const csrfToken = getCsrfToken();
@@ -268,11 +283,18 @@ async function checkout() {
 			headers: {
 				'Content-Type': 'application/json',
 				'X-CSRFToken': csrfToken,
+				'Idempotency-Key': idempotencyKey,
 			},
 			credentials: 'include', // Важно для передачи cookies с sessionid
 			body: JSON.stringify(formData),
 		});
 
+		// Сервер ответил: следующая попытка — уже новый запрос.
+		// 409 — заказ с этим ключом еще оформляется, ключ сохраняем
+		if (response.status !== 409) {
+			sessionStorage.removeItem('checkoutKey');
+		}
+
 		if (response.ok) {
 			cart = {};
 			saveCartToCookies();
@@ -1,19 +1,19 @@
 document.addEventListener('DOMContentLoaded', async function () {
-	loadGenres();
-	loadArtists();
 	loadCartFromCookies();
-	// Гарантируем, что избранное подгружено до рендера, чтобы сердечки были корректны
-	if (typeof ensureFavoritesLoaded === 'function') {
-		try { await ensureFavoritesLoaded(); } catch (e) {}
-	}
+	// Варианты фильтров нужны до каталога, чтобы подписать к ним счетчики
+	await Promise.all([loadGenres(), loadArtists()]);
+	// Флаг is_favorite приходит вместе с каталогом, отдельный запрос избранного не нужен
 	loadProductsCatalog();
 });
 
-function displayProducts(products) {
+let currentFilters = {};
+let currentPage = 1;
+
+function displayProducts(products, append = false) {
 	const container = document.getElementById('products-container');
 	if (!container) return;
 
-	if (products.length === 0) {
+	if (products.length === 0 && !append) {
 		container.innerHTML = `
             <div class="no-products">
                 <h3>Товары не найдены</h3>
@@ -23,7 +23,9 @@ function displayProducts(products) {
 		return;
 	}
 
-	container.innerHTML = '<div class="products-grid"></div>';
+	if (!append || !container.querySelector('.products-grid')) {
+		container.innerHTML = '<div class="products-grid"></div>';
+	}
 	const grid = container.querySelector('.products-grid');
 
 	products.forEach(product => {
@@ -69,6 +71,9 @@ function displayProducts(products) {
 		const favBtn = productCard.querySelector('.fav-btn');
 		const heart = favBtn.querySelector('.heart');
 		try {
+			if (product.is_favorite && typeof favoritesCache !== 'undefined') {
+				favoritesCache.add(product.id);
+			}
 			if (typeof isFavorite === 'function' && isFavorite(product.id)) {
 				heart.textContent = '❤';
 				heart.style.color = '#dc2626';
@@ -105,11 +110,11 @@ async function applyFilters() {
 	if (maxPrice) filters.max_price = maxPrice;
 	if (sort) filters.sort = sort;
 
+	currentFilters = filters;
 	showSpinner('products-container');
 
 	try {
-		const products = await loadProducts(filters);
-		displayProducts(products);
+		await showCatalogPage(1);
 	} catch (error) {
 		console.error('Ошибка применения фильтров:', error);
 		showError('products-container', 'Ошибка применения фильтров');
@@ -122,13 +127,65 @@ function clearFilters() {
 }
 
 async function loadProductsCatalog() {
+	currentFilters = {};
 	showSpinner('products-container');
 
 	try {
-		const products = await loadProducts();
-		displayProducts(products);
+		await showCatalogPage(1);
 	} catch (error) {
 		console.error('Ошибка загрузки товаров:', error);
 		showError('products-container', 'Ошибка загрузки товаров');
 	}
 }
+
+// Загружает страницу каталога; страницы после первой дописываются в конец
+async function showCatalogPage(page) {
+	const data = await loadCatalogPage(currentFilters, page);
+	currentPage = page;
+	displayProducts(data.results, page > 1);
+	updateFacetCounts('genre', data.facets.genre);
+	updateFacetCounts('artist', data.facets.artist);
+	renderLoadMore(Boolean(data.next));
+}
+
+// Добавляет к вариантам фильтра число подходящих товаров: «Джаз (12)»
+function updateFacetCounts(selectId, facet) {
+	const select = document.getElementById(selectId);
+	if (!select) return;
+
+	const counts = {};
+	facet.forEach(item => {
+		counts[String(item.value)] = item.count;
+	});
+	Array.from(select.options).forEach(option => {
+		if (!option.value) return;
+		if (!option.dataset.label) option.dataset.label = option.textContent;
+		option.textContent = `${option.dataset.label} (${counts[option.value] || 0})`;
+	});
+}
+
+function renderLoadMore(hasNext) {
+	const container = document.getElementById('products-container');
+	if (!container) return;
+
+	const existing = document.getElementById('load-more');
+	if (existing) existing.remove();
+	if (!hasNext) return;
+
+	const button = document.createElement('button');
+	button.id = 'load-more';
+	button.type = 'button';
+	button.className = 'btn-filter';
+	button.textContent = 'Показать ещё';
+	button.style.marginTop = '24px';
+	button.addEventListener('click', async () => {
+		button.disabled = true;
+		try {
+			await showCatalogPage(currentPage + 1);
+		} catch (error) {
+			console.error('Ошибка загрузки товаров:', error);
+			button.disabled = false;
+		}
+	});
+	container.appendChild(button);
+}
@@ -1,6 +1,5 @@
 document.addEventListener('DOMContentLoaded', async function () {
 	showSpinner('favorites-container');
-	await ensureFavoritesLoaded();
 	const products = await fetchFavoritesProducts();
 	renderFavorites(products);
 });
@@ -1,40 +1,30 @@
 // Функции для главной страницы
 document.addEventListener('DOMContentLoaded', function () {
-	loadGenres();
+	loadHome();
 });
 
-async function loadGenres() {
+// Данные главной страницы встроены в HTML (#home-data); если их нет —
+// один запрос к /home/
+async function loadHome() {
 	try {
-		const response = await fetch(`${API_BASE_URL}/genres/`);
-
-		if (!response.ok) {
-			throw new Error(`HTTP error! status: ${response.status}`);
-		}
-
-		const genres = await response.json();
-
-		// Проверяем, что genres - это массив
-		if (!Array.isArray(genres)) {
-			console.error('API вернул не массив:', genres);
-			throw new Error('API вернул неожиданный формат данных');
+		const embedded = document.getElementById('home-data');
+		let home;
+		if (embedded) {
+			home = JSON.parse(embedded.textContent);
+		} else {
+			const response = await fetch(`${API_BASE_URL}/home/`);
+			if (!response.ok) {
+				throw new Error(`HTTP error! status: ${response.status}`);
+			}
+			home = await response.json();
 		}
 
-		const container = document.getElementById('genres-container');
-		if (!container) return;
-
-		container.innerHTML = '';
-
-		genres.forEach(genre => {
-			const genreCard = document.createElement('div');
-			genreCard.className = 'category-card';
-			genreCard.innerHTML = `
-                <h3>${genre.genre_name}</h3>
-                <p>${genre.description}</p>
-            `;
-			container.appendChild(genreCard);
-		});
+		renderGenres(home.genres);
+		renderProducts('trending', home.trending);
+		renderProducts('new-arrivals', home.new_arrivals);
+		renderProducts('bestsellers', home.bestsellers);
 	} catch (error) {
-		console.error('Ошибка загрузки жанров:', error);
+		console.error('Ошибка загрузки главной страницы:', error);
 		const container = document.getElementById('genres-container');
 		if (container) {
 			container.innerHTML =
@@ -44,3 +34,52 @@ async function loadGenres() {
 		}
 	}
 }
+
+function renderGenres(genres) {
+	// Проверяем, что genres - это массив
+	if (!Array.isArray(genres)) {
+		console.error('API вернул не массив:', genres);
+		throw new Error('API вернул неожиданный формат данных');
+	}
+
+	const container = document.getElementById('genres-container');
+	if (!container) return;
+
+	container.innerHTML = '';
+
+	genres.forEach(genre => {
+		const genreCard = document.createElement('div');
+		genreCard.className = 'category-card';
+		genreCard.innerHTML = `
+                <h3>${genre.genre_name}</h3>
+                <p>${genre.description}</p>
+                <p class="text-muted">Пластинок: ${genre.product_count}</p>
+            `;
+		container.appendChild(genreCard);
+	});
+}
+
+// Карточки товаров в секции #<sectionId>; пустая секция остается скрытой
+function renderProducts(sectionId, products) {
+	const container = document.getElementById(`${sectionId}-container`);
+	if (!container || !Array.isArray(products) || products.length === 0) return;
+
+	products.forEach(product => {
+		const productCard = document.createElement('div');
+		productCard.className = 'product-card';
+		productCard.innerHTML = `
+                <div class="product-image" onclick="window.location.href='/product/${product.id}/'">
+                    ${
+											product.picture
+												? `<img src="${product.picture}" alt="${product.product_name}">`
+												: '<div class="vinyl-placeholder">🎵</div>'
+										}
+                </div>
+                <h3>${product.product_name}</h3>
+                <p class="artist">${product.artist_name}</p>
+                <p class="price">${product.price} ₽</p>
+            `;
+		container.appendChild(productCard);
+	});
+	document.getElementById(sectionId).style.display = '';
+}
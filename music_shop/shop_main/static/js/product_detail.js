@@ -2,8 +2,24 @@
 document.addEventListener('DOMContentLoaded', function () {
 	loadProduct();
 	loadReviews();
+	const productId = getProductId();
+	if (productId) {
+		subscribeLiveEvents([productId], { stock: updateStock });
+	}
 });
 
+// Изменение остатка без перезагрузки страницы
+function updateStock(event) {
+	const status = document.querySelector('#product-container .stock-status');
+	const button = document.querySelector('#product-container .add-to-cart-btn');
+	if (!status || !button) return;
+	status.textContent =
+		event.stock_quantity > 0
+			? `В наличии: ${event.stock_quantity} шт.`
+			: 'Нет в наличии';
+	button.disabled = event.stock_quantity <= 0;
+}
+
 // Получаем ID товара из URL
 function getProductId() {
 	const path = window.location.pathname;
@@ -0,0 +1,166 @@
+"""Остатки товаров: кэш {product_id: stock_quantity} со сквозной записью.
+
+Предварительные проверки (добавление в корзину, просмотр корзины) читают
+остатки из кэша, не загружая строки Product. Списание и возврат через этот
+модуль, сохранение товара (админка, формы) и массовое обновление записывают
+новое значение в кэш и публикуют его подписчикам (shop_main.live) после
+фиксации транзакции.
+
+Списание при оформлении заказа — всегда условный UPDATE в БД, поэтому оно
+корректно даже при устаревшем кэше. В строгом режиме (STOCK_STRICT_RESERVATION,
+по умолчанию) решение принимает только БД; в нестрогом заведомо недостаточный
+по кэшу остаток отклоняется без обращения к БД.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Now
+
+from .catalog_index import catalog_index
+from .live import publish_stock
+from .models import Product
+
+
+def _cache_key(product_id):
+    return f"stock:{product_id}"
+
+
+def _timeout():
+    return getattr(settings, "STOCK_CACHE_TIMEOUT", 300)
+
+
+def remember(product_id, stock):
+    """Записывает остаток товара в кэш"""
+    cache.set(_cache_key(product_id), stock, _timeout())
+
+
+def forget(product_id):
+    cache.delete(_cache_key(product_id))
+
+
+def get_many(product_ids):
+    """{product_id: остаток}; отсутствующих в БД товаров в словаре нет"""
+    product_ids = {int(product_id) for product_id in product_ids}
+    keys = {_cache_key(product_id): product_id for product_id in product_ids}
+    cached = cache.get_many(keys)
+    stock = {keys[key]: value for key, value in cached.items()}
+
+    missing = product_ids - stock.keys()
+    if missing:
+        loaded = dict(
+            Product.objects.filter(pk__in=missing).values_list("pk", "stock_quantity")
+        )
+        cache.set_many(
+            {_cache_key(product_id): value for product_id, value in loaded.items()},
+            _timeout(),
+        )
+        stock.update(loaded)
+    return stock
+
+
+def get(product_id):
+    """Остаток товара или None, если товара нет"""
+    return get_many([product_id]).get(int(product_id))
+
+
+def changed(product_id, stock):
+    """Новый остаток товара: кэш, индекс каталога и живые обновления.
+
+    Применяется после фиксации текущей транзакции: при откате (например,
+    брони в holds.place_hold) в кэше и у подписчиков остается прежний
+    остаток. Вне транзакции — сразу.
+    """
+
+    def apply():
+        remember(product_id, stock)
+        catalog_index.product_changed(product_id)
+        publish_stock(product_id, stock)
+
+    transaction.on_commit(apply)
+
+
+def reserve(product_id, quantity, partial=False, strict=None):
+    """Списывает quantity единиц товара, возвращает число списанных.
+
+    Без partial списывается все или ничего (0). С partial списывается
+    сколько есть, но не больше quantity — так оформление заказа урезает
+    позицию до остатка.
+    """
+    if quantity <= 0:
+        return 0
+    if strict is None:
+        strict = getattr(settings, "STOCK_STRICT_RESERVATION", True)
+    if not strict:
+        cached = cache.get(_cache_key(product_id))
+        if cached is not None and (cached <= 0 or (cached < quantity and not partial)):
+            return 0
+
+    table = Product._meta.db_table
+    take = "LEAST(p.stock_quantity, %s)" if partial else "%s"
+    # Условие в WHERE и блокировка строки исключают уход остатка в минус
+    # при одновременных заказах; updated_at нужен индексу каталога
+    sql = f"""
+        UPDATE {table} p
+        SET stock_quantity = p.stock_quantity - {take}, updated_at = now()
+        FROM (
+            SELECT id, stock_quantity FROM {table} WHERE id = %s FOR UPDATE
+        ) old
+        WHERE p.id = old.id AND old.stock_quantity >= {"1" if partial else "%s"}
+        RETURNING old.stock_quantity, p.stock_quantity
+    """
+    params = [quantity, product_id] if partial else [quantity, product_id, quantity]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        if strict:
+            # Товара нет или остатка не хватает: сбрасываем кэш, чтобы
+            # предварительные проверки перечитали актуальное значение
+            forget(product_id)
+        return 0
+    before, after = row
+    changed(product_id, after)
+    return before - after
+
+
+def release(product_id, quantity):
+    """Возвращает quantity единиц товара на склад (отмена, истекшая бронь)"""
+    if quantity <= 0:
+        return
+    table = Product._meta.db_table
+    sql = f"""
+        UPDATE {table}
+        SET stock_quantity = stock_quantity + %s, updated_at = now()
+        WHERE id = %s
+        RETURNING stock_quantity
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [quantity, product_id])
+        row = cursor.fetchone()
+    if row is not None:
+        changed(product_id, row[0])
+
+
+def set_many(stock):
+    """Массово задает остатки {product_id: количество} одним UPDATE"""
+    if not stock:
+        return 0
+    updated = Product.objects.filter(pk__in=stock.keys()).update(
+        stock_quantity=Case(
+            *[
+                When(pk=product_id, then=Value(quantity))
+                for product_id, quantity in stock.items()
+            ],
+            output_field=IntegerField(),
+        ),
+        updated_at=Now(),
+    )
+    if updated == len(stock):
+        for product_id, quantity in stock.items():
+            changed(product_id, quantity)
+    else:
+        # Часть товаров не найдена: не кэшируем остатки несуществующих товаров
+        cache.delete_many([_cache_key(product_id) for product_id in stock])
+    return updated
@@ -1,18 +1,75 @@
+import asyncio
+import gzip
+import json
+import unittest
+from datetime import datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal
+from unittest import mock
 
-from django.contrib.auth.models import User
-from django.test import TestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.core.cache import cache
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import Prefetch
+from django.http import HttpResponse
+from django.test import (
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
 
-from .logger_utils import create_log_entry
+from .catalog_index import catalog_index
+from . import stock
+from .coupons import coupon_cache, find_active_coupon
+from .counts import count_rows
+from .favorites import get_favorite_ids, toggle_favorite
+from .bench_utils import seed_dataset
+from .addresses import merge_duplicate_addresses, upsert_address
+from .holds import release_expired_holds, release_hold
+from .home import home_payload
+from .idempotency import purge_expired_keys
+from .live import live_hub, stock_channel
+from .order_status import bulk_transition, fulfillment_report
+from .fast_serializers import serialize_orders, serialize_products, serialize_reviews
+from .logger_utils import create_log_entry, get_active_log_user_ids
+from .middleware import CompressionMiddleware, choose_encoding
+from .pagination import paginate_keyset
 from .models import (
     Artist,
     Coupon,
+    Favorite,
     Genre,
+    IdempotencyKey,
     LogEntry,
     Order,
     OrderItem,
+    OrderStatusEvent,
     Product,
+    ProductBasketSupport,
+    ProductRecommendation,
+    ProductViewStat,
+    RecommendationState,
+    Review,
+    ShippingAddress,
+    StockHold,
+    TrendingScore,
+    address_fingerprint,
 )
+from .queries import bestsellers
+from .query_plans import load_baseline, plan_diff, run_checks, seed_plan_dataset
+from .recommendations import rebuild_recommendations, refresh_recommendations
+from .renderers import FastJSONRenderer
+from .replicas import read_alias, replica_reads, request_scope
+from .serializers import OrderSerializer, ProductSerializer, ReviewSerializer
+from .tracking import record_product_view, recent_views, view_counters
+from .trending import events, rebuild_from_history, record_event, trending
 
 
 class ModelStrTests(TestCase):
@@ -129,3 +186,1901 @@ class LoggerUtilsTests(TestCase):
         self.assertEqual(entry.product, self.product)
         self.assertEqual(entry.ip_address, "127.0.0.1")
         self.assertEqual(entry.user_agent, "pytest-agent")
+
+
+class FastSerializerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="dave", password="pass12345")
+        self.genre = Genre.objects.create(
+            genre_name=Genre.GenreChoices.JAZZ_BLUES, description="desc"
+        )
+        self.artist = Artist.objects.create(artist_name="Miles Davis", country="US")
+        self.product1 = Product.objects.create(
+            product_name="Kind of Blue",
+            description="Album",
+            price=Decimal("120.50"),
+            stock_quantity=3,
+            picture="products/images/kind_of_blue.png",
+            genre=self.genre,
+            artist=self.artist,
+        )
+        self.product2 = Product.objects.create(
+            product_name="Bitches Brew",
+            description="Album",
+            price=Decimal("99.00"),
+            stock_quantity=0,
+            genre=self.genre,
+            artist=self.artist,
+        )
+        address = ShippingAddress.objects.create(
+            user=self.user,
+            full_name="Dave",
+            phone="123",
+            city="Moscow",
+            address_line="Street 1",
+            postal_code="101000",
+        )
+        coupon = Coupon.objects.create(code="JAZZ15", discount_percent=15)
+        self.order1 = Order.objects.create(
+            user=self.user, shipping_address=address, coupon=coupon
+        )
+        self.order2 = Order.objects.create(user=self.user)
+        OrderItem.objects.create(
+            order=self.order1,
+            product=self.product1,
+            quantity=2,
+            price_at_order=Decimal("110.00"),
+        )
+        OrderItem.objects.create(
+            order=self.order1,
+            product=self.product2,
+            quantity=1,
+            price_at_order=Decimal("99.00"),
+        )
+        Review.objects.create(
+            rating=4.5, text="Great", user=self.user, product=self.product1
+        )
+
+    def test_products_match_product_serializer(self):
+        products = Product.objects.order_by("id")
+        self.assertEqual(
+            serialize_products(products), ProductSerializer(products, many=True).data
+        )
+
+    def test_products_match_product_serializer_with_request(self):
+        request = RequestFactory().get("/api/v1/products/catalog/")
+        products = Product.objects.order_by("id")
+        expected = ProductSerializer(
+            products, many=True, context={"request": request}
+        ).data
+        self.assertEqual(serialize_products(products, request=request), expected)
+
+    def test_orders_match_order_serializer(self):
+        orders = Order.objects.prefetch_related(
+            Prefetch("orderitem_set", queryset=OrderItem.objects.order_by("id"))
+        ).order_by("id")
+        fast = serialize_orders(Order.objects.order_by("id"))
+        self.assertEqual(fast, OrderSerializer(orders, many=True).data)
+        self.assertEqual(fast[0]["total"], Decimal("271.15"))
+        self.assertIsNone(fast[1]["coupon"])
+
+    def test_orders_use_two_queries(self):
+        with self.assertNumQueries(2):
+            serialize_orders(Order.objects.all())
+
+    def test_reviews_match_review_serializer(self):
+        reviews = Review.objects.order_by("id")
+        self.assertEqual(
+            serialize_reviews(reviews), ReviewSerializer(reviews, many=True).data
+        )
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def test_output_matches_json_renderer(self):
+        data = {
+            "price": Decimal("120.50"),
+            "created_at": datetime(2025, 1, 2, 3, 4, 5, 6, tzinfo=dt_timezone.utc),
+            "text": "Пластинка\u2028с разделителем",
+            "items": [{"id": 1, "total": Decimal("0")}],
+        }
+        fast = FastJSONRenderer().render(data)
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data)))
+        self.assertIn(b"\\u2028", fast)
+        self.assertIn(b'"2025-01-02T03:04:05.000006Z"', fast)
+
+    def test_indent_falls_back_to_json_renderer(self):
+        data = {"id": 1}
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=4"),
+            JSONRenderer().render(data, "application/json; indent=4"),
+        )
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100, COMPRESSION_PATH_PREFIXES=["/api/"])
+class CompressionMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.payload = json.dumps([{"id": i, "name": "Album"} for i in range(50)])
+
+    def process(self, content, content_type="application/json", path="/api/v1/x/"):
+        request = self.factory.get(path, HTTP_ACCEPT_ENCODING="gzip")
+        middleware = CompressionMiddleware(
+            lambda request: HttpResponse(content, content_type=content_type)
+        )
+        return middleware(request)
+
+    def test_choose_encoding_respects_quality(self):
+        available = ["zstd", "br", "gzip"]
+        self.assertEqual(choose_encoding("gzip, br, zstd", available), "zstd")
+        self.assertEqual(choose_encoding("gzip;q=1.0, br;q=0.5", available), "gzip")
+        self.assertEqual(choose_encoding("*, zstd;q=0", available), "br")
+        self.assertIsNone(choose_encoding("identity", available))
+
+    def test_json_is_gzipped(self):
+        response = self.process(self.payload)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content).decode(), self.payload)
+
+    def test_small_response_is_not_compressed(self):
+        response = self.process('{"id": 1}')
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_compressed_media_is_not_compressed(self):
+        response = self.process(b"\x89PNG" + b"0" * 500, content_type="image/png")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_non_api_path_is_not_compressed(self):
+        response = self.process(self.payload, content_type="text/html", path="/")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+
+class OrderQueryCountTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            username="staff", password="pass12345", is_staff=True
+        )
+        self.genre = Genre.objects.create(
+            genre_name=Genre.GenreChoices.RUSSIAN_SOVIET, description="desc"
+        )
+        self.artist = Artist.objects.create(artist_name="Кино", country="RU")
+        self.products = [
+            Product.objects.create(
+                product_name=f"Альбом {i}",
+                description="Album",
+                price=Decimal("10.00"),
+                stock_quantity=10,
+                genre=self.genre,
+                artist=self.artist,
+            )
+            for i in range(3)
+        ]
+        self.coupon = Coupon.objects.create(code="KINO", discount_percent=5)
+        self.client.force_login(self.staff)
+
+    def create_orders(self, count):
+        for _ in range(count):
+            user = User.objects.create_user(username=f"u{User.objects.count()}")
+            address = ShippingAddress.objects.create(
+                user=user,
+                full_name="Name",
+                phone="1",
+                city="City",
+                address_line="Line",
+                postal_code="1",
+            )
+            order = Order.objects.create(
+                user=user, shipping_address=address, coupon=self.coupon
+            )
+            for product in self.products:
+                OrderItem.objects.create(
+                    order=order,
+                    product=product,
+                    quantity=1,
+                    price_at_order=product.price,
+                )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def assert_constant_queries(self, url):
+        self.create_orders(2)
+        few = self.count_queries(url)
+        self.create_orders(5)
+        many = self.count_queries(url)
+        self.assertEqual(few, many)
+
+    def test_order_viewset_list(self):
+        self.assert_constant_queries("/api/v1/orders/")
+
+    def test_order_viewset_retrieve(self):
+        self.create_orders(1)
+        order = Order.objects.first()
+        self.assertLessEqual(self.count_queries(f"/api/v1/orders/{order.pk}/"), 6)
+
+    def test_my_orders(self):
+        self.assert_constant_queries("/api/v1/orders/my_orders/")
+
+    def test_order_list_view(self):
+        self.assert_constant_queries(reverse("order-list"))
+
+    def test_database_overview_view(self):
+        self.assert_constant_queries(reverse("db-index"))
+
+
+class CouponResolutionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        coupon_cache.invalidate()
+        self.coupon = Coupon.objects.create(code="Vinyl20", discount_percent=20)
+
+    def validate(self, code):
+        return self.client.post(
+            "/api/v1/coupons/validate_coupon/",
+            {"code": code},
+            content_type="application/json",
+        )
+
+    def test_code_is_normalized_on_save(self):
+        self.assertEqual(self.coupon.code_normalized, "VINYL20")
+
+    def test_lookup_is_case_insensitive_and_cached(self):
+        self.assertEqual(find_active_coupon(" vinyl20 "), self.coupon)
+        with self.assertNumQueries(0):
+            self.assertEqual(find_active_coupon("VINYL20"), self.coupon)
+            self.assertIsNone(find_active_coupon("UNKNOWN"))
+
+    def test_validate_coupon(self):
+        response = self.validate("vinyl20")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["code"], "Vinyl20")
+
+    def test_cache_is_invalidated_on_save(self):
+        self.assertIsNotNone(find_active_coupon("VINYL20"))
+        self.coupon.active = False
+        self.coupon.save()
+        self.assertEqual(self.validate("VINYL20").status_code, 404)
+
+    def test_expired_coupon_is_invalid(self):
+        self.coupon.valid_to = timezone.now() - timedelta(days=1)
+        self.coupon.save()
+        self.assertEqual(self.validate("VINYL20").status_code, 400)
+
+    def test_api_rejects_case_insensitive_duplicate(self):
+        admin = User.objects.create_superuser(username="olga", password="pass12345")
+        self.client.force_login(admin)
+        response = self.client.post(
+            "/api/v1/coupons/",
+            {"code": " VINYL20", "discount_percent": 10},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("code", response.json())
+        response = self.client.patch(
+            f"/api/v1/coupons/{self.coupon.pk}/",
+            {"code": "VINYL20"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(COUPON_RATE_LIMIT=(3, 60))
+    def test_guessing_is_rate_limited(self):
+        for code in ("A1", "A2", "A3"):
+            self.assertEqual(self.validate(code).status_code, 404)
+        self.assertEqual(self.validate("VINYL20").status_code, 429)
+
+
+class FavoritesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="erin", password="pass12345")
+        self.genre = Genre.objects.create(
+            genre_name=Genre.GenreChoices.INDIE_ALTERNATIVE, description="desc"
+        )
+        self.artist = Artist.objects.create(artist_name="Radiohead", country="UK")
+        self.product1 = Product.objects.create(
+            product_name="OK Computer",
+            description="Album",
+            price=Decimal("70.00"),
+            stock_quantity=5,
+            genre=self.genre,
+            artist=self.artist,
+        )
+        self.product2 = Product.objects.create(
+            product_name="Kid A",
+            description="Album",
+            price=Decimal("65.00"),
+            stock_quantity=5,
+            genre=self.genre,
+            artist=self.artist,
+        )
+
+    def test_toggle_uses_single_statement_per_branch(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(toggle_favorite(self.user, self.product1), "added")
+        with self.assertNumQueries(1):
+            self.assertEqual(toggle_favorite(self.user, self.product1), "removed")
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_ids_are_cached_and_invalidated_on_toggle(self):
+        toggle_favorite(self.user, self.product1)
+        self.assertEqual(get_favorite_ids(self.user), [self.product1.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_favorite_ids(self.user), [self.product1.id])
+        toggle_favorite(self.user, self.product2)
+        toggle_favorite(self.user, self.product1)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_favorite_ids(self.user), [self.product2.id])
+
+    def test_product_delete_invalidates_ids(self):
+        toggle_favorite(self.user, self.product1)
+        toggle_favorite(self.user, self.product2)
+        self.assertEqual(len(get_favorite_ids(self.user)), 2)
+        self.product1.delete()
+        self.assertEqual(get_favorite_ids(self.user), [self.product2.id])
+
+    def test_ids_endpoint(self):
+        self.client.force_login(self.user)
+        self.client.post(
+            "/api/v1/favorites/toggle/",
+            {"product_id": self.product2.id},
+            content_type="application/json",
+        )
+        response = self.client.get("/api/v1/favorites/ids/")
+        self.assertEqual(response.json(), [self.product2.id])
+
+    def test_catalog_has_is_favorite_for_authenticated_user(self):
+        toggle_favorite(self.user, self.product1)
+        anonymous = self.client.get("/api/v1/products/catalog/").json()
+        self.assertNotIn("is_favorite", anonymous[0])
+
+        self.client.force_login(self.user)
+        products = self.client.get("/api/v1/products/catalog/").json()
+        flags = {product["id"]: product["is_favorite"] for product in products}
+        self.assertEqual(flags, {self.product1.id: True, self.product2.id: False})
+
+
+class LogKeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(
+            username="admin", password="pass12345", is_staff=True
+        )
+        self.user = User.objects.create_user(username="frank", password="pass12345")
+        for i in range(10):
+            create_log_entry(
+                action="page_visited",
+                user=self.user if i % 2 else None,
+                description=f"Посещение страницы номер {i}",
+            )
+        # Одинаковое время у части записей проверяет сортировку по id
+        same_time = timezone.now()
+        LogEntry.objects.filter(pk__in=LogEntry.objects.order_by("pk")[2:6]).update(
+            created_at=same_time
+        )
+        self.expected = list(
+            LogEntry.objects.order_by("-created_at", "-pk").values_list("pk", flat=True)
+        )
+
+    def test_walk_forward_and_back(self):
+        queryset = LogEntry.objects.all()
+        page = paginate_keyset(queryset, 3)
+        seen = [log.pk for log in page.object_list]
+        pages = [page]
+        while page.has_next:
+            page = paginate_keyset(queryset, 3, after=page.next_cursor)
+            seen.extend(log.pk for log in page.object_list)
+            pages.append(page)
+        self.assertEqual(seen, self.expected)
+
+        previous = paginate_keyset(queryset, 3, before=pages[-1].previous_cursor)
+        self.assertEqual(
+            [log.pk for log in previous.object_list],
+            [log.pk for log in pages[-2].object_list],
+        )
+
+    def test_last_page(self):
+        page = paginate_keyset(LogEntry.objects.all(), 3, last=True)
+        self.assertEqual([log.pk for log in page.object_list], self.expected[-3:])
+        self.assertFalse(page.has_next)
+        self.assertTrue(page.has_previous)
+
+    def test_active_users_are_cached(self):
+        self.assertEqual(get_active_log_user_ids(), {self.user.pk})
+        create_log_entry(action="login", user=self.staff)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_active_log_user_ids(), {self.user.pk, self.staff.pk})
+
+    def test_view_filters_and_search(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse("log-list"), {"search": "страницы", "user": self.user.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["logs"]), 5)
+        self.assertEqual(list(response.context["users"]), [self.user])
+
+        response = self.client.get(reverse("log-list"), {"page": "last"})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(
+    PRODUCT_VIEW_FLUSH_INTERVAL=3600,
+    PRODUCT_VIEW_LOG_SAMPLE_RATE=1.0,
+    PRODUCT_VIEW_BACKGROUND_FLUSH=False,
+)
+class ProductViewTrackingTests(TestCase):
+    BROWSER = "Mozilla/5.0 (X11; Linux x86_64) Firefox/130.0"
+
+    def setUp(self):
+        recent_views.clear()
+        view_counters.clear()
+        genre = Genre.objects.create(
+            genre_name=Genre.GenreChoices.POP_DISCO, description="desc"
+        )
+        artist = Artist.objects.create(artist_name="ABBA", country="SE")
+        self.product = Product.objects.create(
+            product_name="Arrival",
+            description="Album",
+            price=Decimal("55.00"),
+            stock_quantity=5,
+            genre=genre,
+            artist=artist,
+        )
+        self.factory = RequestFactory()
+
+    def view(self, user_agent=BROWSER, ip="10.0.0.1"):
+        request = self.factory.get("/", HTTP_USER_AGENT=user_agent, REMOTE_ADDR=ip)
+        request.user = AnonymousUser()
+        return record_product_view(request, self.product.pk)
+
+    def test_repeat_views_are_logged_once_but_counted(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(self.view())
+            self.assertFalse(self.view())
+            self.assertTrue(self.view(ip="10.0.0.2"))
+        self.assertFalse(LogEntry.objects.exists())
+
+        today = timezone.localdate()
+        self.assertEqual(view_counters.pending(), {(self.product.pk, today): (3, 2)})
+        self.assertEqual(view_counters.flush(), 1)
+        entries = LogEntry.objects.filter(action="product_viewed")
+        self.assertEqual(entries.count(), 2)
+        self.assertEqual(entries[0].description, "Просмотр товара 'Arrival'")
+        self.view()
+        view_counters.flush()
+        stat = ProductViewStat.objects.get(product=self.product, date=today)
+        self.assertEqual((stat.views, stat.unique_views), (4, 2))
+
+    def test_bots_are_ignored(self):
+        self.assertFalse(self.view(user_agent="Googlebot/2.1"))
+        self.assertFalse(self.view(user_agent=""))
+        self.assertEqual(view_counters.pending(), {})
+        self.assertFalse(LogEntry.objects.exists())
+
+    @override_settings(PRODUCT_VIEW_LOG_SAMPLE_RATE=0.0)
+    def test_sampling_keeps_exact_counts(self):
+        for i in range(5):
+            self.assertFalse(self.view(ip=f"10.0.1.{i}"))
+        self.assertFalse(LogEntry.objects.exists())
+        view_counters.flush()
+        stat = ProductViewStat.objects.get(product=self.product)
+        self.assertEqual((stat.views, stat.unique_views), (5, 5))
+
+    def test_missing_product_is_skipped(self):
+        request = self.factory.get("/", HTTP_USER_AGENT=self.BROWSER)
+        request.user = AnonymousUser()
+        record_product_view(request, self.product.pk + 1000)
+        self.assertEqual(view_counters.flush(), 1)
+        self.assertFalse(ProductViewStat.objects.exists())
+        self.assertFalse(LogEntry.objects.exists())
+
+
+@override_settings(
+    TRENDING_HALF_LIFE=3600,
+    TRENDING_WEIGHTS={"view": 1.0, "cart": 3.0, "purchase": 10.0},
+    TRENDING_REFRESH_INTERVAL=3600,
+)
+class TrendingTests(TestCase):
+    def setUp(self):
+        events.clear()
+        trending.invalidate()
+        artist = Artist.objects.create(artist_name="Miles Davis", country="US")
+        jazz = Genre.objects.create(
+            genre_name=Genre.GenreChoices.JAZZ_BLUES, description="desc"
+        )
+        rock = Genre.objects.create(
+            genre_name=Genre.GenreChoices.ROCK_METAL, description="desc"
+        )
+        self.jazz, self.rock = jazz, rock
+        self.kind_of_blue, self.bitches_brew, self.rock_album = [
+            Product.objects.create(
+                product_name=name,
+                description="Album",
+                price=Decimal("50.00"),
+                stock_quantity=5,
+                genre=genre,
+                artist=artist,
+            )
+            for name, genre in [
+                ("Kind of Blue", jazz),
+                ("Bitches Brew", jazz),
+                ("Rock Album", rock),
+            ]
+        ]
+
+    def ids(self, products):
+        return [product["id"] for product in products]
+
+    def test_ranking_overall_and_per_genre(self):
+        for _ in range(5):
+            record_event("view", self.kind_of_blue.pk)
+        record_event("purchase", self.bitches_brew.pk)
+        record_event("cart", self.rock_album.pk)
+        events.flush()
+
+        self.assertEqual(
+            self.ids(trending.top()),
+            [self.bitches_brew.pk, self.kind_of_blue.pk, self.rock_album.pk],
+        )
+        self.assertEqual(
+            self.ids(trending.top(self.jazz.pk)),
+            [self.bitches_brew.pk, self.kind_of_blue.pk],
+        )
+        self.assertEqual(
+            self.ids(trending.top(self.jazz.pk, limit=1)), [self.bitches_brew.pk]
+        )
+        with self.assertNumQueries(0):
+            trending.top(self.rock.pk)
+
+    def test_flush_decays_stored_scores(self):
+        TrendingScore.objects.create(
+            product=self.kind_of_blue,
+            views=8,
+            updated_at=timezone.now() - timedelta(hours=1),
+        )
+        record_event("view", self.kind_of_blue.pk)
+        events.flush()
+        score = TrendingScore.objects.get(product=self.kind_of_blue)
+        self.assertAlmostEqual(score.views, 5, places=2)
+
+    def test_rebuild_from_history(self):
+        user = User.objects.create_user(username="gina", password="pass12345")
+        create_log_entry(action="product_viewed", product=self.kind_of_blue)
+        create_log_entry(action="product_viewed", product=self.kind_of_blue)
+        LogEntry.objects.update(created_at=timezone.now() - timedelta(hours=2))
+        order = Order.objects.create(user=user)
+        OrderItem.objects.create(
+            order=order, product=self.rock_album, quantity=3, price_at_order=50
+        )
+        cancelled = Order.objects.create(user=user, status="cancelled")
+        OrderItem.objects.create(
+            order=cancelled, product=self.bitches_brew, quantity=1, price_at_order=50
+        )
+
+        self.assertEqual(rebuild_from_history(), 2)
+        views = TrendingScore.objects.get(product=self.kind_of_blue).views
+        self.assertAlmostEqual(views, 0.5, places=2)
+        purchases = TrendingScore.objects.get(product=self.rock_album).purchases
+        self.assertAlmostEqual(purchases, 3, places=2)
+        self.assertEqual(
+            self.ids(trending.top()), [self.rock_album.pk, self.kind_of_blue.pk]
+        )
+
+    def test_refresh_does_not_persist_events(self):
+        record_event("view", self.kind_of_blue.pk)
+        self.assertEqual(trending.top(), [])
+        self.assertFalse(TrendingScore.objects.exists())
+        self.assertEqual(events.flush(), 1)
+
+    @override_settings(TRENDING_BACKGROUND_FLUSH=True)
+    def test_record_event_starts_background_flush(self):
+        with mock.patch.object(events, "start") as start:
+            record_event("view", self.kind_of_blue.pk)
+        start.assert_called_once_with()
+
+    def test_rebuild_skips_cart_additions(self):
+        record_event("cart", self.kind_of_blue.pk)
+        events.flush()
+        # Добавления в корзину в журнал не пишутся, даже старые записи не учитываются
+        create_log_entry(action="cart_added", product=self.kind_of_blue)
+        self.assertEqual(rebuild_from_history(), 0)
+        self.assertFalse(TrendingScore.objects.exists())
+
+    def test_endpoint(self):
+        record_event("view", self.rock_album.pk)
+        events.flush()
+        response = self.client.get(
+            "/api/v1/products/trending/", {"genre": self.rock.pk}
+        )
+        self.assertEqual(self.ids(response.json()), [self.rock_album.pk])
+        response = self.client.get("/api/v1/products/trending/", {"genre": "rock"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/api/v1/products/trending/", {"limit": -1})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(RECOMMENDATIONS_LAG=0)
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="hank", password="pass12345")
+        genre = Genre.objects.create(
+            genre_name=Genre.GenreChoices.CLASSICAL, description="desc"
+        )
+        artist = Artist.objects.create(artist_name="Bach", country="DE")
+        self.a, self.b, self.c, self.d = [
+            Product.objects.create(
+                product_name=f"Suite {i}",
+                description="Album",
+                price=Decimal("40.00"),
+                stock_quantity=5,
+                genre=genre,
+                artist=artist,
+            )
+            for i in range(4)
+        ]
+
+    def order(self, *products, status="pending"):
+        order = Order.objects.create(user=self.user, status=status)
+        for product in products:
+            OrderItem.objects.create(
+                order=order, product=product, quantity=1, price_at_order=40
+            )
+        return order
+
+    def test_build_support_and_lift(self):
+        self.order(self.a, self.b)
+        self.order(self.a, self.b, self.c)
+        self.order(self.a, self.c)
+        self.order(self.d)
+        self.order(self.a, self.d, status="cancelled")
+
+        self.assertEqual(rebuild_recommendations(), 3)
+        rec = ProductRecommendation.objects.get(product=self.a)
+        self.assertEqual(rec.neighbor_ids, [self.b.pk, self.c.pk])
+        self.assertEqual(rec.supports, [2, 2])
+        # 4 заказа, a в трех, b в двух: 2 * 4 / (3 * 2)
+        self.assertAlmostEqual(rec.lifts[0], 4 / 3)
+        self.assertFalse(ProductRecommendation.objects.filter(product=self.d).exists())
+
+    def test_incremental_refresh_touches_only_new_products(self):
+        self.order(self.a, self.b)
+        self.order(self.c, self.d)
+        rebuild_recommendations()
+        built_at = ProductRecommendation.objects.get(product=self.d).updated_at
+
+        self.order(self.a, self.c)
+        self.assertEqual(refresh_recommendations(), 2)
+        rec = ProductRecommendation.objects.get(product=self.a)
+        self.assertEqual(sorted(rec.neighbor_ids), [self.b.pk, self.c.pk])
+        rec = ProductRecommendation.objects.get(product=self.c)
+        self.assertEqual(sorted(rec.neighbor_ids), [self.a.pk, self.d.pk])
+        self.assertEqual(
+            ProductRecommendation.objects.get(product=self.d).updated_at, built_at
+        )
+        self.assertEqual(refresh_recommendations(), 0)
+
+    @override_settings(RECOMMENDATIONS_LAG=60)
+    def test_refresh_waits_for_late_order_lines(self):
+        self.order(self.c, self.d)
+        Order.objects.update(date_order=timezone.now() - timedelta(minutes=5))
+        rebuild_recommendations()
+
+        # Позиции заказа дописываются после обновления индекса
+        order = self.order(self.a)
+        self.assertEqual(refresh_recommendations(), 0)
+        OrderItem.objects.create(
+            order=order, product=self.b, quantity=1, price_at_order=40
+        )
+        Order.objects.filter(pk=order.pk).update(
+            date_order=timezone.now() - timedelta(minutes=2)
+        )
+        self.assertEqual(refresh_recommendations(), 2)
+        rec = ProductRecommendation.objects.get(product=self.a)
+        self.assertEqual(rec.neighbor_ids, [self.b.pk])
+        self.assertEqual(RecommendationState.objects.get().orders, 2)
+
+    def test_incremental_refresh_matches_rebuild(self):
+        self.order(self.a, self.b)
+        self.order(self.b, self.c)
+        self.order(self.d)
+        rebuild_recommendations()
+        self.order(self.a, self.c)
+        self.order(self.a, self.b, status="cancelled")
+        self.order(self.c, self.d)
+        refresh_recommendations()
+        state = RecommendationState.objects.get()
+        self.assertEqual(state.orders, 5)
+
+        def snapshot():
+            # Строки товаров из новых заказов; у b lift обновит только пересборка
+            touched = [self.a.pk, self.c.pk, self.d.pk]
+            return {
+                rec.product_id: (rec.neighbor_ids, rec.supports, rec.lifts)
+                for rec in ProductRecommendation.objects.filter(product__in=touched)
+            }
+
+        refreshed = snapshot()
+        supports = dict(
+            ProductBasketSupport.objects.values_list("product_id", "support")
+        )
+        rebuild_recommendations()
+        self.assertEqual(snapshot(), refreshed)
+        self.assertEqual(
+            dict(ProductBasketSupport.objects.values_list("product_id", "support")),
+            supports,
+        )
+
+    def test_endpoint(self):
+        self.order(self.a, self.b)
+        self.order(self.a, self.b, self.c)
+        rebuild_recommendations()
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/v1/products/{self.a.pk}/also_bought/")
+        data = response.json()
+        self.assertEqual([p["id"] for p in data], [self.b.pk, self.c.pk])
+        self.assertEqual(data[0]["support"], 2)
+        response = self.client.get(f"/api/v1/products/{self.d.pk}/also_bought/")
+        self.assertEqual(response.json(), [])
+        response = self.client.get("/api/v1/products/abc/also_bought/")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            f"/api/v1/products/{self.a.pk}/also_bought/", {"limit": 0}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CATALOG_PRICE_BUCKETS=[1000, 3000], CATALOG_PAGE_SIZE=2)
+class CatalogFacetTests(TestCase):
+    def setUp(self):
+        jazz = Genre.objects.create(
+            genre_name=Genre.GenreChoices.JAZZ_BLUES, description="desc"
+        )
+        rock = Genre.objects.create(
+            genre_name=Genre.GenreChoices.ROCK_METAL, description="desc"
+        )
+        self.coltrane = Artist.objects.create(artist_name="Coltrane", country="US")
+        self.zeppelin = Artist.objects.create(artist_name="Led Zeppelin", country="UK")
+        for name, genre, artist, price, stock in [
+            ("A Love Supreme", jazz, self.coltrane, "900.00", 3),
+            ("Blue Train", jazz, self.coltrane, "2500.00", 0),
+            ("Giant Steps", jazz, self.coltrane, "3500.00", 1),
+            ("IV", rock, self.zeppelin, "1500.00", 2),
+            ("Physical Graffiti", rock, self.zeppelin, "4000.00", 5),
+        ]:
+            Product.objects.create(
+                product_name=name,
+                description="Album",
+                price=Decimal(price),
+                stock_quantity=stock,
+                genre=genre,
+                artist=artist,
+            )
+
+    def catalog(self, **params):
+        return self.client.get("/api/v1/products/catalog/", params).json()
+
+    def test_plain_list_without_facets(self):
+        self.assertEqual(len(self.catalog(genre="jazz and blues")), 3)
+
+    def test_counts_ignore_own_filter(self):
+        data = self.catalog(facets=1, genre="jazz and blues", in_stock=1)
+        self.assertEqual(data["count"], 2)
+        self.assertEqual(
+            {item["value"]: item["count"] for item in data["facets"]["genre"]},
+            {"jazz and blues": 2, "rock and metal": 2},
+        )
+        self.assertEqual(
+            {item["label"]: item["count"] for item in data["facets"]["artist"]},
+            {"Coltrane": 2},
+        )
+        self.assertEqual(
+            [bucket["count"] for bucket in data["facets"]["price"]], [1, 0, 1]
+        )
+        self.assertEqual(
+            data["facets"]["in_stock"], {"in_stock": 2, "out_of_stock": 1}
+        )
+
+    def test_price_filter_and_pagination(self):
+        with self.assertNumQueries(2):
+            data = self.catalog(facets=1, min_price="1000", sort="price")
+        self.assertEqual(data["count"], 4)
+        self.assertEqual(
+            [product["product_name"] for product in data["results"]],
+            ["IV", "Blue Train"],
+        )
+        self.assertEqual(
+            [bucket["count"] for bucket in data["facets"]["price"]], [1, 2, 2]
+        )
+        self.assertIsNone(data["previous"])
+
+        data = self.client.get(data["next"]).json()
+        self.assertEqual(
+            [product["product_name"] for product in data["results"]],
+            ["Giant Steps", "Physical Graffiti"],
+        )
+        self.assertIsNone(data["next"])
+
+
+@unittest.skipUnless(catalog_index.available, "numpy не установлен")
+@override_settings(
+    CATALOG_PRICE_BUCKETS=[1000, 3000],
+    CATALOG_PAGE_SIZE=2,
+    CATALOG_INDEX_POLL_INTERVAL=3600,
+)
+class CatalogIndexTests(CatalogFacetTests):
+    def setUp(self):
+        super().setUp()
+        catalog_index.invalidate()
+
+    def both(self, **params):
+        with self.settings(CATALOG_INDEX_ENABLED=False):
+            from_db = self.catalog(facets=1, **params)
+        with self.settings(CATALOG_INDEX_ENABLED=True):
+            from_index = self.catalog(facets=1, **params)
+        return from_db, from_index
+
+    def test_matches_database(self):
+        for params in [
+            {},
+            {"genre": "jazz and blues", "in_stock": 1},
+            {"min_price": "1000", "max_price": "3500", "sort": "-price"},
+            {"search": "zeppelin", "sort": "product_name"},
+            {"artist": self.coltrane.pk, "page": 2},
+        ]:
+            from_db, from_index = self.both(**params)
+            self.assertEqual(from_index, from_db, params)
+
+    @override_settings(CATALOG_INDEX_ENABLED=True)
+    def test_page_needs_one_query_and_follows_changes(self):
+        catalog_index.columns()
+        with self.assertNumQueries(1):
+            data = self.catalog(facets=1, sort="-price")
+        self.assertEqual(data["results"][0]["product_name"], "Physical Graffiti")
+
+        product = Product.objects.get(product_name="IV")
+        product.price = Decimal("9000.00")
+        product.save()
+        Product.objects.get(product_name="Physical Graffiti").delete()
+        data = self.catalog(facets=1, sort="-price")
+        self.assertEqual(data["count"], 4)
+        self.assertEqual(data["results"][0]["product_name"], "IV")
+        self.assertGreater(catalog_index.stats()["memory_bytes"], 0)
+
+    @override_settings(CATALOG_INDEX_ENABLED=True)
+    def test_artist_change_updates_search(self):
+        catalog_index.columns()
+        product = Product.objects.get(product_name="IV")
+        product.artist = self.coltrane
+        product.save()
+        from_db, from_index = self.both(search="coltrane")
+        self.assertEqual(from_index, from_db)
+        self.assertEqual(from_index["count"], 4)
+        self.assertEqual(self.catalog(facets=1, search="zeppelin")["count"], 1)
+
+
+class StockCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="ivan", password="pass12345")
+        genre = Genre.objects.create(
+            genre_name=Genre.GenreChoices.ROCK_METAL, description="desc"
+        )
+        artist = Artist.objects.create(artist_name="Nirvana", country="US")
+        self.nevermind, self.bleach = [
+            Product.objects.create(
+                product_name=name,
+                description="Album",
+                price=Decimal("60.00"),
+                stock_quantity=quantity,
+                genre=genre,
+                artist=artist,
+            )
+            for name, quantity in [("Nevermind", 3), ("Bleach", 0)]
+        ]
+        cache.clear()
+
+    def test_get_many_is_cached(self):
+        ids = [self.nevermind.pk, self.bleach.pk, self.bleach.pk + 1000]
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                stock.get_many(ids), {self.nevermind.pk: 3, self.bleach.pk: 0}
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(stock.get(self.nevermind.pk), 3)
+
+    def test_write_through_on_save_and_bulk_update(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nevermind.stock_quantity = 7
+            self.nevermind.save()
+            stock.set_many({self.bleach.pk: 4})
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                stock.get_many([self.nevermind.pk, self.bleach.pk]),
+                {self.nevermind.pk: 7, self.bleach.pk: 4},
+            )
+
+    def test_reserve(self):
+        self.assertEqual(stock.reserve(self.nevermind.pk, 5), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(stock.reserve(self.nevermind.pk, 5, partial=True), 3)
+        self.nevermind.refresh_from_db()
+        self.assertEqual(self.nevermind.stock_quantity, 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(stock.get(self.nevermind.pk), 0)
+            self.assertEqual(stock.reserve(self.nevermind.pk, 1, strict=False), 0)
+
+    def test_strict_reservation_ignores_stale_cache(self):
+        stock.remember(self.bleach.pk, 0)
+        Product.objects.filter(pk=self.bleach.pk).update(stock_quantity=2)
+        self.assertEqual(stock.reserve(self.bleach.pk, 1, strict=False), 0)
+        self.assertEqual(stock.reserve(self.bleach.pk, 1), 1)
+
+    def test_cart_endpoints_use_cache(self):
+        stock.get_many([self.nevermind.pk, self.bleach.pk])
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                "/api/v1/cart/add_item/",
+                {"product_id": self.bleach.pk, "quantity": 1},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_login(self.user)
+        self.client.cookies["cart"] = json.dumps({str(self.nevermind.pk): 5})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/v1/cart/checkout/",
+                {
+                    "shipping_address": {
+                        "full_name": "Ivan",
+                        "phone": "+70000000000",
+                        "city": "Москва",
+                        "address_line": "ул. Тестовая, 1",
+                        "postal_code": "101000",
+                    }
+                },
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        item = OrderItem.objects.get(order_id=response.json()["order_id"])
+        self.assertEqual(item.quantity, 3)
+        self.assertEqual(stock.get(self.nevermind.pk), 0)
+
+    def test_rolled_back_change_is_not_cached(self):
+        self.assertEqual(stock.get(self.nevermind.pk), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    self.assertEqual(stock.reserve(self.nevermind.pk, 2), 2)
+                    raise ValueError("откат")
+        with self.assertNumQueries(0):
+            self.assertEqual(stock.get(self.nevermind.pk), 3)
+
+
+class CartHoldTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="ivan", password="pass12345")
+        genre = Genre.objects.create(
+            genre_name=Genre.GenreChoices.ROCK_METAL, description="desc"
+        )
+        artist = Artist.objects.create(artist_name="Nirvana", country="US")
+        self.drop = Product.objects.create(
+            product_name="In Utero (Limited)",
+            description="Album",
+            price=Decimal("90.00"),
+            stock_quantity=3,
+            genre=genre,
+            artist=artist,
+            limited_release=True,
+        )
+        cache.clear()
+
+    def add(self, quantity=1):
+        return self.client.post(
+            "/api/v1/cart/add_item/",
+            {"product_id": self.drop.pk, "quantity": quantity},
+            content_type="application/json",
+        )
+
+    def test_add_item_holds_stock(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.add(2)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("hold_expires_at", response.json())
+        self.assertEqual(stock.get(self.drop.pk), 1)
+        self.assertEqual(StockHold.objects.get().quantity, 2)
+
+        other = Client()
+        self.assertEqual(
+            other.post(
+                "/api/v1/cart/add_item/",
+                {"product_id": self.drop.pk, "quantity": 2},
+                content_type="application/json",
+            ).status_code,
+            400,
+        )
+
+        self.client.post(
+            "/api/v1/cart/release_item/",
+            {"product_id": self.drop.pk, "quantity": 1},
+            content_type="application/json",
+        )
+        self.drop.refresh_from_db()
+        self.assertEqual(self.drop.stock_quantity, 2)
+        self.assertEqual(StockHold.objects.get().quantity, 1)
+
+    def test_release_rejects_non_positive_quantity(self):
+        self.add(2)
+        for quantity in (-50, 0, "x"):
+            response = self.client.post(
+                "/api/v1/cart/release_item/",
+                {"product_id": self.drop.pk, "quantity": quantity},
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(StockHold.objects.get().quantity, 2)
+        with self.assertRaises(ValueError):
+            release_hold(StockHold.objects.get().owner_key, self.drop.pk, -50)
+        self.drop.refresh_from_db()
+        self.assertEqual(self.drop.stock_quantity, 1)
+
+    def test_expired_holds_are_swept(self):
+        self.add(3)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(release_expired_holds(), 1)
+        self.assertFalse(StockHold.objects.exists())
+        self.assertEqual(stock.get(self.drop.pk), 3)
+
+    def test_new_hold_reclaims_expired_stock(self):
+        self.add(2)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        other = Client()
+        response = other.post(
+            "/api/v1/cart/add_item/",
+            {"product_id": self.drop.pk, "quantity": 2},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StockHold.objects.get().quantity, 2)
+        self.drop.refresh_from_db()
+        self.assertEqual(self.drop.stock_quantity, 1)
+
+    def test_checkout_converts_hold(self):
+        self.client.force_login(self.user)
+        self.add(2)
+        self.client.cookies["cart"] = json.dumps({str(self.drop.pk): 1})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/v1/cart/checkout/",
+                {
+                    "shipping_address": {
+                        "full_name": "Ivan",
+                        "phone": "+70000000000",
+                        "city": "Москва",
+                        "address_line": "ул. Тестовая, 1",
+                        "postal_code": "101000",
+                    }
+                },
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        item = OrderItem.objects.get(order_id=response.json()["order_id"])
+        self.assertEqual(item.quantity, 1)
+        self.assertFalse(StockHold.objects.exists())
+        # Излишек брони вернулся на склад, повторного списания не было
+        self.drop.refresh_from_db()
+        self.assertEqual(self.drop.stock_quantity, 2)
+        self.assertFalse(
+            any("FOR UPDATE" in query["sql"] for query in queries.captured_queries)
+        )
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="ivan", password="pass12345")
+        genre = Genre.objects.create(
+            genre_name=Genre.GenreChoices.ROCK_METAL, description="desc"
+        )
+        artist = Artist.objects.create(artist_name="Nirvana", country="US")
+        self.product = Product.objects.create(
+            product_name="Nevermind",
+            description="Album",
+            price=Decimal("60.00"),
+            stock_quantity=10,
+            genre=genre,
+            artist=artist,
+        )
+        self.client.force_login(self.user)
+        self.client.cookies["cart"] = json.dumps({str(self.product.pk): 2})
+
+    def checkout(self, key, city="Москва"):
+        return self.client.post(
+            "/api/v1/cart/checkout/",
+            {
+                "shipping_address": {
+                    "full_name": "Ivan",
+                    "phone": "+70000000000",
+                    "city": city,
+                    "address_line": "ул. Тестовая, 1",
+                    "postal_code": "101000",
+                }
+            },
+            content_type="application/json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_stored_response(self):
+        first = self.checkout("k1")
+        self.assertEqual(first.status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.checkout("k1")
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertFalse(
+            any("shop_main_" in query["sql"] for query in queries.captured_queries)
+        )
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(ShippingAddress.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 8)
+
+        self.assertEqual(self.checkout("k2").status_code, 200)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_replay_survives_cache_loss(self):
+        first = self.checkout("k1")
+        cache.clear()
+        self.assertEqual(self.checkout("k1").json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_conflicting_and_in_flight_requests(self):
+        self.checkout("k1")
+        self.assertEqual(self.checkout("k1", city="Казань").status_code, 422)
+
+        # Тот же запрос с ключом k2 уже выполняется в другом процессе
+        IdempotencyKey.objects.create(
+            owner_key=f"user:{self.user.pk}",
+            key="k2",
+            request_hash=IdempotencyKey.objects.get(key="k1").request_hash,
+            created_at=timezone.now(),
+            expires_at=timezone.now() + timedelta(minutes=1),
+        )
+        self.assertEqual(self.checkout("k2").status_code, 409)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_keys(self):
+        self.checkout("k1")
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        cache.clear()
+        self.assertEqual(self.checkout("k1").status_code, 200)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(purge_expired_keys(timezone.now() + timedelta(days=2)), 1)
+
+
+class ShippingAddressDedupTests(TestCase):
+    address = {
+        "full_name": "Иван Петров",
+        "phone": "8 (900) 123-45-67",
+        "city": "Москва",
+        "address_line": "ул. Тестовая, д. 1",
+        "postal_code": "101 000",
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="ivan", password="pass12345")
+
+    def test_fingerprint_ignores_formatting(self):
+        same = {
+            "full_name": "  иван   петров",
+            "phone": "+7 900 123 45 67",
+            "city": "МОСКВА",
+            "address_line": "ул Тестовая д 1",
+            "postal_code": "101000",
+        }
+        self.assertEqual(address_fingerprint(self.address), address_fingerprint(same))
+        self.assertNotEqual(
+            address_fingerprint(self.address),
+            address_fingerprint({**same, "address_line": "ул Тестовая д 2"}),
+        )
+
+    def test_upsert_reuses_address(self):
+        first = upsert_address(self.user, self.address)
+        second = upsert_address(self.user, {**self.address, "phone": "+79001234567"})
+        self.assertEqual(first.pk, second.pk)
+        # Существующий адрес не перезаписывается: на него ссылаются заказы
+        self.assertEqual(second.phone, self.address["phone"])
+        self.assertEqual(ShippingAddress.objects.get().phone, self.address["phone"])
+        other = User.objects.create_user(username="petr", password="pass12345")
+        self.assertNotEqual(upsert_address(other, self.address).pk, first.pk)
+
+    def test_checkout_reuses_address(self):
+        genre = Genre.objects.create(
+            genre_name=Genre.GenreChoices.ROCK_METAL, description="desc"
+        )
+        artist = Artist.objects.create(artist_name="Nirvana", country="US")
+        product = Product.objects.create(
+            product_name="Nevermind",
+            description="Album",
+            price=Decimal("60.00"),
+            stock_quantity=10,
+            genre=genre,
+            artist=artist,
+        )
+        self.client.force_login(self.user)
+        for city in ("Москва", "москва "):
+            self.client.cookies["cart"] = json.dumps({str(product.pk): 1})
+            response = self.client.post(
+                "/api/v1/cart/checkout/",
+                {"shipping_address": {**self.address, "city": city}},
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 200)
+        address = ShippingAddress.objects.get()
+        self.assertEqual(
+            set(Order.objects.values_list("shipping_address", flat=True)),
+            {address.pk},
+        )
+
+    def test_update_to_duplicate_is_rejected(self):
+        ShippingAddress.objects.create(user=self.user, **self.address)
+        other = ShippingAddress.objects.create(
+            user=self.user, **{**self.address, "full_name": "Петр Иванов"}
+        )
+        admin = User.objects.create_user(
+            username="admin", password="pass12345", is_staff=True
+        )
+        self.client.force_login(admin)
+        response = self.client.patch(
+            f"/api/v1/addresses/{other.pk}/",
+            {"full_name": "ИВАН петров"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(
+            f"/api/v1/addresses/{other.pk}/",
+            {"full_name": "Петр Сидоров"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_merge_duplicates(self):
+        kept = ShippingAddress.objects.create(user=self.user, **self.address)
+        stale = ShippingAddress.objects.create(
+            user=self.user, **{**self.address, "address_line": "ул. Другая, 5"}
+        )
+        order = Order.objects.create(user=self.user, shipping_address=kept)
+        # Поле изменено в обход save(): отпечаток устарел
+        ShippingAddress.objects.filter(pk=stale.pk).update(
+            address_line="Ул. Тестовая д.1"
+        )
+        self.assertEqual(merge_duplicate_addresses(), (1, 1))
+        self.assertEqual(ShippingAddress.objects.get().pk, stale.pk)
+        order.refresh_from_db()
+        self.assertEqual(order.shipping_address_id, stale.pk)
+
+
+class AsyncApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        coupon_cache.invalidate()
+        self.user = User.objects.create_user(username="erin", password="pass12345")
+        rock = Genre.objects.create(
+            genre_name=Genre.GenreChoices.ROCK_METAL, description="desc"
+        )
+        jazz = Genre.objects.create(
+            genre_name=Genre.GenreChoices.JAZZ_BLUES, description="desc"
+        )
+        artist = Artist.objects.create(artist_name="Radiohead", country="UK")
+        self.products = [
+            Product.objects.create(
+                product_name=name,
+                description="Album",
+                price=Decimal(price),
+                stock_quantity=stock_quantity,
+                genre=genre,
+                artist=artist,
+                picture="products/images/cover.png",
+            )
+            for name, price, stock_quantity, genre in [
+                ("OK Computer", "1700.00", 5, rock),
+                ("Kid A", "900.00", 0, rock),
+                ("Amnesiac", "2500.00", 2, jazz),
+            ]
+        ]
+        Review.objects.create(
+            user=self.user, product=self.products[0], rating=5, text="Шедевр"
+        )
+        Favorite.objects.create(user=self.user, product=self.products[1])
+        self.coupon = Coupon.objects.create(code="Vinyl20", discount_percent=20)
+
+    def assertSameResponse(self, path, **params):
+        sync = self.client.get(f"/api/v1/{path}", params)
+        async_ = self.client.get(f"/api/async/{path}", params)
+        self.assertEqual(async_.status_code, sync.status_code)
+        sync_data, async_data = sync.json(), async_.json()
+        if isinstance(sync_data, dict) and "next" in sync_data:
+            # Ссылки на страницы ведут на тот же вариант API
+            for key in ("next", "previous"):
+                link = sync_data.pop(key)
+                if link:
+                    link = link.replace("/api/v1/", "/api/async/")
+                self.assertEqual(async_data.pop(key), link)
+        self.assertEqual(async_data, sync_data)
+        return async_data
+
+    def test_catalog_matches_sync(self):
+        self.assertSameResponse("products/catalog/")
+        self.assertSameResponse("products/catalog/", search="ki", sort="-price")
+        self.client.force_login(self.user)
+        data = self.assertSameResponse(
+            "products/catalog/", facets=1, in_stock=1, page_size=1, sort="price"
+        )
+        self.assertEqual(data["count"], 2)
+        self.assertSameResponse(
+            "products/catalog/", facets=1, genre=Genre.GenreChoices.ROCK_METAL
+        )
+
+    def test_product_and_reviews_match_sync(self):
+        self.assertSameResponse(f"products/{self.products[0].pk}/")
+        self.assertSameResponse("products/999999/")
+        self.assertSameResponse(
+            "reviews/product_reviews/", product_id=self.products[0].pk
+        )
+        self.assertEqual(
+            self.client.get("/api/async/reviews/product_reviews/").status_code, 400
+        )
+
+    def test_coupon_matches_sync(self):
+        for code in ("vinyl20", "UNKNOWN"):
+            responses = [
+                self.client.post(
+                    f"/api/{prefix}/coupons/validate_coupon/",
+                    {"code": code},
+                    content_type="application/json",
+                )
+                for prefix in ("v1", "async")
+            ]
+            self.assertEqual(responses[1].status_code, responses[0].status_code)
+            self.assertEqual(responses[1].json(), responses[0].json())
+
+    async def test_favorite_ids_under_async_client(self):
+        response = await self.async_client.get("/api/async/favorites/ids/")
+        self.assertEqual(response.status_code, 403)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get("/api/async/favorites/ids/")
+        self.assertEqual(response.json(), [self.products[1].pk])
+        self.assertEqual(
+            await cache.aget(f"favorites:ids:{self.user.pk}"), [self.products[1].pk]
+        )
+
+
+class LiveEventsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="fern", password="pass12345")
+        self.product = Product.objects.create(
+            product_name="Blue Train",
+            description="Album",
+            price=Decimal("1500.00"),
+            stock_quantity=4,
+            genre=Genre.objects.create(
+                genre_name=Genre.GenreChoices.JAZZ_BLUES, description="desc"
+            ),
+            artist=Artist.objects.create(artist_name="John Coltrane", country="US"),
+        )
+        self.order = Order.objects.create(user=self.user)
+
+    def committed(self, func, *args):
+        """Выполняет func и колбэки on_commit, как после фиксации транзакции"""
+        with self.captureOnCommitCallbacks(execute=True):
+            return func(*args)
+
+    def deferred(self, func, *args):
+        """Выполняет func, возвращает ее колбэки on_commit не вызывая их"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            func(*args)
+        return callbacks
+
+    def change_status(self, status):
+        order = Order.objects.get(pk=self.order.pk)
+        order.status = status
+        order.save()
+
+    async def test_stock_changes_reach_subscriber_after_commit(self):
+        subscription = live_hub.subscribe([stock_channel(self.product.pk)])
+        try:
+            callbacks = await sync_to_async(self.deferred)(
+                stock.reserve, self.product.pk, 3
+            )
+            self.assertIsNone(await subscription.get(0.05))
+            await sync_to_async(self.committed)(
+                lambda: [callback() for callback in callbacks]
+            )
+            self.assertEqual(
+                await subscription.get(1),
+                {"type": "stock", "product_id": self.product.pk, "stock_quantity": 1},
+            )
+            await sync_to_async(self.committed)(stock.release, self.product.pk, 2)
+            event = await subscription.get(1)
+            self.assertEqual(event["stock_quantity"], 3)
+        finally:
+            live_hub.unsubscribe(subscription)
+
+    async def test_stream_sends_snapshot_then_order_status(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(
+            "/api/async/events/", {"products": f"{self.product.pk},abc"}
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b"retry: 3000\n\n")
+        self.assertIn(b'"stock_quantity": 4', await anext(chunks))
+
+        await sync_to_async(self.committed)(self.change_status, "shipped")
+        chunk = (await anext(chunks)).decode()
+        self.assertTrue(chunk.startswith("event: order_status\n"))
+        event = json.loads(chunk.split("data: ", 1)[1])
+        self.assertEqual(
+            (event["order_id"], event["status"], event["old_status"]),
+            (self.order.pk, "shipped", "pending"),
+        )
+        # Отключение клиента: ASGI-обработчик отменяет задачу ответа
+        pending = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertNotIn(stock_channel(self.product.pk), live_hub._subscribers)
+
+    async def test_failed_snapshot_does_not_leak_subscription(self):
+        with mock.patch.object(stock, "get_many", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                await self.async_client.get(
+                    "/api/async/events/", {"products": str(self.product.pk)}
+                )
+        self.assertNotIn(stock_channel(self.product.pk), live_hub._subscribers)
+
+    def test_stream_requires_channels(self):
+        response = self.client.get("/api/async/events/")
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderStatusEventTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username="gail", password="pass12345")
+        self.staff = User.objects.create_user(
+            username="hank", password="pass12345", is_staff=True
+        )
+        self.order = Order.objects.create(user=self.customer)
+
+    def transitions(self):
+        return list(
+            OrderStatusEvent.objects.filter(order=self.order).values_list(
+                "from_status", "to_status", "actor"
+            )
+        )
+
+    def test_update_view_records_transition_once(self):
+        self.client.force_login(self.staff)
+        response = self.client.post(
+            reverse("order-update", args=[self.order.pk]),
+            {"user": self.customer.pk, "status": "processing"},
+            REMOTE_ADDR="10.0.0.7",
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            self.transitions(),
+            [("", "pending", None), ("pending", "processing", self.staff.pk)],
+        )
+        logs = LogEntry.objects.filter(order=self.order, action="order_updated")
+        self.assertEqual(
+            list(logs.values_list("user", "ip_address")), [(self.staff.pk, "10.0.0.7")]
+        )
+
+    def test_api_update_and_plain_saves(self):
+        self.order.save()
+        self.client.force_login(
+            User.objects.create_superuser(username="ivy", password="pass12345")
+        )
+        response = self.client.patch(
+            f"/api/v1/orders/{self.order.pk}/",
+            {"status": "processing"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.transitions()[-1][:2], ("pending", "processing"))
+        self.assertEqual(len(self.transitions()), 2)
+
+    def test_fulfillment_report(self):
+        start = timezone.now() - timedelta(days=2)
+        second = Order.objects.create(user=self.customer)
+        OrderStatusEvent.objects.all().delete()
+        Order.objects.filter(pk__in=[self.order.pk, second.pk]).update(date_order=start)
+        for order, hours in [(self.order, (0, 2, 10)), (second, (0, 4, 30))]:
+            for (from_status, to_status), offset in zip(
+                [
+                    ("", "pending"),
+                    ("pending", "processing"),
+                    ("processing", "delivered"),
+                ],
+                hours,
+            ):
+                OrderStatusEvent.objects.create(
+                    order=order,
+                    from_status=from_status,
+                    to_status=to_status,
+                    created_at=start + timedelta(hours=offset),
+                )
+
+        report = fulfillment_report()
+        pending, processing, shipped = report["statuses"]
+        self.assertEqual((pending["entered"], pending["left"]), (2, 2))
+        self.assertAlmostEqual(pending["avg"], 3 * 3600)
+        self.assertAlmostEqual(processing["max"], 26 * 3600)
+        self.assertEqual(shipped["entered"], 0)
+        self.assertEqual(report["delivery"]["delivered"], 2)
+        self.assertAlmostEqual(report["delivery"]["p50"], 20 * 3600)
+
+
+class OrderTransitionTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username="jade", password="pass12345")
+        self.admin = User.objects.create_superuser(
+            username="kurt", password="pass12345"
+        )
+        self.orders = [
+            Order.objects.create(user=self.customer, status=status)
+            for status in [
+                "processing",
+                "processing",
+                "processing",
+                "pending",
+                "delivered",
+            ]
+        ]
+
+    def statuses(self):
+        return [Order.objects.get(pk=order.pk).status for order in self.orders]
+
+    def test_state_machine_rejects_forbidden_transitions(self):
+        self.client.force_login(self.admin)
+        response = self.client.patch(
+            f"/api/v1/orders/{self.orders[4].pk}/",
+            {"status": "pending"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            reverse("order-update", args=[self.orders[3].pk]),
+            {"user": self.customer.pk, "status": "delivered"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statuses()[3], "pending")
+
+    def test_bulk_transition_api_reports_moved_and_skipped(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            "/api/v1/orders/bulk_transition/",
+            {"to_status": "shipped", "ids": [order.pk for order in self.orders]},
+            content_type="application/json",
+        )
+        self.assertEqual(
+            response.json(), {"to_status": "shipped", "moved": 3, "skipped": 2}
+        )
+        self.assertEqual(
+            self.statuses(),
+            ["shipped", "shipped", "shipped", "pending", "delivered"],
+        )
+        events = OrderStatusEvent.objects.filter(to_status="shipped")
+        self.assertEqual(
+            set(events.values_list("from_status", "actor")),
+            {("processing", self.admin.pk)},
+        )
+        self.assertEqual(events.count(), 3)
+        self.assertEqual(
+            LogEntry.objects.filter(action="order_updated", user=self.admin).count(), 3
+        )
+
+        response = self.client.post(
+            "/api/v1/orders/bulk_transition/",
+            {"to_status": "cancelled", "status": "pending"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.json()["moved"], 1)
+        response = self.client.post(
+            "/api/v1/orders/bulk_transition/",
+            {"to_status": "cancelled"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_transition_query_count_is_constant(self):
+        more = [
+            Order.objects.create(user=self.customer, status="processing")
+            for _ in range(20)
+        ]
+        with self.assertNumQueries(5):
+            moved, skipped = bulk_transition(
+                Order.objects.filter(pk__in=[order.pk for order in more]), "shipped"
+            )
+        self.assertEqual((moved, skipped), (20, 0))
+
+    def test_admin_action(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            reverse("admin:shop_main_order_changelist"),
+            {
+                "action": "mark_delivered",
+                "_selected_action": [order.pk for order in self.orders],
+            },
+            follow=True,
+        )
+        self.assertContains(response, "Переведено заказов: 0, пропущено")
+        self.assertEqual(self.statuses()[4], "delivered")
+        # В pending не ведет ни один переход, действия для него нет
+        self.assertContains(response, 'value="mark_delivered"')
+        self.assertNotContains(response, 'value="mark_pending"')
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username="lena", password="pass12345"
+        )
+        self.genre = Genre.objects.create(
+            genre_name=Genre.GenreChoices.ROCK_METAL, description="desc"
+        )
+        self.artist = Artist.objects.create(artist_name="Radiohead", country="UK")
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        start = Product.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(username=f"buyer{i}")
+            product = Product.objects.create(
+                product_name=f"OK Computer {i}",
+                description="Album",
+                price=Decimal("1000.00"),
+                stock_quantity=1,
+                genre=self.genre,
+                artist=self.artist,
+            )
+            order = Order.objects.create(user=user)
+            OrderItem.objects.create(
+                order=order, product=product, quantity=1, price_at_order=product.price
+            )
+            Review.objects.create(user=user, product=product, rating=5, text="Класс")
+            create_log_entry("login", user=user, description="Вход в систему")
+
+    def changelist_queries(self, model):
+        url = reverse(f"admin:shop_main_{model}_changelist")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_changelists_do_not_query_per_row(self):
+        models = ["order", "orderitem", "review", "logentry", "orderstatusevent"]
+        self.add_rows(2)
+        before = {model: self.changelist_queries(model) for model in models}
+        self.add_rows(5)
+        after = {model: self.changelist_queries(model) for model in models}
+        self.assertEqual(after, before)
+
+    def test_search_uses_words_and_exact_username(self):
+        self.add_rows(2)
+        url = reverse("admin:shop_main_product_changelist")
+        response = self.client.get(url, {"q": "compu 1"})
+        self.assertEqual(
+            [product.product_name for product in response.context["cl"].result_list],
+            ["OK Computer 1"],
+        )
+        url = reverse("admin:shop_main_logentry_changelist")
+        response = self.client.get(url, {"q": "систем"})
+        self.assertEqual(
+            response.context["cl"].result_count,
+            LogEntry.objects.filter(description__icontains="систем").count(),
+        )
+        self.assertNotEqual(
+            response.context["cl"].result_count, LogEntry.objects.count()
+        )
+        username = Review.objects.first().user.username
+        response = self.client.get(
+            reverse("admin:shop_main_review_changelist"), {"q": username}
+        )
+        self.assertEqual(response.context["cl"].result_count, 1)
+
+    def test_large_table_count_is_estimated(self):
+        self.add_rows(3)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE shop_main_logentry")
+        self.assertEqual(count_rows(LogEntry), (LogEntry.objects.count(), True))
+        with override_settings(COUNT_ESTIMATE_THRESHOLD=0):
+            total, exact = count_rows(LogEntry)
+            self.assertFalse(exact)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse("admin:shop_main_logentry_changelist"))
+        self.assertFalse(
+            [query for query in queries if "COUNT(*)" in query["sql"].upper()]
+        )
+
+    def test_dashboard_marks_estimated_counts(self):
+        # Плитки с итогами видит менеджер
+        manager, _ = Group.objects.get_or_create(name="Manager")
+        self.admin.groups.add(manager)
+        self.add_rows(3)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE shop_main_order")
+        response = self.client.get(reverse("db-index"))
+        self.assertEqual(response.context["total_orders"], Order.objects.count())
+        self.assertTrue(response.context["total_orders_exact"])
+        self.assertContains(response, "точное число")
+        with override_settings(COUNT_ESTIMATE_THRESHOLD=0):
+            response = self.client.get(reverse("db-index"))
+        self.assertFalse(response.context["total_orders_exact"])
+        tables = {table["name"]: table for table in response.context["tables"]}
+        self.assertFalse(tables["Заказы"]["exact"])
+        self.assertContains(response, "оценка по статистике БД")
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_plan_dataset()
+
+    def test_critical_queries_use_indexes(self):
+        for name, result in run_checks(self.data).items():
+            with self.subTest(query=name):
+                self.assertEqual(result["problems"], [])
+
+    def test_plans_match_baseline(self):
+        baseline = load_baseline()
+        for name, result in run_checks(self.data).items():
+            with self.subTest(query=name):
+                diff = plan_diff(name, baseline[name]["outline"], result["outline"])
+                self.assertFalse(diff, "\n".join(diff))
+
+    def test_diff_shows_changed_access_path(self):
+        old = ["Index Scan using shop_main_review_product_id on shop_main_review"]
+        new = ["Seq Scan on shop_main_review"]
+        self.assertEqual(plan_diff("reviews", old, old), [])
+        diff = plan_diff("reviews", old, new)
+        self.assertIn("-" + old[0], diff)
+        self.assertIn("+" + new[0], diff)
+
+
+class BestsellersTests(TestCase):
+    def test_sums_quantity_per_product(self):
+        data = seed_dataset(products=5, orders=6, items_per_order=2, reviews=0)
+        top = bestsellers(3)
+        sold = {}
+        for item in OrderItem.objects.all():
+            sold[item.product_id] = sold.get(item.product_id, 0) + item.quantity
+        self.assertEqual(
+            [row["total_sold"] for row in top], sorted(sold.values(), reverse=True)[:3]
+        )
+        names = {product.pk: product.product_name for product in data["products"]}
+        for row in top:
+            self.assertEqual(row["total_sold"], sold[row["product__id"]])
+            self.assertEqual(row["product__product_name"], names[row["product__id"]])
+
+
+class HomePageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.data = seed_dataset(products=6, orders=4, items_per_order=2, reviews=0)
+
+    def test_payload_is_cached_and_shared_with_api(self):
+        payload = home_payload()
+        self.assertEqual(
+            sum(genre["product_count"] for genre in payload["genres"]),
+            Product.objects.count(),
+        )
+        self.assertEqual(
+            [row["id"] for row in payload["bestsellers"]],
+            [row["product__id"] for row in bestsellers(8)],
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(home_payload(), payload)
+            response = self.client.get("/api/v1/home/")
+        self.assertEqual(response.json(), payload)
+
+        response = self.client.get(reverse("main"))
+        self.assertContains(response, 'id="home-data"')
+        self.assertEqual(response.context["home"], payload)
+
+    def test_catalog_change_refreshes_payload(self):
+        home_payload()
+        product = self.data["products"][0]
+        product.product_name = "Новое название"
+        product.save()
+        self.assertIn(
+            "Новое название",
+            [row["product_name"] for row in home_payload()["new_arrivals"]],
+        )
+
+
+@override_settings(DATABASE_REPLICAS=["local_replica"])
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {"default", "local_replica"}
+
+    def setUp(self):
+        genre = Genre.objects.create(
+            genre_name=Genre.GenreChoices.ROCK_METAL, description="desc"
+        )
+        artist = Artist.objects.create(artist_name="Radiohead", country="UK")
+        self.product = Product.objects.create(
+            product_name="OK Computer",
+            description="Album",
+            price=Decimal("1000.00"),
+            stock_quantity=5,
+            genre=genre,
+            artist=artist,
+        )
+        self.user = User.objects.create_user(username="anna", password="pass12345")
+
+    def tables_read(self, url):
+        """(таблицы на реплике, таблицы в default) при GET url"""
+        replica = connections["local_replica"]
+        with CaptureQueriesContext(replica) as on_replica:
+            with CaptureQueriesContext(connection) as on_primary:
+                self.assertEqual(self.client.get(url).status_code, 200)
+        return (
+            " ".join(query["sql"] for query in on_replica),
+            " ".join(query["sql"] for query in on_primary),
+        )
+
+    def test_catalog_reads_from_replica(self):
+        replica, primary = self.tables_read("/api/v1/products/catalog/")
+        self.assertIn('"shop_main_product"', replica)
+        self.assertNotIn('"shop_main_product"', primary)
+
+    def test_async_catalog_reads_from_replica(self):
+        replica = connections["local_replica"]
+        with CaptureQueriesContext(replica) as on_replica:
+            # Синхронные вызовы ORM из async-представления выполняются
+            # в этом же потоке, поэтому запросы видны CaptureQueriesContext
+            response = async_to_sync(self.async_client.get)(
+                "/api/async/products/catalog/"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            '"shop_main_product"', " ".join(query["sql"] for query in on_replica)
+        )
+
+    def test_reads_pinned_to_primary_after_write(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            "/api/v1/favorites/toggle/", {"product_id": self.product.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies["db_pin"]["max-age"], 5)
+
+        replica, primary = self.tables_read("/api/v1/products/catalog/")
+        self.assertNotIn('"shop_main_product"', replica)
+        self.assertIn('"shop_main_favorite"', primary)
+
+        # Cookie истекла — чтение снова с реплики
+        del self.client.cookies["db_pin"]
+        replica, primary = self.tables_read("/api/v1/products/catalog/")
+        self.assertIn('"shop_main_favorite"', replica)
+
+    def test_reports_transactions_and_writes(self):
+        admin = User.objects.create_superuser(username="lena", password="pass12345")
+        self.client.force_login(admin)
+        replica, primary = self.tables_read(reverse("db-index"))
+        self.assertIn('"shop_main_orderitem"', replica)
+        self.assertNotIn('"shop_main_orderitem"', primary)
+
+        with request_scope(pinned=False), replica_reads():
+            self.assertEqual(read_alias(), "local_replica")
+            with transaction.atomic():
+                self.assertEqual(read_alias(), "default")
+            Review.objects.create(
+                user=self.user, product=self.product, rating=5, text="Класс"
+            )
+            self.assertEqual(read_alias(), "default")
@@ -0,0 +1,247 @@
+"""Учет просмотров товаров без записи в БД на каждый хит.
+
+Каждый просмотр увеличивает счетчики в памяти процесса, которые раз в
+PRODUCT_VIEW_FLUSH_INTERVAL секунд сбрасываются в ProductViewStat одним
+INSERT ... ON CONFLICT DO UPDATE. Запись product_viewed в журнал делается
+только для первого просмотра товара посетителем в окне
+PRODUCT_VIEW_DEDUP_WINDOW (повторы ищутся в небольшом LRU в памяти) и с
+вероятностью PRODUCT_VIEW_LOG_SAMPLE_RATE. Боты не учитываются.
+
+Запрос только обновляет буфер и не обращается к БД: счетчики и записи
+журнала пишет фоновый поток (названия товаров для журнала загружаются одним
+запросом на весь сброс, время записи — время сброса). При штатной остановке
+процесса буфер сбрасывается в atexit; при аварийной (SIGKILL, OOM) теряются
+просмотры не более чем за последние PRODUCT_VIEW_FLUSH_INTERVAL секунд.
+"""
+
+import atexit
+import logging
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from .background import BackgroundFlusher
+from .logger_utils import get_client_ip, remember_active_log_user
+from .models import LogEntry, Product, ProductViewStat
+from .trending import record_event
+
+logger = logging.getLogger(__name__)
+
+BOT_USER_AGENT_RE = re.compile(
+    r"bot|crawl|spider|slurp|bingpreview|facebookexternalhit|headless|"
+    r"python-requests|curl|wget|httpclient",
+    re.IGNORECASE,
+)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def is_bot(user_agent):
+    """Похож ли User-Agent на робота (пустой тоже считаем роботом)"""
+    return not user_agent or bool(BOT_USER_AGENT_RE.search(user_agent))
+
+
+class RecentViews:
+    """LRU ключей (посетитель, товар) с временем последнего просмотра"""
+
+    def __init__(self, max_size=None, window=None):
+        self._max_size = max_size
+        self._window = window
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return _setting("PRODUCT_VIEW_DEDUP_SIZE", 10000)
+
+    @property
+    def window(self):
+        if self._window is not None:
+            return self._window
+        return _setting("PRODUCT_VIEW_DEDUP_WINDOW", 30 * 60)
+
+    def is_repeat(self, key, now=None):
+        """Был ли ключ в окне дедупликации; отмечает текущий просмотр"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            last_seen = self._seen.pop(key, None)
+            self._seen[key] = now
+            while len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+        return last_seen is not None and now - last_seen < self.window
+
+    def clear(self):
+        with self._lock:
+            self._seen.clear()
+
+
+class ViewCounters:
+    """Счетчики просмотров {(product_id, date): [views, unique_views]} и
+    записи журнала, ожидающие сброса в БД"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._entries = []
+        self._flushed_at = time.monotonic()
+        self._flusher = BackgroundFlusher(
+            "product-view-flusher",
+            self.flush,
+            lambda: _setting("PRODUCT_VIEW_FLUSH_INTERVAL", 60),
+        )
+
+    def add(self, product_id, day, unique):
+        with self._lock:
+            counts = self._counts.setdefault((product_id, day), [0, 0])
+            counts[0] += 1
+            if unique:
+                counts[1] += 1
+
+    def log(self, product_id, user_id, ip_address, user_agent):
+        """Ставит запись product_viewed в очередь до следующего сброса"""
+        with self._lock:
+            self._entries.append((product_id, user_id, ip_address, user_agent))
+
+    def pending(self):
+        with self._lock:
+            return {key: tuple(value) for key, value in self._counts.items()}
+
+    def flush_due(self):
+        interval = _setting("PRODUCT_VIEW_FLUSH_INTERVAL", 60)
+        max_keys = _setting("PRODUCT_VIEW_FLUSH_MAX_KEYS", 1000)
+        return (
+            time.monotonic() - self._flushed_at >= interval
+            or len(self._counts) >= max_keys
+        )
+
+    def start(self):
+        """Запускает фоновый сброс; если буфер переполнен, будит его сразу"""
+        self._flusher.start()
+        if self.flush_due():
+            self._flusher.wake()
+
+    def flush(self):
+        """Сбрасывает накопленные счетчики и журнал в БД, возвращает число
+        строк счетчиков"""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            entries, self._entries = self._entries, []
+            self._flushed_at = time.monotonic()
+        if entries:
+            try:
+                _write_log_entries(entries)
+            except DatabaseError:
+                # Журнал выборочный: потеря его части не искажает счетчики
+                logger.exception("Не удалось записать просмотры в журнал")
+        if not counts:
+            return 0
+        try:
+            _upsert_view_stats(counts)
+        except DatabaseError:
+            logger.exception("Не удалось сохранить счетчики просмотров")
+            # Возвращаем числа в буфер, чтобы не потерять их до следующего сброса
+            with self._lock:
+                for key, (views, unique_views) in counts.items():
+                    current = self._counts.setdefault(key, [0, 0])
+                    current[0] += views
+                    current[1] += unique_views
+            return 0
+        return len(counts)
+
+    def clear(self):
+        with self._lock:
+            self._counts = {}
+            self._entries = []
+
+
+def _write_log_entries(entries):
+    """Пишет записи product_viewed; названия товаров — одним запросом"""
+    names = dict(
+        Product.objects.filter(pk__in={entry[0] for entry in entries}).values_list(
+            "pk", "product_name"
+        )
+    )
+    LogEntry.objects.bulk_create(
+        [
+            LogEntry(
+                action="product_viewed",
+                user_id=user_id,
+                description=f"Просмотр товара '{names[product_id]}'",
+                ip_address=ip_address,
+                user_agent=user_agent,
+                product_id=product_id,
+            )
+            # Товары, удаленные до сброса или не существовавшие, пропускаются
+            for product_id, user_id, ip_address, user_agent in entries
+            if product_id in names
+        ]
+    )
+    for user_id in {entry[1] for entry in entries if entry[1] is not None}:
+        remember_active_log_user(user_id)
+
+
+def _upsert_view_stats(counts):
+    table = ProductViewStat._meta.db_table
+    product_table = Product._meta.db_table
+    rows = ", ".join(["(%s, %s::date, %s, %s)"] * len(counts))
+    params = []
+    for (product_id, day), (views, unique_views) in counts.items():
+        params.extend([product_id, day, views, unique_views])
+    # JOIN отбрасывает товары, удаленные до сброса или не существовавшие
+    sql = f"""
+        INSERT INTO {table} (product_id, date, views, unique_views)
+        SELECT v.product_id, v.date, v.views, v.unique_views
+        FROM (VALUES {rows}) AS v (product_id, date, views, unique_views)
+        JOIN {product_table} p ON p.id = v.product_id
+        ON CONFLICT (product_id, date) DO UPDATE SET
+            views = {table}.views + EXCLUDED.views,
+            unique_views = {table}.unique_views + EXCLUDED.unique_views
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+recent_views = RecentViews()
+view_counters = ViewCounters()
+atexit.register(view_counters.flush)
+
+
+def flush_view_counters():
+    return view_counters.flush()
+
+
+def record_product_view(request, product_id):
+    """Учитывает просмотр товара без запросов к БД.
+
+    Возвращает True, если просмотр поставлен в очередь журнала.
+    """
+    user_agent = request.META.get("HTTP_USER_AGENT", "")[:255]
+    if is_bot(user_agent):
+        return False
+
+    user = request.user if request.user.is_authenticated else None
+    ip_address = get_client_ip(request)
+    visitor = f"u{user.pk}" if user else f"ip{ip_address}"
+    unique = not recent_views.is_repeat((visitor, product_id))
+
+    view_counters.add(product_id, timezone.localdate(), unique)
+    if _setting("PRODUCT_VIEW_BACKGROUND_FLUSH", True):
+        view_counters.start()
+    if unique:
+        record_event("view", product_id)
+
+    if not unique or random.random() >= _setting("PRODUCT_VIEW_LOG_SAMPLE_RATE", 1.0):
+        return False
+
+    view_counters.log(product_id, user.pk if user else None, ip_address, user_agent)
+    return True
@@ -0,0 +1,291 @@
+"""Популярные сейчас товары: затухающие счетчики просмотров, корзин и покупок.
+
+Вклад события со временем убывает экспоненциально с периодом полураспада
+TRENDING_HALF_LIFE. События копятся в памяти процесса, и фоновый поток раз
+в TRENDING_FLUSH_INTERVAL секунд добавляет их в TrendingScore одним
+INSERT ... ON CONFLICT, где уже сохраненные значения затухают прямо в SQL,
+поэтому несколько процессов могут писать в таблицу одновременно.
+
+Рейтинг пересчитывается из TrendingScore отдельно, не чаще раза в
+TRENDING_REFRESH_INTERVAL секунд при чтении: топ товаров в целом и по
+каждому жанру хранится в памяти уже сериализованным, и чтение сводится к
+срезу списка.
+
+Таблицу можно пересобрать из истории LogEntry и OrderItem командой
+rebuild_trending. Пересобираются только просмотры и покупки: добавления в
+корзину в журнал не пишутся, и после пересборки их вклад равен нулю, пока
+не накопятся новые события.
+"""
+
+import atexit
+import heapq
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .background import BackgroundFlusher
+from .fast_serializers import serialize_products
+from .models import LogEntry, Order, OrderItem, Product, TrendingScore
+
+logger = logging.getLogger(__name__)
+
+EVENT_KINDS = ("view", "cart", "purchase")
+DEFAULT_WEIGHTS = {"view": 1.0, "cart": 3.0, "purchase": 10.0}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def decay_rate():
+    """Коэффициент λ в exp(-λt), t в секундах"""
+    return math.log(2) / _setting("TRENDING_HALF_LIFE", 24 * 60 * 60)
+
+
+def weights():
+    return {**DEFAULT_WEIGHTS, **_setting("TRENDING_WEIGHTS", {})}
+
+
+class TrendingEvents:
+    """Буфер событий, еще не записанных в TrendingScore.
+
+    Вклад события хранится умноженным на exp(λ(t - base)), так что при записи
+    весь буфер приводится к текущему моменту одним множителем.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._base = time.time()
+        self._flusher = BackgroundFlusher(
+            "trending-flusher",
+            self.flush,
+            lambda: _setting("TRENDING_FLUSH_INTERVAL", 60),
+        )
+
+    def start(self):
+        """Запускает фоновый сброс буфера в TrendingScore"""
+        self._flusher.start()
+
+    def add(self, kind, product_id, amount=1, at=None):
+        index = EVENT_KINDS.index(kind)
+        at = time.time() if at is None else at
+        with self._lock:
+            growth = math.exp(decay_rate() * (at - self._base))
+            counts = self._counts.setdefault(product_id, [0.0, 0.0, 0.0])
+            counts[index] += amount * growth
+
+    def flush(self):
+        """Добавляет накопленные события в TrendingScore, возвращает число строк"""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            base, self._base = self._base, time.time()
+        if not counts:
+            return 0
+        now = timezone.now()
+        factor = math.exp(-decay_rate() * (now.timestamp() - base))
+        rows = [
+            (product_id, *(value * factor for value in values))
+            for product_id, values in counts.items()
+        ]
+        try:
+            _add_scores(rows, now)
+        except DatabaseError:
+            logger.exception("Не удалось сохранить счетчики популярности")
+            with self._lock:
+                growth = math.exp(decay_rate() * (now.timestamp() - self._base))
+                for product_id, *values in rows:
+                    current = self._counts.setdefault(product_id, [0.0, 0.0, 0.0])
+                    for index, value in enumerate(values):
+                        current[index] += value * growth
+            return 0
+        return len(rows)
+
+    def clear(self):
+        with self._lock:
+            self._counts = {}
+            self._base = time.time()
+
+
+def _add_scores(rows, now):
+    table = TrendingScore._meta.db_table
+    product_table = Product._meta.db_table
+    values = ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+    params = [value for row in rows for value in row]
+    # Сохраненные значения затухают за время с их последнего обновления
+    factor = (
+        "exp(-%s * GREATEST(extract(epoch FROM "
+        f"EXCLUDED.updated_at - {table}.updated_at), 0))"
+    )
+    # JOIN отбрасывает товары, удаленные до записи
+    sql = f"""
+        INSERT INTO {table} (product_id, views, carts, purchases, updated_at)
+        SELECT v.product_id, v.views, v.carts, v.purchases, %s
+        FROM (VALUES {values}) AS v (product_id, views, carts, purchases)
+        JOIN {product_table} p ON p.id = v.product_id
+        ON CONFLICT (product_id) DO UPDATE SET
+            views = {table}.views * {factor} + EXCLUDED.views,
+            carts = {table}.carts * {factor} + EXCLUDED.carts,
+            purchases = {table}.purchases * {factor} + EXCLUDED.purchases,
+            updated_at = EXCLUDED.updated_at
+    """
+    rate = decay_rate()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [now, *params, rate, rate, rate])
+
+
+class TrendingRanking:
+    """Рейтинг, пересчитываемый не чаще раза в TRENDING_REFRESH_INTERVAL"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._top = None
+        self._built_at = 0.0
+
+    def _stale(self):
+        interval = _setting("TRENDING_REFRESH_INTERVAL", 60)
+        return self._top is None or time.monotonic() - self._built_at > interval
+
+    def refresh(self):
+        """Пересчитывает рейтинг из TrendingScore; буфер событий не трогает"""
+        self._top = build_ranking()
+        self._built_at = time.monotonic()
+
+    def top(self, genre_id=None, limit=None):
+        """Список сериализованных товаров; genre_id=None — по всем жанрам"""
+        top = self._top
+        if self._stale():
+            # Пересчитывает один поток, остальные отдают прежний рейтинг
+            if self._lock.acquire(blocking=top is None):
+                try:
+                    if self._stale():
+                        self.refresh()
+                    top = self._top
+                finally:
+                    self._lock.release()
+        limit = limit or _setting("TRENDING_TOP_N", 10)
+        return top.get(genre_id, [])[:limit]
+
+    def invalidate(self):
+        with self._lock:
+            self._top = None
+
+
+def score_rows(rows, now):
+    """[(product_id, genre_id, score)] для строк TrendingScore на момент now"""
+    w = weights()
+    rate = decay_rate()
+    result = []
+    for product_id, genre_id, views, carts, purchases, updated_at in rows:
+        age = max((now - updated_at).total_seconds(), 0)
+        raw = w["view"] * views + w["cart"] * carts + w["purchase"] * purchases
+        result.append((product_id, genre_id, raw * math.exp(-rate * age)))
+    return result
+
+
+def build_ranking(now=None):
+    """{None: топ по всем товарам, genre_id: топ жанра} из TrendingScore"""
+    now = now or timezone.now()
+    limit = _setting("TRENDING_TOP_N", 10)
+    rows = TrendingScore.objects.values_list(
+        "product_id",
+        "product__genre_id",
+        "views",
+        "carts",
+        "purchases",
+        "updated_at",
+    )
+    scored = [row for row in score_rows(rows, now) if row[2] >= 0.01]
+
+    by_genre = {None: heapq.nlargest(limit, scored, key=lambda row: row[2])}
+    genres = {}
+    for row in scored:
+        genres.setdefault(row[1], []).append(row)
+    for genre_id, genre_rows in genres.items():
+        by_genre[genre_id] = heapq.nlargest(limit, genre_rows, key=lambda row: row[2])
+
+    product_ids = {row[0] for top in by_genre.values() for row in top}
+    products = {
+        product["id"]: product
+        for product in serialize_products(Product.objects.filter(pk__in=product_ids))
+    }
+    return {
+        genre_id: [
+            {**products[product_id], "trending_score": round(score, 3)}
+            for product_id, _, score in top
+            if product_id in products
+        ]
+        for genre_id, top in by_genre.items()
+    }
+
+
+def rebuild_from_history(days=None, now=None):
+    """Пересобирает TrendingScore из LogEntry и OrderItem за последние days дней
+
+    Восстанавливаются только просмотры (product_viewed) и покупки: добавления
+    в корзину в истории нет, carts после пересборки нулевые. Просмотры в
+    журнале пишутся с выборкой (PRODUCT_VIEW_LOG_SAMPLE_RATE), поэтому каждый
+    учитывается с весом 1 / доля выборки.
+    """
+    now = now or timezone.now()
+    days = days or _setting("TRENDING_HISTORY_DAYS", 30)
+    since = now - timedelta(days=days)
+    view_weight = 1.0 / (_setting("PRODUCT_VIEW_LOG_SAMPLE_RATE", 1.0) or 1.0)
+
+    table = TrendingScore._meta.db_table
+    log_table = LogEntry._meta.db_table
+    item_table = OrderItem._meta.db_table
+    order_table = Order._meta.db_table
+    sql = f"""
+        INSERT INTO {table} (product_id, views, carts, purchases, updated_at)
+        SELECT product_id, SUM(v * d), 0, SUM(p * d), %(now)s
+        FROM (
+            SELECT product_id, v, p,
+                   exp(-%(rate)s * extract(epoch FROM %(now)s - at)) AS d
+            FROM (
+                SELECT product_id, %(view_weight)s AS v, 0 AS p,
+                       created_at AS at
+                FROM {log_table}
+                WHERE action = 'product_viewed'
+                  AND product_id IS NOT NULL
+                  AND created_at >= %(since)s
+                UNION ALL
+                SELECT i.product_id, 0, i.quantity, o.date_order
+                FROM {item_table} i
+                JOIN {order_table} o ON o.id = i.order_id
+                WHERE o.date_order >= %(since)s AND o.status <> 'cancelled'
+            ) events
+        ) decayed
+        GROUP BY product_id
+    """
+    params = {
+        "now": now,
+        "since": since,
+        "rate": decay_rate(),
+        "view_weight": view_weight,
+    }
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            inserted = cursor.rowcount
+    trending.invalidate()
+    return inserted
+
+
+events = TrendingEvents()
+trending = TrendingRanking()
+atexit.register(events.flush)
+
+
+def record_event(kind, product_id, amount=1):
+    """Учитывает просмотр ("view"), добавление в корзину или покупку"""
+    events.add(kind, product_id, amount)
+    if _setting("TRENDING_BACKGROUND_FLUSH", True):
+        events.start()
@@ -24,7 +24,7 @@ from reportlab.platypus import (
     Spacer,
 )
 from reportlab.lib.units import mm
-from django.db.models import Sum
+from django.db.models import F, Sum
 
 from django.shortcuts import render, HttpResponse, redirect
 from django.http import JsonResponse
@@ -64,11 +64,28 @@ from .models import (
     Coupon,
     LogEntry,
 )
+from .queries import (
+    bestsellers,
+    filter_log_entries,
+    order_read_queryset,
+    orders_visible_to,
+)
+from .pagination import paginate_keyset
+from .logger_utils import get_active_log_user_ids
+from .counts import count_rows, table_counts
+from .replicas import ReplicaViewMixin
+from .home import home_payload
 
 
 class GenreList(TemplateView):
     template_name = "main.html"
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Встраивается в страницу: main.js не делает запросов к API
+        context["home"] = home_payload()
+        return context
+
 
 class ProductList(TemplateView):
     template_name = "catalog.html"
@@ -130,29 +147,11 @@ class ProductDetailView(TemplateView):
     template_name = "product_detail.html"
 
     def get(self, request, *args, **kwargs):
-        # Логируем просмотр товара
-        from .logger_utils import create_log_entry
+        # Учитываем просмотр товара (счетчики + выборочная запись в журнал)
+        from .tracking import record_product_view
         product_id = kwargs.get('pk')
         if product_id:
-            try:
-                product = Product.objects.get(pk=product_id)
-                x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-                if x_forwarded_for:
-                    ip_address = x_forwarded_for.split(',')[0]
-                else:
-                    ip_address = request.META.get('REMOTE_ADDR')
-                user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
-                
-                create_log_entry(
-                    action='product_viewed',
-                    user=request.user if request.user.is_authenticated else None,
-                    description=f"Просмотр товара '{product.product_name}'",
-                    ip_address=ip_address,
-                    user_agent=user_agent,
-                    product=product,
-                )
-            except Product.DoesNotExist:
-                pass
+            record_product_view(request, product_id)
         
         return super().get(request, *args, **kwargs)
 
@@ -189,6 +188,7 @@ class AdminOverviewView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
             raise Http404()
         context["model_name"] = model.__name__
         context["records"] = model.objects.all()[:100]
+        context["record_count"], context["record_count_exact"] = count_rows(model)
         context["admin_add_url"] = reverse_lazy(
             "admin:%s_%s_add" % (model._meta.app_label, model._meta.model_name)
         )
@@ -433,17 +433,12 @@ class OrderListView(PermissionRequiredMixin, ListView):
         )
 
     def get_queryset(self):
-        if self.request.user.is_staff:
-            return Order.objects.select_related(
-                "user", "shipping_address", "coupon"
-            ).all()
-        return Order.objects.filter(user=self.request.user).select_related(
-            "shipping_address", "coupon"
-        )
+        return orders_visible_to(self.request.user)
 
 
 class OrderDetailView(PermissionRequiredMixin, DetailView):
     model = Order
+    queryset = order_read_queryset()
     template_name = "order/detail.html"
 
     def has_permission(self):
@@ -488,36 +483,9 @@ class OrderUpdateView(PermissionRequiredMixin, UpdateView):
     
     def get_object(self, queryset=None):
         obj = super().get_object(queryset)
-        # Сохраняем старый статус для логирования
-        obj._old_status = obj.status
+        # Смену статуса записывает сигнал, ему нужен запрос сотрудника
+        obj._status_request = self.request
         return obj
-    
-    def form_valid(self, form):
-        order = form.instance
-        old_status = getattr(order, '_old_status', None)
-        
-        response = super().form_valid(form)
-        
-        # Логируем изменение статуса
-        if old_status and old_status != order.status:
-            from .logger_utils import create_log_entry
-            x_forwarded_for = self.request.META.get('HTTP_X_FORWARDED_FOR')
-            if x_forwarded_for:
-                ip_address = x_forwarded_for.split(',')[0]
-            else:
-                ip_address = self.request.META.get('REMOTE_ADDR')
-            user_agent = self.request.META.get('HTTP_USER_AGENT', '')[:255]
-            
-            create_log_entry(
-                action='order_updated',
-                user=self.request.user,
-                description=f"Статус заказа #{order.id} изменен с '{old_status}' на '{order.status}'",
-                ip_address=ip_address,
-                user_agent=user_agent,
-                order=order,
-            )
-        
-        return response
 
 
 class OrderDeleteView(PermissionRequiredMixin, DeleteView):
@@ -722,7 +690,7 @@ class CouponDeleteView(PermissionRequiredMixin, DeleteView):
         )
 
 
-class DatabaseOverviewView(PermissionRequiredMixin, TemplateView):
+class DatabaseOverviewView(ReplicaViewMixin, PermissionRequiredMixin, TemplateView):
     template_name = "db/index.html"
     login_url = reverse_lazy("login")
 
@@ -749,11 +717,7 @@ class DatabaseOverviewView(PermissionRequiredMixin, TemplateView):
         ctx["show_orders"] = ctx["show_all"] or is_manager
 
         if ctx["show_all"]:
-            orders = (
-                Order.objects.select_related("user", "shipping_address", "coupon")
-                .prefetch_related("orderitem_set")
-                .all()
-            )
+            orders = order_read_queryset()
             ctx["orders"] = orders
             ctx["order_items"] = OrderItem.objects.select_related(
                 "order", "product"
@@ -763,14 +727,10 @@ class DatabaseOverviewView(PermissionRequiredMixin, TemplateView):
                 "user"
             ).all()
             ctx["coupons"] = Coupon.objects.all()
-            ctx["users"] = User.objects.all()
+            ctx["users"] = User.objects.prefetch_related("groups")
             ctx["groups"] = Group.objects.all()
         elif is_manager:
-            orders = (
-                Order.objects.select_related("user", "shipping_address", "coupon")
-                .prefetch_related("orderitem_set")
-                .all()
-            )
+            orders = order_read_queryset()
             ctx["orders"] = orders
             ctx["order_items"] = OrderItem.objects.select_related(
                 "order", "product"
@@ -791,98 +751,86 @@ class DatabaseOverviewView(PermissionRequiredMixin, TemplateView):
             ctx["users"] = []
             ctx["groups"] = []
 
+        # Большие таблицы считаются по статистике планировщика, а не COUNT(*)
+        counts = table_counts(
+            [
+                Genre,
+                Artist,
+                Product,
+                Order,
+                Review,
+                OrderItem,
+                ShippingAddress,
+                Coupon,
+                User,
+                Group,
+            ]
+        )
+
+        def table(name, model, url):
+            count, exact = counts[model]
+            return {"name": name, "count": count, "exact": exact, "url": url}
+
         ctx["tables"] = [
-            {"name": "Жанры", "count": Genre.objects.count(), "url": "genre-list"},
-            {
-                "name": "Исполнители",
-                "count": Artist.objects.count(),
-                "url": "artist-list",
-            },
-            {"name": "Товары", "count": Product.objects.count(), "url": "product-list"},
+            table("Жанры", Genre, "genre-list"),
+            table("Исполнители", Artist, "artist-list"),
+            table("Товары", Product, "product-list"),
         ]
         if ctx["show_orders"]:
-            ctx["tables"].append(
-                {"name": "Заказы", "count": Order.objects.count(), "url": "order-list"}
-            )
+            ctx["tables"].append(table("Заказы", Order, "order-list"))
             if ctx["show_all"]:
+                ctx["tables"].append(table("Отзывы", Review, "review-list"))
                 ctx["tables"].append(
-                    {
-                        "name": "Отзывы",
-                        "count": Review.objects.count(),
-                        "url": "review-list",
-                    }
-                )
-                ctx["tables"].append(
-                    {
-                        "name": "Позиции заказа",
-                        "count": OrderItem.objects.count(),
-                        "url": "orderitem-list",
-                    }
+                    table("Позиции заказа", OrderItem, "orderitem-list")
                 )
                 ctx["tables"].append(
-                    {
-                        "name": "Адреса доставки",
-                        "count": ShippingAddress.objects.count(),
-                        "url": "shippingaddress-list",
-                    }
+                    table("Адреса доставки", ShippingAddress, "shippingaddress-list")
                 )
-            ctx["tables"].append(
-                {
-                    "name": "Купоны",
-                    "count": Coupon.objects.count(),
-                    "url": "coupon-list",
-                }
-            )
+            ctx["tables"].append(table("Купоны", Coupon, "coupon-list"))
         if ctx["show_all"]:
             ctx["tables"].extend(
                 [
-                    {"name": "Пользователи", "count": User.objects.count(), "url": "#"},
-                    {
-                        "name": "Роли (Группы)",
-                        "count": Group.objects.count(),
-                        "url": "#",
-                    },
+                    table("Пользователи", User, "#"),
+                    table("Роли (Группы)", Group, "#"),
                 ]
             )
 
         from django.db.models import Sum, Count
 
-        order_items = OrderItem.objects.all()
-        total_revenue = sum(item.price_at_order * item.quantity for item in order_items)
-        ctx["total_revenue"] = float(total_revenue)
-        ctx["total_orders"] = Order.objects.count()
-        ctx["total_products"] = Product.objects.count()
-        ctx["total_customers"] = User.objects.count()
-
-        popular_products = (
-            OrderItem.objects.values("product__product_name", "product__id")
-            .annotate(total_sold=Sum("quantity"))
-            .order_by("-total_sold")[:5]
-        )
-        ctx["popular_products"] = list(popular_products)
+        total_revenue = OrderItem.objects.aggregate(
+            total=Sum(F("price_at_order") * F("quantity"))
+        )["total"]
+        ctx["total_revenue"] = float(total_revenue or 0)
+        ctx["total_orders"], ctx["total_orders_exact"] = counts[Order]
+        ctx["total_products"], ctx["total_products_exact"] = counts[Product]
+        ctx["total_customers"], ctx["total_customers_exact"] = counts[User]
+
+        ctx["popular_products"] = bestsellers(5)
 
         genre_stats = []
-        for genre in Genre.objects.all():
-            product_count = Product.objects.filter(genre=genre).count()
-            if product_count > 0:
-                genre_stats.append(
-                    {"name": genre.get_genre_name_display(), "count": product_count}
-                )
+        genres = Genre.objects.annotate(product_count=Count("product")).filter(
+            product_count__gt=0
+        )
+        for genre in genres:
+            genre_stats.append(
+                {"name": genre.get_genre_name_display(), "count": genre.product_count}
+            )
         ctx["genre_stats"] = genre_stats
 
-        artist_stats = []
-        for artist in Artist.objects.all():
-            product_count = Product.objects.filter(artist=artist).count()
-            if product_count > 0:
-                artist_stats.append(
-                    {"name": artist.artist_name, "count": product_count}
-                )
-        ctx["artist_stats"] = artist_stats[:10]  # Топ 10
+        artists = (
+            Artist.objects.annotate(product_count=Count("product"))
+            .filter(product_count__gt=0)
+            .order_by("-product_count", "artist_name")[:10]
+        )
+        ctx["artist_stats"] = [
+            {"name": artist.artist_name, "count": artist.product_count}
+            for artist in artists
+        ]  # Топ 10
 
         return ctx
 
 
-class GeneratePDFReportView(PermissionRequiredMixin, View):
+class GeneratePDFReportView(ReplicaViewMixin, PermissionRequiredMixin, View):
     """View для генерации PDF отчета с общей выручкой"""
 
     def has_permission(self):
@@ -913,21 +861,19 @@ class GeneratePDFReportView(PermissionRequiredMixin, View):
             elements.append(Paragraph("Report", title_style))
             elements.append(Spacer(1, 20))
 
-            order_items = OrderItem.objects.all()
-            total_revenue = sum(
-                item.price_at_order * item.quantity for item in order_items
-            )
-
-            total_orders = Order.objects.count()
-            total_products = Product.objects.count()
-            total_customers = User.objects.count()
+            total_revenue = OrderItem.objects.aggregate(
+                total=Sum(F("price_at_order") * F("quantity"))
+            )["total"] or 0
 
-            popular_products = (
-                OrderItem.objects.values("product__product_name")
-                .annotate(total_sold=Sum("quantity"))
-                .order_by("-total_sold")[:5]
+            # Оценки для больших таблиц помечаются «~»
+            counts = table_counts([Order, Product, User])
+            total_orders, total_products, total_customers = (
+                count if exact else f"~{count}"
+                for count, exact in counts.values()
             )
 
+            popular_products = bestsellers(5)
+
             data = [
                 ["Metric", "Value"],
                 ["Total revenue", f"{total_revenue:,.0f}"],
@@ -1051,31 +997,27 @@ class LogEntryListView(PermissionRequiredMixin, ListView):
     paginate_by = 50
     
     def get_queryset(self):
-        queryset = LogEntry.objects.select_related(
-            "user", "order", "product"
-        ).all()
-        
-        # Фильтрация по действию
-        action_filter = self.request.GET.get("action")
-        if action_filter:
-            queryset = queryset.filter(action=action_filter)
-        
-        # Фильтрация по пользователю
-        user_filter = self.request.GET.get("user")
-        if user_filter:
-            queryset = queryset.filter(user_id=user_filter)
-        
-        # Поиск по описанию
-        search = self.request.GET.get("search")
-        if search:
-            queryset = queryset.filter(description__icontains=search)
-        
-        return queryset
+        return filter_log_entries(
+            self.request.GET,
+            LogEntry.objects.select_related("user", "order", "product"),
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        """Keyset-пагинация по (created_at, id) вместо OFFSET"""
+        page = paginate_keyset(
+            queryset,
+            page_size,
+            after=self.request.GET.get("after"),
+            before=self.request.GET.get("before"),
+            last=self.request.GET.get("page") == "last",
+        )
+        is_paginated = page.has_next or page.has_previous
+        return (None, page, page.object_list, is_paginated)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["action_choices"] = LogEntry.ACTION_CHOICES
         context["users"] = User.objects.filter(
-            log_entries__isnull=False
-        ).distinct()
-        return context
\ No newline at end of file
+            pk__in=get_active_log_user_ids()
+        ).order_by("username")
+        return context